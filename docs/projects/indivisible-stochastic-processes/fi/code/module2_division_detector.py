@@ -9,6 +9,8 @@ import json
 import pickle
 from datetime import datetime
 import glob
+from collections import deque
+import time
 
 # Lataa timestamp Moduuli 1:stä
 timestamp_file = "/content/drive/MyDrive/indivisible_research_*/session_timestamp.txt"
@@ -51,6 +53,91 @@ def measure_classical_correlation(time_series, interaction_record, window_size=1
     
     return correlations
 
+def correlation_peaks(correlations, height=0.2, distance=5):
+    """
+    find_peaks(height, distance) deterministisellä tasapelisäännöllä
+    Paikalliset maksimit ja tasanteet (keskikohta) kuten find_peaks:ssa, sitten
+    distance-sääntö korkein ensin. find_peaks järjestää korkeudet np.argsort:lla, jonka
+    järjestys yhtä korkeille piikeille riippuu numpy-buildista; diskreeteillä sarjoilla
+    tasapelit ovat yleisiä, joten tässä yhtä korkeista myöhempi voittaa (stable sort).
+    Batch-, kynnyspyyhkäisy- ja streaming-polku käyttävät samaa sääntöä.
+    """
+    peaks, _ = find_peaks(correlations, height=height)
+    if distance <= 1 or len(peaks) < 2:
+        return peaks
+    keep = np.ones(len(peaks), dtype=bool)
+    for j in np.argsort(correlations[peaks], kind='stable')[::-1]:
+        if not keep[j]:
+            continue
+        k = j - 1
+        while k >= 0 and peaks[j] - peaks[k] < distance:
+            keep[k] = False
+            k -= 1
+        k = j + 1
+        while k < len(peaks) and peaks[k] - peaks[j] < distance:
+            keep[k] = False
+            k += 1
+    return peaks[keep]
+
+def correlation_window_sweep(time_series, interaction_record, window_sizes=(6, 8, 10, 12, 15, 20),
+                             correlation_threshold=0.2, min_distance=5):
+    """
+    measure_classical_correlation usealla ikkunakoolla yhdestä prefix-summajoukosta
+    Ikkunakoko on kovakoodattu eri kopioissa (10 moduulissa 2, 8 moduulissa 6, 6 moduulissa 9);
+    tämä palauttaa (len(window_sizes), n) korrelaatiomatriisin ja piikit jokaiselle
+    ikkunalle, joten ikkunan valinta maksaa yhden lisäläpikäynnin eikä detektorin per arvo.
+    Ikkunan w rivi vastaa measure_classical_correlation(..., window_size=w) tulosta.
+    """
+    time_series = np.asarray(time_series, dtype=float)
+    interaction_record = np.asarray(interaction_record, dtype=float)
+    n = len(time_series)
+    m = min(n, len(interaction_record))
+    
+    # Keskitys vähentää prefix-summien kumoutumisvirhettä
+    x = time_series - time_series.mean()
+    y = interaction_record[:m] - (interaction_record[:m].mean() if m else 0.0)
+    
+    def prefix(values):
+        out = np.zeros(len(values) + 1)
+        np.cumsum(values, out=out[1:])
+        return out
+    
+    # Parit (ts[j], ir[j]) ja ts-ikkunan validiteetti (ts[t-w..t])
+    P_x, P_xx = prefix(x[:m]), prefix(x[:m] ** 2)
+    P_y, P_yy, P_xy = prefix(y), prefix(y ** 2), prefix(x[:m] * y)
+    Q_x, Q_xx = prefix(x), prefix(x ** 2)
+    
+    correlations = np.zeros((len(window_sizes), n))
+    peaks = {}
+    n_corr = min(n, m + 1)  # t jolla int-ikkuna ir[t-w:t] on täysi
+    
+    for row, w in enumerate(window_sizes):
+        if n_corr > w:
+            t = np.arange(w, n_corr)
+            Sx, Sxx = P_x[t] - P_x[t - w], P_xx[t] - P_xx[t - w]
+            Sy, Syy = P_y[t] - P_y[t - w], P_yy[t] - P_yy[t - w]
+            Sxy = P_xy[t] - P_xy[t - w]
+            S1, S2 = Q_x[t + 1] - Q_x[t - w], Q_xx[t + 1] - Q_xx[t - w]
+            
+            var_full = S2 / (w + 1) - (S1 / (w + 1)) ** 2
+            var_x = Sxx - Sx * Sx / w
+            var_y = Syy - Sy * Sy / w
+            # Suhteellinen toleranssi: vakioikkunat eivät anna tarkkaa nollaa prefix-summista
+            valid = ((var_full > 1e-10 * (S2 / (w + 1) + 1e-300)) &
+                     (var_y > 1e-10 * (Syy + 1e-300)) & (var_x > 0))
+            with np.errstate(divide='ignore', invalid='ignore'):
+                corr = (Sxy - Sx * Sy / w) / np.sqrt(var_x * var_y)
+            correlations[row, t] = np.where(valid & np.isfinite(corr),
+                                            np.minimum(np.abs(corr), 1.0), 0.0)
+        
+        peaks[w] = correlation_peaks(correlations[row], correlation_threshold, min_distance)
+    
+    return {
+        'window_sizes': list(window_sizes),
+        'correlations': correlations,
+        'peaks': peaks
+    }
+
 def detect_division_events_method1(time_series, interaction_record, 
                                  correlation_threshold=0.2, min_distance=5):  # Alempi threshold
     """
@@ -61,7 +148,7 @@ def detect_division_events_method1(time_series, interaction_record,
     correlations = measure_classical_correlation(time_series, interaction_record)
     
     # Etsi korrelaatio-piikit
-    peaks, _ = find_peaks(correlations, height=correlation_threshold, distance=min_distance)
+    peaks = correlation_peaks(correlations, correlation_threshold, min_distance)
     
     division_events = []
     for peak in peaks:
@@ -73,24 +160,18 @@ def detect_division_events_method1(time_series, interaction_record,
     
     return division_events, correlations
 
-def detect_division_events_method2(time_series, lookback_window=20, 
-                                 change_threshold=0.5):
+def dependency_change_statistic(time_series, lookback_window=20):
     """
-    MENETELMÄ 2: Ehdollisen riippuvuuden muutos
-    BARANDES: Division event = uusi ehdollistamisaika tulee saataville
+    Riippuvuusrakenteen muutos jokaiselle ajanhetkelle (method 2:n jatkuva tilasto)
+    Palauttaa taulukon jossa std(dependencies) kohdissa joissa > 3 riippuvuutta, muuten NaN
     """
     n = len(time_series)
-    division_events = []
+    dep_change = np.full(n, np.nan)
     
     for t in range(lookback_window, n):
-        # Testaa riippuvuutta edellisiin ajanhetkiin
-        current_state = time_series[t]
-        
         # Laske riippuvuus eri etäisyyksille
         dependencies = []
         for lag in range(1, min(lookback_window, t)):
-            past_state = time_series[t-lag]
-            
             # Yksinkertainen riippuvuusmittari: korrelaatio lähihistorian kanssa
             if t-lag-5 >= 0:
                 recent_history = time_series[t-lag-5:t-lag+1]
@@ -103,16 +184,26 @@ def detect_division_events_method2(time_series, lookback_window=20,
                             dependencies.append(dep)
         
         if len(dependencies) > 3:
-            # Jos riippuvuusrakenne muuttuu äkillisesti = division event
-            dep_change = np.std(dependencies)
-            if dep_change > change_threshold:
-                division_events.append({
-                    'time': t,
-                    'dependency_change': dep_change,
-                    'method': 'dependency_change'
-                })
+            dep_change[t] = np.std(dependencies)
     
-    return division_events
+    return dep_change
+
+def detect_division_events_method2(time_series, lookback_window=20, 
+                                 change_threshold=0.5):
+    """
+    MENETELMÄ 2: Ehdollisen riippuvuuden muutos
+    BARANDES: Division event = uusi ehdollistamisaika tulee saataville
+    """
+    dep_change = dependency_change_statistic(time_series, lookback_window)
+    
+    # Jos riippuvuusrakenne muuttuu äkillisesti = division event
+    event_times = np.flatnonzero(dep_change > change_threshold)
+    
+    return [{
+        'time': int(t),
+        'dependency_change': dep_change[t],
+        'method': 'dependency_change'
+    } for t in event_times]
 
 def detect_division_events_method3(time_series, interaction_record, 
                                  interaction_threshold=0.3):  # Alempi threshold
@@ -137,61 +228,1360 @@ def detect_division_events_method3(time_series, interaction_record,
     
     return division_events
 
+def changepoint_cost_function(time_series, cost='meanvar', min_var=1e-8):
+    """
+    Segmenttikustannus C(s, t) = 2 * neg. log-likelihood segmentille time_series[s:t]
+    Prefix-summista O(1) per segmentti, vektoroitu starts/ends-taulukoille.
+    cost: 'mean' (keskiarvon muutos, varianssi MAD-estimaatista), 'meanvar'
+    (keskiarvo + varianssi), 'ar1' (AR(1)-kerroin + taso). Palauttaa (funktio, parametrimäärä).
+    """
+    x = np.asarray(time_series, dtype=float)
+    x = x - x.mean()  # Keskitys vähentää prefix-summien kumoutumisvirhettä
+    
+    def prefix(values):
+        out = np.zeros(len(values) + 1)
+        np.cumsum(values, out=out[1:])
+        return out
+    
+    if cost == 'mean':
+        P1, P2 = prefix(x), prefix(x * x)
+        # Kohinatason estimaatti differensseistä (robusti tasohypyille)
+        sigma = np.median(np.abs(np.diff(x))) / (0.6745 * np.sqrt(2)) if len(x) > 1 else 1.0
+        sigma2 = max(sigma ** 2, min_var)
+        
+        def segment_cost(starts, ends):
+            length = ends - starts
+            s1 = P1[ends] - P1[starts]
+            return ((P2[ends] - P2[starts]) - s1 * s1 / length) / sigma2
+        return segment_cost, 1
+    
+    if cost == 'meanvar':
+        P1, P2 = prefix(x), prefix(x * x)
+        
+        def segment_cost(starts, ends):
+            length = ends - starts
+            s1 = P1[ends] - P1[starts]
+            var = ((P2[ends] - P2[starts]) - s1 * s1 / length) / length
+            return length * np.log(np.maximum(var, min_var))
+        return segment_cost, 2
+    
+    if cost == 'ar1':
+        # Regressio x[j] = a * x[j-1] + b; indeksi j kattaa parin (x[j-1], x[j])
+        prev = np.concatenate([[0.0], x[:-1]])
+        Pp, Pc = prefix(prev), prefix(x)
+        Ppp, Pcc, Ppc = prefix(prev * prev), prefix(x * x), prefix(prev * x)
+        
+        def segment_cost(starts, ends):
+            s = np.maximum(starts, 1)  # x[0]:lla ei edeltäjää
+            length = np.maximum(ends - s, 1)
+            sp, sc = Pp[ends] - Pp[s], Pc[ends] - Pc[s]
+            spp = Ppp[ends] - Ppp[s] - sp * sp / length
+            scc = Pcc[ends] - Pcc[s] - sc * sc / length
+            spc = Ppc[ends] - Ppc[s] - sp * sc / length
+            explained = np.where(spp > min_var, spc * spc / np.where(spp > min_var, spp, 1.0), 0.0)
+            return length * np.log(np.maximum((scc - explained) / length, min_var))
+        return segment_cost, 3
+    
+    raise ValueError(f"Tuntematon changepoint cost: {cost}")
+
+def pelt_change_points(time_series, cost='meanvar', penalty=None, min_size=3, max_segment=500):
+    """
+    PELT (Pruned Exact Linear Time) change-point detektio
+    BARANDES: Division event = dynamiikan regiimi vaihtuu, ei vaadi interaction_record:ia
+    
+    cost: 'mean' / 'meanvar' / 'ar1' tai oma funktio segment_cost(starts, ends)
+    penalty: oletuksena BIC (parametrit + sijainti) * log(n)
+    max_segment=L (oletus 500): APPROKSIMAATIO - karsinnan lisäksi vain viimeiset L
+    aloituskohtaa ovat kandidaatteja, joten aika on O(n * L) eli lineaarinen myös
+    ilman muutoskohtia (white noise). Yli L:n mittaiset segmentit pakotetaan katki;
+    pakotetut katkot, joiden kustannushyöty ei ylitä penaltya, poistetaan lopuksi.
+    Tulos on tarkka aina kun optimaalisen segmentoinnin segmentit ovat <= L.
+    max_segment=None (valinnainen): tarkka PELT, optimaalinen segmentointi. Ilman
+    muutoskohtia karsinta ei pienennä kandidaattijoukkoa, joten aika on O(n^2)
+    (white noise: n = 2e4 ~4 s, 8e4 ~70 s) - vain lyhyille sarjoille.
+    Palauttaa (muutoskohdat int64, kustannushyöty per muutoskohta)
+    """
+    n = len(time_series)
+    if callable(cost):
+        segment_cost, n_params = cost, 2
+    else:
+        segment_cost, n_params = changepoint_cost_function(time_series, cost)
+        min_size = max(min_size, n_params + 2)  # Lyhyt segmentti sovittuu täydellisesti
+    if penalty is None:
+        penalty = (n_params + 1) * np.log(max(n, 2))
+    
+    F = np.full(n + 1, np.inf)  # Optimaalinen kustannus prefixille [0, t)
+    F[0] = -penalty
+    last = np.zeros(n + 1, dtype=np.int64)
+    candidates = np.zeros(n + 1, dtype=np.int64)
+    k = 0
+    
+    for t in range(min_size, n + 1):
+        s_new = t - min_size
+        if s_new == 0 or s_new >= min_size:
+            candidates[k] = s_new
+            k += 1
+        cand = candidates[:k]
+        values = F[cand] + segment_cost(cand, t)
+        best = values.argmin()
+        F[t] = values[best] + penalty
+        last[t] = cand[best]
+        
+        # Karsinta: s ei voi koskaan olla optimaalinen jos F[s] + C(s, t) > F[t]
+        keep = values <= F[t]
+        if max_segment is not None:
+            keep &= cand > t - max_segment  # Segmentti [s, t+1) korkeintaan L pitkä
+        k = int(keep.sum())
+        candidates[:k] = cand[keep]
+    
+    # Peräkkäinen backtrack muutoskohtiin
+    change_points = []
+    t = n
+    while t > 0:
+        t = last[t]
+        if t > 0:
+            change_points.append(t)
+    change_points = np.array(change_points[::-1], dtype=np.int64)
+    
+    if len(change_points) == 0:
+        return change_points, np.zeros(0)
+    
+    # Kustannushyöty: C(a, c) - C(a, b) - C(b, c) naapurisegmenteille
+    bounds = np.concatenate([[0], change_points, [n]])
+    a, b, c = bounds[:-2], bounds[1:-1], bounds[2:]
+    gain = segment_cost(a, c) - segment_cost(a, b) - segment_cost(b, c)
+    significant = gain > penalty
+    return change_points[significant], gain[significant]
+
+def regime_log_emissions(batch, params):
+    """
+    Switching AR(1) log-tiheydet: x[t] = ar_k * x[t-1] + intercept_k + N(0, sigma2_k)
+    batch: (trials, n) -> (trials, n-1, 2) ajanhetkille t = 1..n-1
+    """
+    prev, curr = batch[:, :-1, None], batch[:, 1:, None]
+    mean = params['ar'][:, None, :] * prev + params['intercept'][:, None, :]
+    sigma2 = params['sigma2'][:, None, :]
+    return -0.5 * (np.log(2 * np.pi * sigma2) + (curr - mean) ** 2 / sigma2)
+
+def regime_forward_backward(log_emission, transition, initial):
+    """
+    Skaalattu forward-backward koko batchille (silmukka vain ajan yli)
+    Palauttaa (posteriorit (trials, m, 2), xi-summa (trials, 2, 2), log-likelihood (trials,))
+    """
+    trials, m, _ = log_emission.shape
+    shift = log_emission.max(axis=2, keepdims=True)
+    emission = np.exp(log_emission - shift)
+    
+    alpha = np.zeros((trials, m, 2))
+    scale = np.zeros((trials, m))
+    a = initial * emission[:, 0]
+    for t in range(m):
+        if t > 0:
+            a = np.einsum('bi,bij->bj', alpha[:, t - 1], transition) * emission[:, t]
+        scale[:, t] = a.sum(axis=1)
+        alpha[:, t] = a / scale[:, t, None]
+    
+    beta = np.ones((trials, m, 2))
+    xi_sum = np.zeros((trials, 2, 2))
+    for t in range(m - 2, -1, -1):
+        eb = emission[:, t + 1] * beta[:, t + 1]
+        beta[:, t] = np.einsum('bij,bj->bi', transition, eb) / scale[:, t + 1, None]
+        xi_sum += alpha[:, t, :, None] * transition * eb[:, None, :] / scale[:, t + 1, None, None]
+    
+    posteriors = alpha * beta
+    posteriors /= posteriors.sum(axis=2, keepdims=True)
+    log_likelihood = np.log(scale).sum(axis=1) + shift[..., 0].sum(axis=1)
+    return posteriors, xi_sum, log_likelihood
+
+def regime_viterbi(log_emission, transition, initial):
+    """
+    Log-space Viterbi koko batchille, palauttaa tilajonot (trials, m) int8
+    """
+    trials, m, _ = log_emission.shape
+    log_transition = np.log(np.maximum(transition, 1e-300))
+    delta = np.log(np.maximum(initial, 1e-300)) + log_emission[:, 0]
+    backpointer = np.zeros((trials, m, 2), dtype=np.int8)
+    for t in range(1, m):
+        candidates = delta[:, :, None] + log_transition  # (trials, from, to)
+        backpointer[:, t] = candidates.argmax(axis=1)
+        delta = candidates.max(axis=1) + log_emission[:, t]
+    
+    states = np.zeros((trials, m), dtype=np.int8)
+    states[:, -1] = delta.argmax(axis=1)
+    rows = np.arange(trials)
+    for t in range(m - 1, 0, -1):
+        states[:, t - 1] = backpointer[rows, t, states[:, t]]
+    return states
+
+def fit_regime_hmm(batch, n_iter=50, tol=1e-6, min_var=1e-8):
+    """
+    Kaksitilainen switching AR(1) HMM, EM (Baum-Welch) koko (trials, n) batchille
+    BARANDES: tila 1 = division event (uusi ehdollistaminen, suuri innovaatio),
+    tila 0 = tavallinen kehitys edellisestä tilasta
+    """
+    batch = np.atleast_2d(np.asarray(batch, dtype=float))
+    trials, n = batch.shape
+    prev, curr = batch[:, :-1], batch[:, 1:]
+    
+    # Alustus: yhteinen AR(1) ja suurimmat residuaalit division-tilaan
+    pc = (prev * curr).mean(axis=1) - prev.mean(axis=1) * curr.mean(axis=1)
+    ar = pc / np.maximum(prev.var(axis=1), min_var)
+    resid = np.abs(curr - ar[:, None] * prev)
+    division_init = resid > np.quantile(resid, 0.8, axis=1, keepdims=True)
+    weights = np.stack([~division_init, division_init], axis=2).astype(float) + 1e-3
+    transition = np.tile(np.array([[0.9, 0.1], [0.5, 0.5]]), (trials, 1, 1))
+    initial = np.full((trials, 2), 0.5)
+    
+    log_likelihood = np.full(trials, -np.inf)
+    for _ in range(n_iter):
+        # M-askel: painotettu pienimmän neliösumman regressio per tila
+        w = weights
+        sw = w.sum(axis=1)
+        sx = np.einsum('bm,bmk->bk', prev, w) / sw
+        sy = np.einsum('bm,bmk->bk', curr, w) / sw
+        sxx = np.einsum('bm,bmk->bk', prev * prev, w) / sw - sx * sx
+        sxy = np.einsum('bm,bmk->bk', prev * curr, w) / sw - sx * sy
+        syy = np.einsum('bm,bmk->bk', curr * curr, w) / sw - sy * sy
+        ar = np.where(sxx > min_var, sxy / np.maximum(sxx, min_var), 0.0)
+        params = {
+            'ar': ar,
+            'intercept': sy - ar * sx,
+            'sigma2': np.maximum(syy - ar * sxy, min_var),
+        }
+        
+        # E-askel
+        log_emission = regime_log_emissions(batch, params)
+        weights, xi_sum, new_ll = regime_forward_backward(log_emission, transition, initial)
+        transition = xi_sum / np.maximum(xi_sum.sum(axis=2, keepdims=True), 1e-300)
+        initial = weights[:, 0]
+        
+        converged = np.all(np.abs(new_ll - log_likelihood) < tol * np.abs(new_ll))
+        log_likelihood = new_ll
+        if converged:
+            break
+    
+    # Kanoninen järjestys: division-tila = suurempi innovaatiovarianssi
+    swap = params['sigma2'][:, 0] > params['sigma2'][:, 1]
+    order = np.where(swap[:, None], [1, 0], [0, 1])
+    rows = np.arange(trials)[:, None]
+    params = {key: value[rows, order] for key, value in params.items()}
+    params['transition'] = transition[rows[:, :, None], order[:, :, None], order[:, None, :]]
+    params['initial'] = initial[rows, order]
+    params['log_likelihood'] = log_likelihood
+    return params
+
+def regime_switching_detector(time_series, n_iter=50, posterior_threshold=0.5, min_variance_ratio=10.0):
+    """
+    Regime-detektori: EM-sovitus + posteriorit + Viterbi division event -ajat
+    time_series: (n,) tai (trials, n). Posteriorit P(division-tila | koko sarja)
+    ajanhetkille 0..n-1 (t = 0 aina 0). Division events = Viterbi-polun
+    division-tilan ajanhetket, joilla posteriori ylittää kynnyksen.
+    Jos tilojen innovaatiovarianssien suhde jää alle min_variance_ratio:n,
+    sarjassa ei ole erillistä division-regiimiä eikä eventtejä palauteta.
+    """
+    single = np.ndim(time_series) == 1
+    batch = np.atleast_2d(np.asarray(time_series, dtype=float))
+    trials, n = batch.shape
+    
+    params = fit_regime_hmm(batch, n_iter=n_iter)
+    log_emission = regime_log_emissions(batch, params)
+    smoothed, _, _ = regime_forward_backward(log_emission, params['transition'], params['initial'])
+    states = regime_viterbi(log_emission, params['transition'], params['initial'])
+    
+    posteriors = np.zeros((trials, n))
+    posteriors[:, 1:] = smoothed[:, :, 1]
+    viterbi = np.zeros((trials, n), dtype=np.int8)
+    viterbi[:, 1:] = states
+    
+    separated = params['sigma2'][:, 1] >= min_variance_ratio * params['sigma2'][:, 0]
+    event_mask = (viterbi == 1) & (posteriors > posterior_threshold) & separated[:, None]
+    division_times = [np.flatnonzero(row).astype(np.int32) for row in event_mask]
+    
+    if single:
+        return {'posteriors': posteriors[0], 'states': viterbi[0],
+                'division_times': division_times[0],
+                'params': {key: value[0] for key, value in params.items()}}
+    return {'posteriors': posteriors, 'states': viterbi,
+            'division_times': division_times, 'params': params}
+
+def division_timing_scores(detected_times, true_times, tolerance=2):
+    """
+    Precision / recall / F1 ground truth division_times:ia vastaan
+    Tunnistus osuu, jos |t_det - t_true| <= tolerance; jokainen tosi event
+    kuitataan korkeintaan kerran (ahne pari lähimpään, aikajärjestyksessä).
+    """
+    detected = np.unique(np.asarray(detected_times, dtype=np.int64))
+    truth = np.unique(np.asarray(true_times, dtype=np.int64))
+    if len(detected) == 0 or len(truth) == 0:
+        return {'precision': 0.0, 'recall': 0.0, 'f1': 0.0,
+                'true_positives': 0, 'detected': int(len(detected)), 'expected': int(len(truth))}
+    
+    used = np.zeros(len(truth), dtype=bool)
+    true_positives = 0
+    left = np.searchsorted(truth, detected - tolerance, side='left')
+    right = np.searchsorted(truth, detected + tolerance, side='right')
+    for t, lo, hi in zip(detected, left, right):
+        if lo == hi:
+            continue
+        free = np.flatnonzero(~used[lo:hi]) + lo
+        if len(free):
+            match = free[np.argmin(np.abs(truth[free] - t))]
+            used[match] = True
+            true_positives += 1
+    
+    precision = true_positives / len(detected)
+    recall = true_positives / len(truth)
+    f1 = 2 * precision * recall / (precision + recall) if true_positives else 0.0
+    return {'precision': float(precision), 'recall': float(recall), 'f1': float(f1),
+            'true_positives': int(true_positives), 'detected': int(len(detected)),
+            'expected': int(len(truth))}
+
+def transfer_entropy_codes(batch, interaction_record, n_bins=4):
+    """
+    Kvantiilidiskretointi (trials, n) sarjoille ja binäärinen interaction-koodi
+    Kuten measure_classical_correlation: interaction_record[t] rinnastetaan
+    time_series[t]:hen (vuorovaikutus vaikuttaa askeleeseen t -> t+1).
+    """
+    batch = np.atleast_2d(np.asarray(batch, dtype=float))
+    trials, n = batch.shape
+    ranks = np.argsort(np.argsort(batch, axis=1, kind='stable'), axis=1)
+    x_codes = (ranks * n_bins // n).astype(np.int64)
+    record = np.atleast_2d(np.asarray(interaction_record, dtype=float))
+    m = min(n - 1, record.shape[1])
+    y_codes = np.broadcast_to(record[:, :m] > 0, (trials, m)).astype(np.int64)
+    return x_codes, y_codes
+
+def transfer_entropy_core(x_codes, y_codes, history_lengths=(1, 2, 3), n_bins=4,
+                          local=False, max_bins=1 << 22):
+    """
+    TE(interaction -> time_series) usealle historiapituudelle yhdellä läpikäynnillä
+    TE_h = I(x[t+1]; y[t-h+1..t] | x[t-h+1..t]), nateissa, kaikille riveille kerralla.
+    Yhteiskoodi (rivi, x-historia, y-historia, x[t+1]) -> yksi bincount per historia;
+    historiakoodit kasvatetaan h:sta h+1:een kertomalla ja lisäämällä (ei uusia ikkunoita).
+    Kaikki historiat käyttävät samoja näytteitä t = H-1..m-1 (H = max historia).
+    local=True palauttaa myös pisteittäiset TE:t (trials, n_hist, n) ajanhetkille t+1
+    (NaN jos ei määritelty).
+    """
+    trials, n = x_codes.shape
+    m = y_codes.shape[1]
+    histories = sorted(history_lengths)
+    H = histories[-1]
+    te = np.zeros((trials, len(histories)))
+    local_te = np.full((trials, len(histories), n), np.nan) if local else None
+    if m - H + 1 <= 0:
+        return (te, local_te) if local else te
+    
+    target = x_codes[:, H:m + 1]
+    n_samples = target.shape[1]
+    x_past = np.zeros((trials, n_samples), dtype=np.int64)
+    y_past = np.zeros((trials, n_samples), dtype=np.int64)
+    
+    h = 0
+    for k, h_next in enumerate(histories):
+        while h < h_next:
+            x_past = x_past * n_bins + x_codes[:, H - 1 - h:m - h]
+            y_past = y_past * 2 + y_codes[:, H - 1 - h:m - h]
+            h += 1
+        sx, sy = n_bins ** h, 2 ** h
+        cells = sx * sy * n_bins
+        
+        # Lohkotetaan rivit niin että bincount-taulukko pysyy max_bins:n alla
+        rows_per_block = max(1, max_bins // cells)
+        for start in range(0, trials, rows_per_block):
+            stop = min(trials, start + rows_per_block)
+            rows = np.arange(stop - start)[:, None]
+            code = ((rows * sx + x_past[start:stop]) * sy + y_past[start:stop]) * n_bins + target[start:stop]
+            counts = np.bincount(code.ravel(), minlength=(stop - start) * cells)
+            counts = counts.reshape(stop - start, sx, sy, n_bins).astype(float)
+            
+            c_xy = counts.sum(axis=3)          # (x-historia, y-historia)
+            c_xn = counts.sum(axis=2)          # (x-historia, x[t+1])
+            c_x = c_xn.sum(axis=2)             # x-historia
+            with np.errstate(divide='ignore', invalid='ignore'):
+                ratio = counts * c_x[:, :, None, None] / (c_xy[..., None] * c_xn[:, :, None, :])
+                terms = np.where(counts > 0, counts * np.log(ratio), 0.0)
+            te[start:stop, k] = terms.sum(axis=(1, 2, 3)) / n_samples
+            
+            if local:
+                flat = code - rows * cells
+                log_ratio = np.where(counts > 0, np.log(np.where(counts > 0, ratio, 1.0)), 0.0)
+                local_te[start:stop, k, H:m + 1] = log_ratio.reshape(stop - start, cells)[rows, flat]
+    
+    te = np.maximum(te, 0.0)
+    return (te, local_te) if local else te
+
+def transfer_entropy_test(time_series, interaction_record, history_lengths=(1, 2, 3), n_bins=4,
+                          n_surrogates=100, chunk_size=50, seed=None):
+    """
+    Transfer entropy interaction_record -> time_series + sekoitettu surrogaattitesti
+    time_series: (n,) tai (trials, n); interaction_record: (n-1,) tai (trials, n-1).
+    Surrogaatit sekoittavat interaction-jonon ajallisen järjestyksen (säilyttää
+    vuorovaikutusten määrän), x-koodit pysyvät; kaikki surrogaatit ajetaan riveinä samaan
+    bincount-ytimeen chunk_size kerrallaan.
+    Palauttaa te, surrogate_mean, surrogate_std, effective_te (te - surrogaattien keskiarvo)
+    ja p_values (trials, n_hist) tai (n_hist,).
+    """
+    single = np.ndim(time_series) == 1
+    rng = np.random.default_rng(seed)
+    histories = tuple(sorted(history_lengths))
+    x_codes, y_codes = transfer_entropy_codes(time_series, interaction_record, n_bins)
+    trials = len(x_codes)
+    
+    te = transfer_entropy_core(x_codes, y_codes, histories, n_bins)
+    exceed = np.zeros_like(te)
+    surrogate_sum = np.zeros_like(te)
+    surrogate_sq = np.zeros_like(te)
+    
+    for start in range(0, n_surrogates, chunk_size):
+        size = min(chunk_size, n_surrogates - start)
+        x_rep = np.repeat(x_codes, size, axis=0)
+        y_rep = rng.permuted(np.repeat(y_codes, size, axis=0), axis=1)
+        null = transfer_entropy_core(x_rep, y_rep, histories, n_bins).reshape(trials, size, -1)
+        exceed += (null >= te[:, None, :]).sum(axis=1)
+        surrogate_sum += null.sum(axis=1)
+        surrogate_sq += (null ** 2).sum(axis=1)
+    
+    surrogate_mean = surrogate_sum / max(n_surrogates, 1)
+    surrogate_std = np.sqrt(np.maximum(surrogate_sq / max(n_surrogates, 1) - surrogate_mean ** 2, 0.0))
+    result = {
+        'history_lengths': histories,
+        'te': te,
+        'surrogate_mean': surrogate_mean,
+        'surrogate_std': surrogate_std,
+        'effective_te': te - surrogate_mean,
+        'p_values': (exceed + 1) / (n_surrogates + 1)
+    }
+    if single:
+        result.update({key: result[key][0] for key in
+                       ('te', 'surrogate_mean', 'surrogate_std', 'effective_te', 'p_values')})
+    return result
+
+def transfer_entropy_detector(time_series, interaction_record, history_length=1, n_bins=4,
+                              n_surrogates=100, significance=0.05, local_threshold=0.5, seed=0):
+    """
+    Pisteittäinen TE division event -metodina (yksittäinen sarja)
+    Eventit: ajanhetket t+1, joilla paikallinen TE > local_threshold, kun sarjatason TE
+    on merkitsevä surrogaatteja vastaan. Muuten eventtejä ei palauteta.
+    """
+    test = transfer_entropy_test(time_series, interaction_record, (history_length,), n_bins,
+                                 n_surrogates=n_surrogates, seed=seed)
+    x_codes, y_codes = transfer_entropy_codes(time_series, interaction_record, n_bins)
+    _, local_te = transfer_entropy_core(x_codes, y_codes, (history_length,), n_bins, local=True)
+    local_te = local_te[0, 0]
+    
+    significant = test['p_values'][0] < significance
+    with np.errstate(invalid='ignore'):
+        event_mask = (local_te > local_threshold) & significant
+    return {'local_te': local_te,
+            'division_times': np.flatnonzero(event_mask).astype(np.int32),
+            'te': float(test['te'][0]),
+            'effective_te': float(test['effective_te'][0]),
+            'p_value': float(test['p_values'][0])}
+
+def granger_design_gram(batch, interaction_batch, max_lag=5):
+    """
+    Viiveiset suunnittelumatriisit sliding_window_view:llä ja niiden Gram-matriisit
+    Sarakkeet: [1, x[t-1..t-max_lag], y[t-1..t-max_lag]], kohde x[t], t = max_lag..n-1.
+    y[t-1] = interaction_record[t-1] (vaikuttaa askeleeseen t-1 -> t, kuten method 3).
+    Kaikkien rivien X'X ja X'z yhdellä matmul-kutsulla.
+    """
+    batch = np.atleast_2d(np.asarray(batch, dtype=float))
+    trials, n = batch.shape
+    record = np.broadcast_to(np.atleast_2d(np.asarray(interaction_batch, dtype=float)), (trials, n - 1))
+    P = max_lag
+    
+    # Ikkuna j = [v[j], ..., v[j+P-1]] -> käännetään viiveiksi 1..P kohteelle v[j+P]
+    x_lags = np.lib.stride_tricks.sliding_window_view(batch[:, :-1], P, axis=1)[..., ::-1]
+    y_lags = np.lib.stride_tricks.sliding_window_view(record, P, axis=1)[..., ::-1]
+    target = batch[:, P:]
+    design = np.concatenate([np.ones(target.shape + (1,)), x_lags, y_lags, target[..., None]], axis=2)
+    
+    gram = np.matmul(design.transpose(0, 2, 1), design)  # (trials, 2P+2, 2P+2)
+    return gram, target.shape[1]
+
+def granger_causality_test(time_series, interaction_record, lags=(1, 2, 3, 4, 5), rcond=1e-10):
+    """
+    Granger-kausaalisuus interaction_record -> time_series kaikille riveille kerralla
+    Rajoitettu malli: x[t] ~ 1 + x[t-1..t-p]; rajoittamaton: + y[t-1..t-p].
+    Normaaliyhtälöt yhteisestä Gram-matriisista (yksi BLAS-kutsu per batch), kaikki
+    viivekertaluvut käyttävät samoja näytteitä t = max(lags)..n-1. Pseudoinverssi
+    sietää vakiosarakkeet (esim. ei vuorovaikutuksia -> F = 0, p = 1).
+    Palauttaa f_stat ja p_values (trials, n_lags) tai (n_lags,), sekä RSS:t ja vapausasteet.
+    """
+    single = np.ndim(time_series) == 1
+    lags = tuple(sorted(lags))
+    P = lags[-1]
+    gram, n_obs = granger_design_gram(time_series, interaction_record, P)
+    target_col = 2 * P + 1
+    zz = gram[:, target_col, target_col]
+    
+    def residual_sum(columns):
+        xtx = gram[:, columns][:, :, columns]
+        xtz = gram[:, columns, target_col]
+        beta = np.einsum('bij,bj->bi', np.linalg.pinv(xtx, rcond=rcond, hermitian=True), xtz)
+        return np.maximum(zz - np.einsum('bi,bi->b', beta, xtz), 0.0)
+    
+    trials = len(gram)
+    f_stat = np.zeros((trials, len(lags)))
+    rss_restricted = np.zeros((trials, len(lags)))
+    rss_unrestricted = np.zeros((trials, len(lags)))
+    df_denominator = np.zeros(len(lags), dtype=int)
+    for k, p in enumerate(lags):
+        x_cols = list(range(0, p + 1))
+        y_cols = list(range(P + 1, P + 1 + p))
+        rss_r = residual_sum(x_cols)
+        rss_u = residual_sum(x_cols + y_cols)
+        df_denominator[k] = n_obs - (2 * p + 1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            f = ((rss_r - rss_u) / p) / (rss_u / df_denominator[k])
+        f_stat[:, k] = np.where(np.isfinite(f), np.maximum(f, 0.0), 0.0)
+        rss_restricted[:, k], rss_unrestricted[:, k] = rss_r, rss_u
+    
+    p_values = stats.f.sf(f_stat, np.array(lags), df_denominator)
+    result = {
+        'lags': lags,
+        'f_stat': f_stat,
+        'p_values': p_values,
+        'rss_restricted': rss_restricted,
+        'rss_unrestricted': rss_unrestricted,
+        'df': [(p, int(d)) for p, d in zip(lags, df_denominator)]
+    }
+    if single:
+        result.update({key: result[key][0] for key in
+                       ('f_stat', 'p_values', 'rss_restricted', 'rss_unrestricted')})
+    return result
+
+# Division events rakenteisena taulukkona: yksi rivi per tapahtuma
+DIVISION_METHODS = ('correlation', 'dependency', 'interaction', 'changepoint', 'regime', 'transfer')
+METHOD_BITS = {'correlation': 1, 'dependency': 2, 'interaction': 4, 'changepoint': 8, 'regime': 16,
+               'transfer': 32}
+DIVISION_EVENT_DTYPE = np.dtype([
+    ('time', np.int32),
+    ('score', np.float64),
+    ('methods', np.uint8),        # Bittimaski METHOD_BITS mukaan
+    ('correlation', np.float64),  # Metodikohtaiset vahvuudet, NaN jos metodi ei osunut
+    ('dependency', np.float64),
+    ('interaction', np.float64),
+    ('changepoint', np.float64),  # PELT kustannushyöty
+    ('regime', np.float64),       # HMM division-tilan posteriori
+    ('transfer', np.float64)      # Paikallinen transfer entropy (nat)
+])
+
+def division_event_core(method_masks, method_strengths, method_weights):
+    """
+    Maski-pohjainen yhdistelmäydin
+    method_masks: {metodi: bool-taulukko (n,)}, method_strengths: {metodi: float-taulukko (n,)}
+    Score on maskien painotettu vektorisumma; palauttaa DIVISION_EVENT_DTYPE-taulukon
+    pistemäärän mukaan laskevasti (tasatilanteessa ensimmäisen osuneen metodin ja
+    sitten ajan mukaan, sama järjestys kuin vanhalla dict-yhdistelyllä).
+    """
+    n = len(next(iter(method_masks.values())))
+    score = np.zeros(n)
+    bitmask = np.zeros(n, dtype=np.uint8)
+    
+    for method in DIVISION_METHODS:
+        if method in method_masks:
+            mask = method_masks[method]
+            score += method_weights.get(method, 0.0) * mask
+            bitmask |= mask.astype(np.uint8) * np.uint8(METHOD_BITS[method])
+    
+    event_times = np.flatnonzero(bitmask)
+    events = np.zeros(len(event_times), dtype=DIVISION_EVENT_DTYPE)
+    events['time'] = event_times
+    events['score'] = score[event_times]
+    events['methods'] = bitmask[event_times]
+    
+    for method in DIVISION_METHODS:
+        hit = (bitmask[event_times] & METHOD_BITS[method]) > 0
+        values = np.full(len(event_times), np.nan)
+        if method in method_strengths:
+            values[hit] = method_strengths[method][event_times[hit]]
+        events[method] = values
+    
+    # Sorttaa pistemäärän mukaan kuten vanha dict-yhdistely: tasatilanteessa ensin
+    # havainneen metodin järjestys (DIVISION_METHODS), sen sisällä aika nousevasti
+    first_method = np.full(len(event_times), len(DIVISION_METHODS))
+    for i, method in reversed(list(enumerate(DIVISION_METHODS))):
+        first_method[(events['methods'] & METHOD_BITS[method]) > 0] = i
+    order = np.lexsort((events['time'], first_method, -events['score']))
+    return events[order]
+
+def division_events_to_dicts(events):
+    """
+    Ohut adapteri: rakenteinen taulukko -> vanha list-of-dicts muoto
+    """
+    result = []
+    for row in events:
+        methods = [m for m in DIVISION_METHODS if row['methods'] & METHOD_BITS[m]]
+        result.append({
+            'time': int(row['time']),
+            'score': float(row['score']),
+            'methods': methods,
+            'details': {m: float(row[m]) for m in methods}
+        })
+    return result
+
+class DivisionEventIndex:
+    """
+    Aikajärjestetty division event -indeksi: int32 ajat + rinnakkaiset score/methods
+    Ikkuna-, kynnys- ja lähin-event -kyselyt searchsorted:lla (O(log n)),
+    ilman lineaarisia list comprehension -suodatuksia.
+    """
+    
+    def __init__(self, events):
+        events = np.asarray(events, dtype=DIVISION_EVENT_DTYPE)
+        self.events = events[np.argsort(events['time'], kind='stable')]
+        self.times = np.ascontiguousarray(self.events['time'], dtype=np.int32)
+        self.scores = np.ascontiguousarray(self.events['score'])
+        self.methods = np.ascontiguousarray(self.events['methods'])
+        # Score-järjestys kynnyskyselyille (laskeva, tasatilanteessa aika nouseva)
+        self._score_order = np.argsort(-self.scores, kind='stable')
+        self._neg_sorted_scores = -self.scores[self._score_order]
+    
+    @classmethod
+    def from_dicts(cls, event_dicts):
+        """Rakentaa indeksin vanhasta list-of-dicts muodosta (esim. JSON:sta ladattu)"""
+        events = np.zeros(len(event_dicts), dtype=DIVISION_EVENT_DTYPE)
+        for i, event in enumerate(event_dicts):
+            events['time'][i] = event['time']
+            events['score'][i] = event['score']
+            details = event.get('details', {})
+            for method in event.get('methods', []):
+                events['methods'][i] |= METHOD_BITS.get(method, 0)
+            for method in DIVISION_METHODS:
+                events[method][i] = details.get(method, np.nan)
+        return cls(events)
+    
+    def __len__(self):
+        return len(self.times)
+    
+    def _bounds(self, start, stop):
+        lo = 0 if start is None else np.searchsorted(self.times, start, side='left')
+        hi = len(self.times) if stop is None else np.searchsorted(self.times, stop, side='left')
+        return lo, max(lo, hi)
+    
+    def window(self, start=None, stop=None):
+        """Eventit ajoilla start <= t < stop (näkymä, aikajärjestyksessä)"""
+        lo, hi = self._bounds(start, stop)
+        return self.events[lo:hi]
+    
+    def times_in(self, start=None, stop=None):
+        """Pelkät ajat ikkunassa [start, stop) int32-näkymänä"""
+        lo, hi = self._bounds(start, stop)
+        return self.times[lo:hi]
+    
+    def count(self, start=None, stop=None):
+        lo, hi = self._bounds(start, stop)
+        return hi - lo
+    
+    def above(self, threshold):
+        """Eventit joilla score > threshold, score-järjestyksessä (kuten combined_division_detector)"""
+        k = np.searchsorted(self._neg_sorted_scores, -threshold, side='left')
+        return self.events[self._score_order[:k]]
+    
+    def nearest(self, query_times):
+        """
+        Lähin event jokaiselle kyselyajalle
+        Palauttaa (lähimmät ajat, etäisyydet); tyhjä indeksi -> (-1, inf)
+        """
+        query = np.asarray(query_times)
+        if len(self.times) == 0:
+            return np.full(query.shape, -1, dtype=np.int32), np.full(query.shape, np.inf)
+        right = np.clip(np.searchsorted(self.times, query), 0, len(self.times) - 1)
+        left = np.clip(right - 1, 0, len(self.times) - 1)
+        use_left = np.abs(query - self.times[left]) <= np.abs(self.times[right] - query)
+        nearest = np.where(use_left, self.times[left], self.times[right])
+        return nearest, np.abs(query - nearest)
+
+# Fused feature -matriisin sarakkeet (DIVISION_METHODS:n kolme ensimmäistä; PELT, HMM ja TE erikseen)
+DIVISION_FEATURE_COLUMNS = ('correlation', 'dependency', 'interaction')
+
+def division_feature_matrix(time_series, interaction_record, window_size=10,
+                            lookback_window=20, context=6, block_size=4096):
+    """
+    Fused kernel: kaikkien kolmen metodin jatkuvat tilastot yhdellä lohkotetulla läpikäynnillä
+    Palauttaa (n, 3) matriisin sarakkeilla DIVISION_FEATURE_COLUMNS:
+      0: method 1 |corr(time_series, interaction_record)| ikkunassa window_size
+      1: method 2 dependency change (std riippuvuuksista), NaN jos ei laskettavissa
+      2: method 3 interaction_record[t-1] (vaikuttaa seuraavaan askeleeseen), NaN kun t=0
+    Sama tulos kuin measure_classical_correlation + dependency_change_statistic (korrelaatio
+    bitilleen sama, myös diskreeteillä sarjoilla), mutta ikkunat ovat sliding window
+    -näkymiä ja lohko (block_size riviä) pysyy välimuistissa.
+    Detektio on tämän jälkeen pelkkä kynnystys (detect_from_features).
+    """
+    time_series = np.asarray(time_series, dtype=float)
+    interaction_record = np.asarray(interaction_record, dtype=float)
+    n = len(time_series)
+    features = np.full((n, 3), np.nan)
+    features[:, 0] = 0.0
+    features[1:len(interaction_record) + 1, 2] = interaction_record[:n - 1]
+    
+    # Method 1 ikkunat: ts[t-w:t+1] ja ir[t-w:t]
+    w = window_size
+    n_corr = min(n, len(interaction_record) + 1)  # Viimeinen t jolla int-ikkuna on täysi
+    ts_win = np.lib.stride_tricks.sliding_window_view(time_series, w + 1) if n > w else None
+    ir_win = np.lib.stride_tricks.sliding_window_view(interaction_record, w) if len(interaction_record) >= w else None
+    
+    # Method 2 ikkunat: standardoidut context-pituiset ikkunat ts[j:j+context]
+    c = context
+    if n >= c:
+        ctx_win = np.lib.stride_tricks.sliding_window_view(time_series, c)
+        ctx_std = ctx_win.std(axis=1)
+        ctx_valid = ctx_std > 0
+        ctx_z = (ctx_win - ctx_win.mean(axis=1, keepdims=True)) / np.where(ctx_valid, ctx_std, 1.0)[:, None]
+    
+    for start in range(0, n, block_size):
+        stop = min(n, start + block_size)
+        
+        # --- Method 1: rullaava korrelaatio, t = w..n_corr-1 ---
+        t0, t1 = max(start, w), min(stop, n_corr)
+        if ts_win is not None and ir_win is not None and t1 > t0:
+            ts_full = ts_win[t0 - w:t1 - w]          # ts[t-w:t+1]
+            y = ir_win[t0 - w:t1 - w]               # ir[t-w:t]
+            valid = (ts_full.std(axis=1) > 0) & (y.std(axis=1) > 0)
+            # Sama operaatiojärjestys kuin np.corrcoef:ssa (keskitys, matmul, 1/(w-1),
+            # jako keskihajonnoilla erikseen): diskreeteillä sarjoilla korrelaatiossa on
+            # tarkkoja tasanteita, ja 1e-16 ero ratkaisisi find_peaks:n tasapelit toisin
+            pairs = np.stack([ts_full[:, :-1], y], axis=1)  # (lohko, 2, w): ts[t-w:t], ir[t-w:t]
+            pairs = pairs - pairs.mean(axis=2, keepdims=True)
+            cov = pairs @ pairs.transpose(0, 2, 1)
+            cov *= np.true_divide(1, w - 1)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                corr = cov[:, 0, 1] / np.sqrt(cov[:, 0, 0]) / np.sqrt(cov[:, 1, 1])
+            corr = np.where(valid & np.isfinite(corr), np.abs(np.clip(corr, -1.0, 1.0)), 0.0)
+            features[t0:t1, 0] = corr
+        
+        # --- Method 2: riippuvuusrakenteen muutos, t = lookback_window..n-1 ---
+        t0 = max(start, lookback_window)
+        if n >= c and stop > t0:
+            times = np.arange(t0, stop)
+            current = ctx_z[times - (c - 1)]                  # ts[t-5:t+1]
+            current_ok = ctx_valid[times - (c - 1)]
+            n_lags = lookback_window - 1
+            deps = np.full((len(times), n_lags), np.nan)
+            for lag in range(1, lookback_window):
+                rows = times - (c - 1) - lag                  # ts[t-lag-5:t-lag+1]
+                ok = (rows >= 0) & (lag < times) & current_ok
+                safe_rows = np.where(ok, rows, 0)
+                ok &= ctx_valid[safe_rows]
+                dep = np.abs((current * ctx_z[safe_rows]).sum(axis=1) / c)
+                deps[:, lag - 1] = np.where(ok, np.minimum(dep, 1.0), np.nan)
+            
+            counts = np.sum(~np.isnan(deps), axis=1)
+            with np.errstate(invalid='ignore'):
+                dep_change = np.nanstd(np.where(counts[:, None] > 0, deps, 0.0), axis=1)
+            features[times, 1] = np.where(counts > 3, dep_change, np.nan)
+    
+    return features
+
+def detect_from_features(features, method_weights={'correlation': 0.3, 'dependency': 0.2, 'interaction': 0.5},
+                         correlation_threshold=0.2, min_distance=5,
+                         change_threshold=0.5, interaction_threshold=0.3, changepoints=None,
+                         regime=None, transfer=None):
+    """
+    Division events suoraan feature-matriisista - pelkkä kynnystys
+    Tallennetut featuret voi kynnystää uudelleen ilman detektorien uudelleenajoa
+    changepoints: (ajat, kustannushyöty) pelt_change_points:sta, valinnainen 4. metodi
+    regime: regime_switching_detector:n tulos (yksittäinen sarja), valinnainen 5. metodi
+    transfer: transfer_entropy_detector:n tulos, valinnainen 6. metodi
+    """
+    n = len(features)
+    
+    peaks = correlation_peaks(features[:, 0], correlation_threshold, min_distance)
+    correlation_mask = np.zeros(n, dtype=bool)
+    correlation_mask[peaks] = True
+    
+    masks = {
+        'correlation': correlation_mask,
+        'dependency': features[:, 1] > change_threshold,
+        'interaction': features[:, 2] > interaction_threshold
+    }
+    strengths = {name: features[:, i] for i, name in enumerate(DIVISION_FEATURE_COLUMNS)}
+    
+    if changepoints is not None:
+        cp_times, cp_gain = changepoints
+        masks['changepoint'] = np.zeros(n, dtype=bool)
+        masks['changepoint'][cp_times] = True
+        strengths['changepoint'] = np.zeros(n)
+        strengths['changepoint'][cp_times] = cp_gain
+    
+    if regime is not None:
+        masks['regime'] = np.zeros(n, dtype=bool)
+        masks['regime'][regime['division_times']] = True
+        strengths['regime'] = regime['posteriors']
+    
+    if transfer is not None:
+        masks['transfer'] = np.zeros(n, dtype=bool)
+        masks['transfer'][transfer['division_times']] = True
+        strengths['transfer'] = transfer['local_te']
+    
+    return division_event_core(masks, strengths, method_weights)
+
+def division_threshold_sweep(features, correlation_thresholds=(0.1, 0.15, 0.2, 0.25, 0.3),
+                             change_thresholds=(0.3, 0.4, 0.5, 0.6, 0.7),
+                             interaction_thresholds=(0.1, 0.2, 0.3, 0.4, 0.5),
+                             strong_thresholds=(0.3, 0.5),
+                             method_weights={'correlation': 0.3, 'dependency': 0.2, 'interaction': 0.5},
+                             min_distance=5):
+    """
+    Kynnysten pyyhkäisy välimuistetuista featureista (division_feature_matrix)
+    Kaikki (correlation, change, interaction, strong) kynnysyhdistelmät kerralla:
+    dependency- ja interaction-kynnykset broadcastataan, korrelaatiopiikit (correlation_peaks)
+    lasketaan kerran per korrelaatiokynnys. Ei detektorien uudelleenajoa.
+    Palauttaa taulukot muotoa (Tc, Td, Ti) ja (Tc, Td, Ti, Ts):
+      event_counts, strong_counts, division_rate (= strong_counts / n), mean_event_score
+    """
+    n = len(features)
+    td = np.asarray(change_thresholds, dtype=float)
+    ti = np.asarray(interaction_thresholds, dtype=float)
+    ts_ = np.asarray(strong_thresholds, dtype=float)
+    
+    # NaN = ei laskettavissa -> ei koskaan osumaa
+    dep = np.where(np.isnan(features[:, 1]), -np.inf, features[:, 1])
+    inter = np.where(np.isnan(features[:, 2]), -np.inf, features[:, 2])
+    dep_hit = dep[None, :] > td[:, None]        # (Td, n)
+    inter_hit = inter[None, :] > ti[:, None]    # (Ti, n)
+    any_dep, any_inter = dep_hit.any(axis=0), inter_hit.any(axis=0)
+    
+    shape = (len(correlation_thresholds), len(td), len(ti))
+    event_counts = np.zeros(shape, dtype=np.int64)
+    strong_counts = np.zeros(shape + (len(ts_),), dtype=np.int64)
+    score_sums = np.zeros(shape)
+    
+    for ic, tc in enumerate(correlation_thresholds):
+        peaks = correlation_peaks(features[:, 0], tc, min_distance)
+        corr_mask = np.zeros(n, dtype=bool)
+        corr_mask[peaks] = True
+        
+        # Vain ajat joissa jokin metodi voi osua millä tahansa kynnyksellä
+        idx = np.flatnonzero(corr_mask | any_dep | any_inter)
+        c = corr_mask[idx][None, None, :]
+        d = dep_hit[:, idx][:, None, :]
+        i = inter_hit[:, idx][None, :, :]
+        
+        # Sama summausjärjestys kuin division_event_core:ssa
+        score = np.zeros((len(td), len(ti), len(idx)))
+        score += method_weights.get('correlation', 0.0) * c
+        score += method_weights.get('dependency', 0.0) * d
+        score += method_weights.get('interaction', 0.0) * i
+        is_event = c | d | i
+        
+        event_counts[ic] = is_event.sum(axis=-1)
+        score_sums[ic] = np.where(is_event, score, 0.0).sum(axis=-1)
+        strong_counts[ic] = ((score[..., None] > ts_) & is_event[..., None]).sum(axis=2)
+    
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean_event_score = np.where(event_counts > 0, score_sums / event_counts, 0.0)
+    
+    return {
+        'correlation_thresholds': list(correlation_thresholds),
+        'change_thresholds': list(change_thresholds),
+        'interaction_thresholds': list(interaction_thresholds),
+        'strong_thresholds': list(strong_thresholds),
+        'event_counts': event_counts,
+        'strong_counts': strong_counts,
+        'division_rate': strong_counts / max(1, n),
+        'mean_event_score': mean_event_score
+    }
+
+class StreamingDivisionDetector:
+    """
+    Online division events detector: näytteet (x_t, interaction) yksi kerrallaan tai paloina
+    Ei koskaan pidä koko sarjaa muistissa - vain rengaspuskurit ja juoksevat summat:
+      - method 1: |corr(ts, interaction)| rengaspuskureista np.corrcoef:lla, O(window_size)
+        per näyte (bitilleen sama kuin measure_classical_correlation)
+      - method 2: dependency change rengaspuskurista (lookback_window x context), O(1) per näyte
+      - method 3: interaction-kynnys suoraan
+    interaction = interaction_record[t-1], eli vuorovaikutus joka tuotti x_t:n (t=0: None).
+    Paikalliset maksimit ja tasanteet (keskikohta) tunnistetaan kuten find_peaks:ssa.
+    Korrelaatiopiikit kerätään klustereiksi; kun seuraava mahdollinen piikki on vähintään
+    min_distance päässä viimeisimmästä, klusteri ratkaistaan correlation_peaks:n säännöllä.
+    Tapahtumat emitoidaan siis vähintään min_distance + 2 näytettä myöhässä (avoimen
+    tasanteen ajan pidempään), ja tulos (ajat, scoret, metodit) on sama kuin
+    combined_division_detector:lla.
+    """
+    
+    def __init__(self, window_size=10, lookback_window=20, context=6,
+                 correlation_threshold=0.2, min_distance=5,
+                 change_threshold=0.5, interaction_threshold=0.3,
+                 method_weights={'correlation': 0.3, 'dependency': 0.2, 'interaction': 0.5},
+                 keep_history=True):
+        self.window_size = window_size
+        self.lookback_window = lookback_window
+        self.context = context
+        self.correlation_threshold = correlation_threshold
+        self.min_distance = min_distance
+        self.change_threshold = change_threshold
+        self.interaction_threshold = interaction_threshold
+        self.method_weights = method_weights
+        self.keep_history = keep_history
+        
+        self.t = -1
+        self.n_events = 0
+        
+        # Method 1: rengaspuskurit ts[t-w..t] ja ir[t-w..t-1]
+        self.ts_buf = np.zeros(window_size + 1)
+        self.ir_buf = np.zeros(window_size)
+        self.corr_prev = 0.0   # c[t-1]
+        self.rise = None       # Avoin nousu/tasanne (alkuaika, korkeus) find_peaks:n tapaan
+        self.peak_cluster = []  # Ratkaisemattomat piikit [(aika, korkeus)]
+        
+        # Method 2: viimeisin raaka context + standardoitujen contextien rengas
+        self.ctx_raw = np.zeros(context)
+        self.ctx_ring = np.zeros((lookback_window - 1, context))
+        self.ctx_ring_valid = np.zeros(lookback_window - 1, dtype=bool)
+        
+        # Viimeistelemättömät ajat: [aika, bitit, correlation, dependency, interaction]
+        self.pending = deque()
+        self.emitted = []  # Emitoidut event-taulukot (vain jos keep_history=True)
+    
+    def _correlation(self):
+        """Method 1 korrelaatio ajalle t: sama lauseke kuin measure_classical_correlation:ssa"""
+        w, t = self.window_size, self.t
+        ts_window = self.ts_buf[(t - w + np.arange(w + 1)) % (w + 1)]
+        int_window = self.ir_buf[(t - w + np.arange(w)) % w]
+        if np.std(ts_window) > 0 and np.std(int_window) > 0:
+            correlation = np.corrcoef(ts_window[:-1], int_window)[0, 1]
+            if not np.isnan(correlation):
+                return abs(correlation)
+        return 0.0
+    
+    def _dependency_change(self):
+        """Method 2 tilasto ajalle t rengaspuskurista, NaN jos ei laskettavissa"""
+        t, c = self.t, self.context
+        if t < self.lookback_window:
+            return np.nan
+        std = self.ctx_raw.std()
+        if not std > 0:
+            return np.nan
+        current = (self.ctx_raw - self.ctx_raw.mean()) / std
+        
+        # Rivi lag-1 = context joka päättyi ajassa t-lag
+        lags = np.arange(1, self.lookback_window)
+        ring_rows = (t - lags) % (self.lookback_window - 1)
+        ok = self.ctx_ring_valid[ring_rows] & (t - lags - (c - 1) >= 0)
+        deps = np.abs(self.ctx_ring[ring_rows] @ current / c)[ok]
+        
+        if len(deps) > 3:
+            return float(np.std(np.minimum(deps, 1.0)))
+        return np.nan
+    
+    def _pending_row(self, time):
+        return self.pending[time - self.pending[0][0]]
+    
+    def _kept_peaks(self, peaks):
+        """correlation_peaks:n distance-sääntö klusterille: korkein (tasapelissä myöhempi)
+        piikki poistaa lähinaapurit"""
+        keep = [True] * len(peaks)
+        for i in sorted(range(len(peaks)), key=lambda k: (peaks[k][1], peaks[k][0]), reverse=True):
+            if not keep[i]:
+                continue
+            for j in range(len(peaks)):
+                if j != i and abs(peaks[j][0] - peaks[i][0]) < self.min_distance:
+                    keep[j] = False
+        return [peak for peak, kept in zip(peaks, keep) if kept]
+    
+    @staticmethod
+    def _mark_peaks(pending, peaks):
+        """Merkitse ratkaistut korrelaatiopiikit pending-riveihin"""
+        first = pending[0][0]
+        for time, height in peaks:
+            row = pending[time - first]
+            row[1] |= METHOD_BITS['correlation']
+            row[2] = height
+    
+    def _resolve_peaks(self):
+        self._mark_peaks(self.pending, self._kept_peaks(self.peak_cluster))
+        self.peak_cluster = []
+    
+    def _rows_to_events(self, pending_rows):
+        """Pending-rivit (aika, bitit, corr, dep, inter) -> DIVISION_EVENT_DTYPE-taulukko"""
+        rows = []
+        for time, bits, corr, dep, inter in pending_rows:
+            if bits:
+                score = sum(self.method_weights.get(m, 0.0)
+                            for m in DIVISION_METHODS if bits & METHOD_BITS[m])
+                rows.append((time, score, bits,
+                             corr if bits & METHOD_BITS['correlation'] else np.nan,
+                             dep if bits & METHOD_BITS['dependency'] else np.nan,
+                             inter if bits & METHOD_BITS['interaction'] else np.nan,
+                             np.nan, np.nan, np.nan))
+        return np.array(rows, dtype=DIVISION_EVENT_DTYPE)
+    
+    def _finalize(self, up_to):
+        """Emitoi viimeistellyt ajat <= up_to rakenteisena taulukkona"""
+        finished = []
+        while self.pending and self.pending[0][0] <= up_to:
+            finished.append(self.pending.popleft())
+        events = self._rows_to_events(finished)
+        self.n_events += len(events)
+        if len(events) and self.keep_history:
+            self.emitted.append(events)
+        return events
+    
+    def pending_events(self):
+        """
+        Viimeistelemättömät ajat kuin striimi päättyisi nyt, tilaa muuttamatta
+        Kopioi vain pending-hännän (korkeintaan min_distance + 2 + avoimen klusterin
+        pituus riviä), joten kysely on O(häntä) eikä O(historia).
+        """
+        if not self.pending:
+            return np.zeros(0, dtype=DIVISION_EVENT_DTYPE)
+        tail = [list(row) for row in self.pending]
+        if self.peak_cluster:
+            self._mark_peaks(tail, self._kept_peaks(self.peak_cluster))
+        return self._rows_to_events(tail)
+    
+    def update(self, x, interaction=None):
+        """
+        Syötä yksi näyte. Palauttaa tässä askeleessa viimeistellyt division events
+        (DIVISION_EVENT_DTYPE, yleensä 0 tai 1 riviä)
+        """
+        self.t += 1
+        t, w, c = self.t, self.window_size, self.context
+        x = float(x)
+        inter = np.nan if interaction is None else float(interaction)
+        
+        # --- Method 1: päivitä rengaspuskurit ---
+        self.ts_buf[t % (w + 1)] = x
+        if t >= 1:
+            self.ir_buf[(t - 1) % w] = 0.0 if np.isnan(inter) else inter
+        corr = self._correlation() if t >= w else 0.0
+        
+        # --- Method 2: context-ikkunat ---
+        self.ctx_raw = np.roll(self.ctx_raw, -1)
+        self.ctx_raw[-1] = x
+        dep = self._dependency_change()
+        
+        # --- Method 3: interaction-kynnys ---
+        bits = 0
+        if dep > self.change_threshold:
+            bits |= METHOD_BITS['dependency']
+        if inter > self.interaction_threshold:
+            bits |= METHOD_BITS['interaction']
+        self.pending.append([t, bits, 0.0, dep, inter])
+        
+        # Tallenna nykyinen context renkaaseen (käytetään tulevilla lageilla)
+        if t >= c - 1:
+            std = self.ctx_raw.std()
+            slot = t % (self.lookback_window - 1)
+            self.ctx_ring_valid[slot] = std > 0
+            self.ctx_ring[slot] = (self.ctx_raw - self.ctx_raw.mean()) / std if std > 0 else 0.0
+        
+        # Korrelaatiopiikit find_peaks:n tapaan: nousu c[s-1] < c[s], tasanne c[s..t-1],
+        # lasku c[t] < c[t-1] -> piikki tasanteen keskikohdassa (s + t - 1) // 2
+        if self.rise is not None and corr != self.rise[1]:
+            start, height = self.rise
+            if corr < height and height >= self.correlation_threshold:
+                self.peak_cluster.append(((start + t - 1) // 2, height))
+            self.rise = None
+        if self.rise is None and t >= 1 and corr > self.corr_prev:
+            self.rise = (t, corr)
+        self.corr_prev = corr
+        
+        # Seuraava mahdollinen piikki: avoimella tasanteella >= sen alku, muuten > t
+        next_peak = self.rise[0] if self.rise is not None else t + 1
+        if self.peak_cluster and next_peak - self.peak_cluster[-1][0] >= self.min_distance:
+            self._resolve_peaks()
+        
+        # Avoimen klusterin ja tasanteen ajat eivät ole vielä lopullisia
+        up_to = min(t - (self.min_distance + 2), next_peak - 1)
+        if self.peak_cluster:
+            up_to = min(up_to, self.peak_cluster[0][0] - 1)
+        return self._finalize(up_to)
+    
+    def update_many(self, xs, interactions=None):
+        """Syötä pala näytteitä; palauttaa palan aikana viimeistellyt events"""
+        if interactions is None:
+            interactions = [None] * len(xs)
+        chunks = [self.update(x, i) for x, i in zip(xs, interactions)]
+        return np.concatenate(chunks) if chunks else np.zeros(0, dtype=DIVISION_EVENT_DTYPE)
+    
+    def events_so_far(self, include_pending=True):
+        """
+        Kaikki tähän mennessä havaitut events aikajärjestyksessä
+        include_pending=True: lisää myös vielä viimeistelemättömät ajat kuin striimi
+        päättyisi nyt - tila ei muutu, joten syöttöä voi jatkaa (sarjan pidentäminen)
+        keep_history=False: emitoituja eventtejä ei säilytetä, joten palautuu vain häntä
+        """
+        parts = list(self.emitted)
+        if include_pending:
+            parts.append(self.pending_events())
+        return np.concatenate(parts) if parts else np.zeros(0, dtype=DIVISION_EVENT_DTYPE)
+    
+    def flush(self):
+        """Striimin loppu: vahvista avoin klusteri (sarjan loppuun jatkuva tasanne ei ole
+        piikki, kuten find_peaks:ssa) ja emitoi kaikki jäljellä olevat ajat"""
+        if self.peak_cluster:
+            self._resolve_peaks()
+        return self._finalize(self.t)
+
 def combined_division_detector(time_series, interaction_record, 
-                              method_weights={'correlation': 0.3, 'dependency': 0.2, 'interaction': 0.5}):
+                              method_weights={'correlation': 0.3, 'dependency': 0.2, 'interaction': 0.5},
+                              as_dicts=True, features=None, changepoint_cost='meanvar',
+                              regime=None, transfer=None):
     """
     Yhdistetty division events detector
     Kombinoi kaikki kolme menetelmää
     PÄIVITETTY: Korkeampi paino interaction-metodille (Barandes'in mukaan tärkeä)
+    PÄIVITETTY: Metodien osumat bool-maskeina, tulos rakenteisena taulukkona
+    (as_dicts=False) tai vanhana list-of-dicts muotona (as_dicts=True)
+    features: valmiiksi laskettu division_feature_matrix (uudelleenkynnystys)
+    MENETELMÄ 4 (valinnainen): PELT change-pointit, otetaan mukaan kun method_weights
+    sisältää 'changepoint'-painon; changepoint_cost valitsee kustannusfunktion
+    MENETELMÄ 5 (valinnainen): switching-AR HMM regiimit, 'regime'-painolla;
+    regime: valmiiksi batchina laskettu regime_switching_detector-tulos
+    MENETELMÄ 6 (valinnainen): pisteittäinen transfer entropy interaction -> sarja,
+    'transfer'-painolla; transfer: valmis transfer_entropy_detector-tulos
     """
-    # Käytä kaikkia menetelmiä
-    div1, correlations = detect_division_events_method1(time_series, interaction_record)
-    div2 = detect_division_events_method2(time_series)
-    div3 = detect_division_events_method3(time_series, interaction_record)
-    
-    # Kerää kaikki division events
-    all_events = {}
-    
-    # Menetelmä 1
-    for event in div1:
-        t = event['time']
-        if t not in all_events:
-            all_events[t] = {'score': 0, 'methods': [], 'details': {}}
-        all_events[t]['score'] += method_weights['correlation']
-        all_events[t]['methods'].append('correlation')
-        all_events[t]['details']['correlation'] = event['correlation_strength']
-    
-    # Menetelmä 2  
-    for event in div2:
-        t = event['time']
-        if t not in all_events:
-            all_events[t] = {'score': 0, 'methods': [], 'details': {}}
-        all_events[t]['score'] += method_weights['dependency']
-        all_events[t]['methods'].append('dependency')
-        all_events[t]['details']['dependency'] = event['dependency_change']
-    
-    # Menetelmä 3
-    for event in div3:
-        t = event['time']
-        if t not in all_events:
-            all_events[t] = {'score': 0, 'methods': [], 'details': {}}
-        all_events[t]['score'] += method_weights['interaction']
-        all_events[t]['methods'].append('interaction')
-        all_events[t]['details']['interaction'] = event['interaction_strength']
-    
-    # Sorttaa pistemäärän mukaan
-    final_division_events = []
-    for t, data in all_events.items():
-        final_division_events.append({
-            'time': t,
-            'score': data['score'],
-            'methods': data['methods'],
-            'details': data['details']
-        })
+    # Kaikkien metodien tilastot yhdellä fused-läpikäynnillä
+    if features is None:
+        features = division_feature_matrix(time_series, interaction_record)
+    correlations = features[:, 0]
+    
+    changepoints = None
+    if method_weights.get('changepoint', 0.0) > 0:
+        changepoints = pelt_change_points(time_series, cost=changepoint_cost)
+    
+    if method_weights.get('regime', 0.0) > 0 and regime is None:
+        regime = regime_switching_detector(time_series)
+    elif method_weights.get('regime', 0.0) <= 0:
+        regime = None
+    
+    if method_weights.get('transfer', 0.0) > 0 and transfer is None:
+        transfer = transfer_entropy_detector(time_series, interaction_record)
+    elif method_weights.get('transfer', 0.0) <= 0:
+        transfer = None
+    
+    events = detect_from_features(features, method_weights, changepoints=changepoints,
+                                  regime=regime, transfer=transfer)
+    
+    if as_dicts:
+        return division_events_to_dicts(events), correlations
+    return events, correlations
+
+# =============================================================================
+# DETECTOR BENCHMARK - GROUND TRUTH VERTAILU (KOPIOT MODUULEISTA 1, 6 JA 9)
+# =============================================================================
+# Moduulit eivät importtaa toisiaan, joten vertailtavat detektorit ovat kopioita.
+# Jokainen kopio vastaa lähdemoduulin samannimistä funktiota; päivitä kopio kun lähde muuttuu:
+#   known_indivisible_example              <- Moduuli 1 (lisätty rng-parametri)
+#   measure_classical_correlation_simple   <- Moduuli 6: measure_classical_correlation
+#   detect_division_events_simple          <- Moduuli 6 (as_dicts=False -polku)
+#   measure_classical_correlation_fast     <- Moduuli 9
+#   detect_division_events_fast            <- Moduuli 9
+# Moduuli 6:n PELT-kopion sijaan käytetään tämän moduulin pelt_change_points:ia
+# samoilla asetuksilla (meanvar, BIC-penalty 3 log n, min_size 4, max_segment 500).
+
+# Pieni oletusajo jokaisella Moduuli 2 -ajolla (tarkkuuden referenssitaso);
+# FULL_BENCHMARK = True ajaa koko (division_rate x pituus) -gridin
+BENCHMARK_CONFIG = {'division_rates': (0.15,), 'lengths': (1000,), 'n_trials': 3}
+FULL_BENCHMARK = False
+
+def known_indivisible_example(n_steps=1000, division_rate=0.15, rng=None):
+    """Kopio Moduuli 1:stä - ground truth division_times benchmarkia varten
+    rng: np.random.Generator (oletus: uusi default_rng), ei koske globaaliin tilaan"""
+    rng = np.random.default_rng() if rng is None else rng
+    time_series = [rng.normal(0, 1)]
+    interaction_record = []
+    division_times = []
+    current_state = time_series[0]
+    
+    for t in range(1, n_steps):
+        if rng.random() < division_rate:
+            division_times.append(t)
+            memory_influence = time_series[division_times[-2]] * 0.3 if len(division_times) > 1 else 0
+            current_state = memory_influence + rng.normal(0, 1)
+            interaction_record.append(1.0)
+        else:
+            current_state = 0.9 * current_state + rng.normal(0, 0.1)
+            interaction_record.append(0.0)
+        time_series.append(current_state)
+    
+    return {
+        'time_series': np.array(time_series),
+        'interaction_record': np.array(interaction_record),
+        'division_times': division_times
+    }
+
+def measure_classical_correlation_simple(time_series, interaction_record, window_size=8):
+    """Kopio Moduuli 6:n measure_classical_correlation:sta"""
+    n = len(time_series)
+    correlations = np.zeros(n)
+    
+    if n < window_size * 2 or len(interaction_record) < window_size:
+        return correlations
+    
+    for t in range(window_size, min(n, len(interaction_record) + 1)):
+        try:
+            ts_window = time_series[t-window_size:t+1]
+            int_window = interaction_record[max(0, t-window_size):t]
+            
+            if len(ts_window) > 3 and len(int_window) > 3:
+                if np.std(ts_window) > 1e-6 and np.std(int_window) > 1e-6:
+                    min_len = min(len(ts_window)-1, len(int_window))
+                    ts_trim = ts_window[:min_len]
+                    int_trim = int_window[:min_len]
+                    
+                    if len(ts_trim) > 2 and len(int_trim) > 2:
+                        correlation = abs(np.corrcoef(ts_trim, int_trim)[0, 1])
+                        if not (np.isnan(correlation) or np.isinf(correlation)):
+                            correlations[t] = correlation
+        except:
+            continue
+    
+    return correlations
+
+def detect_division_events_simple(time_series, interaction_record, changepoints=False):
+    """Kopio Moduuli 6:sta (as_dicts=False -polku)
+    changepoints=True lisää PELT-muutoskohdat kolmanneksi metodiksi"""
+    n = len(time_series)
+    if n < 10 or len(interaction_record) < 5:
+        return np.zeros(0, dtype=np.int32), np.zeros(0)
+    
+    correlations = np.zeros(n)
+    correlation_mask = np.zeros(n, dtype=bool)
+    try:
+        correlations = measure_classical_correlation_simple(time_series, interaction_record)
+        if np.any(correlations > 0):
+            correlation_mask[find_peaks(correlations, height=0.2, distance=5)[0]] = True
+    except:
+        pass
+    
+    interaction_mask = np.zeros(n, dtype=bool)
+    interaction_mask[1:len(interaction_record) + 1] = interaction_record[:n - 1] > 0.3
+    
+    changepoint_mask = np.zeros(n, dtype=bool)
+    if changepoints:
+        changepoint_mask[pelt_change_points(time_series, cost='meanvar', min_size=4)[0]] = True
+    
+    event_mask = correlation_mask | interaction_mask | changepoint_mask
+    event_mask[0] = False
+    
+    score = 0.5 + 0.4 * interaction_mask + 0.3 * (correlations > 0.2) + 0.2 * changepoint_mask
+    times = np.flatnonzero(event_mask).astype(np.int32)
+    return times, np.minimum(1.0, score[times])
+
+def measure_classical_correlation_fast(time_series, interaction_record, window_size=6):
+    """Kopio Moduuli 9:stä"""
+    n = len(time_series)
+    correlations = np.zeros(n)
+    
+    if n < window_size * 2 or len(interaction_record) < window_size:
+        return correlations
+    
+    for t in range(window_size, min(n, len(interaction_record) + 1)):
+        try:
+            ts_window = time_series[t-window_size:t]
+            int_window = interaction_record[max(0, t-window_size):t]
+            
+            min_len = min(len(ts_window), len(int_window))
+            if min_len > 3:
+                ts_trim = ts_window[:min_len]
+                int_trim = int_window[:min_len]
+                
+                if np.std(ts_trim) > 1e-6 and np.std(int_trim) > 1e-6:
+                    correlation = abs(np.corrcoef(ts_trim, int_trim)[0, 1])
+                    if not (np.isnan(correlation) or np.isinf(correlation)):
+                        correlations[t] = correlation
+        except:
+            continue
+    
+    return correlations
+
+def detect_division_events_fast(time_series, interaction_record):
+    """Kopio Moduuli 9:stä (kynnykset 0.15 / 0.4, distance=3, perus-score 0.4)"""
+    if len(time_series) < 10:
+        return []
+    
+    division_events = []
     
-    final_division_events.sort(key=lambda x: x['score'], reverse=True)
+    try:
+        correlations = measure_classical_correlation_fast(time_series, interaction_record)
+        if np.any(correlations > 0):
+            correlation_events = find_peaks(correlations, height=0.15, distance=3)[0]
+        else:
+            correlation_events = []
+    except:
+        correlation_events = []
     
-    return final_division_events, correlations
+    try:
+        interaction_events = np.where(interaction_record > 0.4)[0]
+    except:
+        interaction_events = []
+    
+    all_events = set(correlation_events) | set(interaction_events + 1)
+    
+    for t in all_events:
+        if 0 < t < len(time_series):
+            score = 0.4
+            try:
+                if t-1 < len(interaction_record) and interaction_record[t-1] > 0.4:
+                    score += 0.4
+                if t < len(correlations) and correlations[t] > 0.15:
+                    score += 0.3
+            except:
+                pass
+            
+            division_events.append({'time': int(t), 'score': min(1.0, score)})
+    
+    return division_events
+
+# Benchmarkattavat detektorit: nimi -> funktio(time_series, interaction_record) -> event-ajat
+BENCHMARK_DETECTORS = {
+    'combined': lambda ts, ir: DivisionEventIndex(
+        combined_division_detector(ts, ir, as_dicts=False)[0]).above(0.3)['time'],
+    'simple': lambda ts, ir: detect_division_events_simple(ts, ir)[0],
+    'simple_pelt': lambda ts, ir: detect_division_events_simple(ts, ir, changepoints=True)[0],
+    'fast': lambda ts, ir: np.array(sorted(e['time'] for e in detect_division_events_fast(ts, ir)), dtype=np.int32),
+    'regime_hmm': lambda ts, ir: regime_switching_detector(ts)['division_times'],  # Ei käytä interaction_record:ia
+    'transfer_entropy': lambda ts, ir: transfer_entropy_detector(ts, ir)['division_times'],
+}
+
+def benchmark_division_detectors(detectors=None, division_rates=(0.05, 0.15, 0.3),
+                                 lengths=(500, 1000, 2000), n_trials=5, tolerance=2, seed=42):
+    """
+    Tarkkuus- ja nopeusbenchmark ground truth division_times:ia vastaan
+    Jokaiselle (division_rate, pituus) -parille generoidaan n_trials sarjaa, joita
+    kaikki detektorit ajavat. Raportoi keskimääräiset precision/recall/F1
+    (tolerance-ikkunalla), samples/s ja huippumuistin (tracemalloc, erillinen ajo
+    ensimmäiselle sarjalle, jotta seuranta ei vääristä ajoitusta).
+    """
+    import time
+    import tracemalloc
+    
+    detectors = BENCHMARK_DETECTORS if detectors is None else detectors
+    rng = np.random.default_rng(seed)  # Paikallinen generaattori, globaali tila ennallaan
+    results = {name: [] for name in detectors}
+    
+    for division_rate in division_rates:
+        for n_steps in lengths:
+            batch = [known_indivisible_example(n_steps, division_rate, rng=rng) for _ in range(n_trials)]
+            
+            for name, detector in detectors.items():
+                scores, elapsed = [], 0.0
+                for process in batch:
+                    start = time.perf_counter()
+                    detected = detector(process['time_series'], process['interaction_record'])
+                    elapsed += time.perf_counter() - start
+                    scores.append(division_timing_scores(detected, process['division_times'], tolerance))
+                
+                tracemalloc.start()
+                detector(batch[0]['time_series'], batch[0]['interaction_record'])
+                _, peak_memory = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                
+                results[name].append({
+                    'division_rate': float(division_rate),
+                    'length': int(n_steps),
+                    'precision': float(np.mean([s['precision'] for s in scores])),
+                    'recall': float(np.mean([s['recall'] for s in scores])),
+                    'f1': float(np.mean([s['f1'] for s in scores])),
+                    'samples_per_second': float(n_trials * n_steps / max(elapsed, 1e-12)),
+                    'peak_memory_mb': float(peak_memory / 1e6)
+                })
+    
+    return results
 
 # =============================================================================
 # TESTAA DIVISION EVENTS DETECTOR REFERENSSIPROSESSEILLA
@@ -212,6 +1602,8 @@ except FileNotFoundError:
 print("\n🔍 Testaan division events detectoria...")
 
 detection_results = {}
+division_features = {}  # Tallennetaan uudelleenkynnystystä varten
+strong_indexes = {}  # Vahvat eventit (ikkuna- ja aikakyselyt)
 
 for name, process in references.items():
     print(f"\n📊 Analysoidaan: {name}")
@@ -219,9 +1611,13 @@ for name, process in references.items():
     time_series = process['time_series']
     interaction_record = process['interaction_record']
     
-    # Käytä yhdistettyä detectoria
+    # Fused feature -matriisi kerran per sarja
+    division_features[name] = division_feature_matrix(time_series, interaction_record)
+    
+    # Käytä yhdistettyä detectoria (rakenteinen taulukko)
     division_events, correlations = combined_division_detector(
-        time_series, interaction_record
+        time_series, interaction_record, as_dicts=False,
+        features=division_features[name]
     )
     
     # DEBUG: Näytä metodien tulokset erikseen indivisible-prosessille
@@ -233,29 +1629,29 @@ for name, process in references.items():
         print(f"    🔍 DEBUG - Method 2 (dependency): {len(div2)} events")  
         print(f"    🔍 DEBUG - Method 3 (interaction): {len(div3)} events")
         print(f"    🔍 DEBUG - Interaction events in record: {np.sum(interaction_record > 0)}")
+        pelt_times, _ = pelt_change_points(time_series, cost='meanvar')
+        print(f"    🔍 DEBUG - Method 4 (PELT changepoint): {len(pelt_times)} events")
     
     # Suodata vain vahvimmat division events - alempi kynnys indivisible-prosesseille
+    event_index = DivisionEventIndex(division_events)
     if name == 'indivisible':
-        strong_events = [e for e in division_events if e['score'] > 0.3]  # Alempi kynnys
+        strong_events = event_index.above(0.3)  # Alempi kynnys
     else:
-        strong_events = [e for e in division_events if e['score'] > 0.5]  # Normaali kynnys
+        strong_events = event_index.above(0.5)  # Normaali kynnys
+    strong_indexes[name] = DivisionEventIndex(strong_events)
     
     detection_results[name] = {
         'total_division_events': int(len(division_events)),
         'strong_division_events': int(len(strong_events)),
         'division_rate': float(len(strong_events) / len(time_series)),
         'expected_events': int(process['expected_division_events']),
-        'division_events_list': [
-            {
-                'time': int(e['time']),
-                'score': float(e['score']),
-                'methods': e['methods'],
-                'details': {k: float(v) if isinstance(v, (np.integer, np.floating)) else v 
-                          for k, v in e['details'].items()}
-            } for e in strong_events[:10]
-        ],  # Top 10, JSON-safe
+        'division_events_list': division_events_to_dicts(strong_events[:10]),  # Top 10, JSON-safe
         'correlations_mean': float(np.mean(correlations)),
-        'correlations_max': float(np.max(correlations))
+        'correlations_max': float(np.max(correlations)),
+        'correlation_window_sweep': {
+            str(w): int(len(p)) for w, p in
+            correlation_window_sweep(time_series, interaction_record)['peaks'].items()
+        }  # Korrelaatiopiikkien määrä per ikkunakoko
     }
     
     print(f"  🎯 Found {len(strong_events)} strong division events " 
@@ -264,6 +1660,148 @@ for name, process in references.items():
     print(f"  📈 Correlation stats: mean={detection_results[name]['correlations_mean']:.3f}, "
           f"max={detection_results[name]['correlations_max']:.3f}")
 
+# =============================================================================
+# FEATURE KERNEL - KONSISTENSSITARKISTUS DISKREETEILLÄ SARJOILLA
+# =============================================================================
+
+# 0/1- ja porrassarjoilla korrelaatiossa on tarkkoja tasanteita: fused kernelin pitää
+# antaa bitilleen sama korrelaatio ja samat piikit kuin per-metodi-silmukka (method 1)
+print("\n🧮 Feature kernel vs. method 1 (diskreetit sarjat):")
+check_rng = np.random.default_rng(0)
+discrete_checks = {
+    'binary': ((check_rng.random(1000) < 0.5).astype(float),
+               (check_rng.random(999) < 0.2).astype(float)),
+    'step': (np.repeat(check_rng.integers(0, 3, 50), 20).astype(float),
+             (check_rng.random(999) < 0.2).astype(float))
+}
+for check_name, (check_ts, check_ir) in discrete_checks.items():
+    check_features = division_feature_matrix(check_ts, check_ir)
+    method1_events, method1_correlations = detect_division_events_method1(check_ts, check_ir)
+    feature_events = detect_from_features(check_features)
+    feature_peaks = np.sort(feature_events['time'][(feature_events['methods'] & METHOD_BITS['correlation']) > 0])
+    check_match = (np.array_equal(check_features[:, 0], method1_correlations) and
+                   np.array_equal(feature_peaks, [e['time'] for e in method1_events]))
+    print(f"  {'✅' if check_match else '⚠️'} {check_name}: {len(method1_events)} korrelaatiopiikkiä")
+
+# =============================================================================
+# PELT - LINEAARISUUSTARKISTUS (WHITE NOISE, EI MUUTOSKOHTIA)
+# =============================================================================
+
+# Ilman muutoskohtia karsinta ei auta; oletus-max_segment pitää ajan lineaarisena
+print("\n⏱️ PELT white noise -ajoitus (oletus max_segment):")
+pelt_rng = np.random.default_rng(0)
+pelt_timings = {}
+for pelt_n in (100_000, 200_000):
+    pelt_noise = pelt_rng.normal(size=pelt_n)
+    pelt_start = time.perf_counter()
+    pelt_noise_cps, _ = pelt_change_points(pelt_noise, cost='meanvar')
+    pelt_timings[pelt_n] = time.perf_counter() - pelt_start
+    print(f"  n={pelt_n:,}: {pelt_timings[pelt_n]:.2f} s, {len(pelt_noise_cps)} muutoskohtaa")
+pelt_ratio = pelt_timings[200_000] / pelt_timings[100_000]
+print(f"  {'✅' if pelt_ratio < 3 else '⚠️'} Aikasuhde 2n / n: {pelt_ratio:.2f} (lineaarinen ~2, neliöllinen ~4)")
+
+# =============================================================================
+# STREAMING DETECTOR - KONSISTENSSITARKISTUS
+# =============================================================================
+
+print("\n🌊 Streaming detector vs. batch (indivisible):")
+stream_process = references['indivisible']
+stream_detector = StreamingDivisionDetector()
+stream_events = stream_detector.update_many(
+    stream_process['time_series'], [None] + list(stream_process['interaction_record'])
+)
+stream_events = np.concatenate([stream_events, stream_detector.flush()])
+batch_events, _ = combined_division_detector(
+    stream_process['time_series'], stream_process['interaction_record'], as_dicts=False,
+    features=division_features['indivisible']
+)
+stream_sorted = np.sort(stream_events, order='time')
+batch_sorted = np.sort(batch_events, order='time')
+stream_match = (np.array_equal(stream_sorted['time'], batch_sorted['time']) and
+                np.array_equal(stream_sorted['methods'], batch_sorted['methods']) and
+                np.allclose(stream_sorted['score'], batch_sorted['score']))
+print(f"  {'✅' if stream_match else '⚠️'} Streaming: {len(stream_events)} events, "
+      f"batch: {len(batch_events)} events")
+
+# =============================================================================
+# REGIME HMM - VERTAILU GROUND TRUTH DIVISION_TIMES:IIN
+# =============================================================================
+
+print("\n🧭 Switching-AR HMM regime-detektori (kaikki referenssit yhtenä batchina):")
+regime_names = list(references.keys())
+regime_lengths = {len(references[name]['time_series']) for name in regime_names}
+if len(regime_lengths) == 1:
+    regime_batch = np.stack([references[name]['time_series'] for name in regime_names])
+    regime_batch_result = regime_switching_detector(regime_batch)
+    regime_results = {
+        name: {'posteriors': regime_batch_result['posteriors'][i],
+               'division_times': regime_batch_result['division_times'][i]}
+        for i, name in enumerate(regime_names)
+    }
+else:
+    regime_results = {name: regime_switching_detector(references[name]['time_series'])
+                      for name in regime_names}
+
+for name, process in references.items():
+    regime_times = regime_results[name]['division_times']
+    detection_results[name]['regime_division_rate'] = float(len(regime_times) / len(process['time_series']))
+    print(f"  {name}: {len(regime_times)} regime division events "
+          f"(rate: {detection_results[name]['regime_division_rate']:.3f})")
+    
+    if 'division_times' in process:
+        strong_times = strong_indexes[name].times
+        detection_results[name]['regime_benchmark'] = {
+            'hmm': division_timing_scores(regime_times, process['division_times'], tolerance=2),
+            'combined': division_timing_scores(strong_times, process['division_times'], tolerance=2)
+        }
+        for method, scores in detection_results[name]['regime_benchmark'].items():
+            print(f"    🎯 {method}: precision={scores['precision']:.3f}, "
+                  f"recall={scores['recall']:.3f}, F1={scores['f1']:.3f}")
+
+# =============================================================================
+# TRANSFER ENTROPY - INTERACTION RECORD -> TIME SERIES
+# =============================================================================
+
+print("\n📡 Transfer entropy TE(interaction -> time series), sekoitetut surrogaatit:")
+for name, process in references.items():
+    te_test = transfer_entropy_test(process['time_series'], process['interaction_record'],
+                                    history_lengths=(1, 2, 3), n_surrogates=200, seed=42)
+    detection_results[name]['transfer_entropy'] = {
+        str(h): {'te': float(te_test['te'][k]),
+                 'effective_te': float(te_test['effective_te'][k]),
+                 'p_value': float(te_test['p_values'][k])}
+        for k, h in enumerate(te_test['history_lengths'])
+    }
+    print(f"  {name}: " + ", ".join(
+        f"h={h}: {te_test['effective_te'][k]:.3f} nat (p={te_test['p_values'][k]:.3f})"
+        for k, h in enumerate(te_test['history_lengths'])))
+
+# =============================================================================
+# GRANGER-KAUSAALISUUS - INTERACTION RECORD -> TIME SERIES
+# =============================================================================
+
+print("\n🔗 Granger-kausaalisuus (kaikki referenssit yhtenä batchina, viiveet 1-5):")
+if len(regime_lengths) == 1:
+    granger_batch = granger_causality_test(
+        regime_batch, np.stack([references[name]['interaction_record'] for name in regime_names]))
+    granger_results = {name: {'f_stat': granger_batch['f_stat'][i], 'p_values': granger_batch['p_values'][i],
+                              'lags': granger_batch['lags']}
+                       for i, name in enumerate(regime_names)}
+else:
+    granger_results = {name: granger_causality_test(references[name]['time_series'],
+                                                    references[name]['interaction_record'])
+                       for name in regime_names}
+
+for name in regime_names:
+    granger = granger_results[name]
+    detection_results[name]['granger'] = {
+        str(p): {'f_stat': float(granger['f_stat'][k]), 'p_value': float(granger['p_values'][k])}
+        for k, p in enumerate(granger['lags'])
+    }
+    best = int(np.argmin(granger['p_values']))
+    print(f"  {name}: min p={granger['p_values'][best]:.4f} (viive {granger['lags'][best]}, "
+          f"F={granger['f_stat'][best]:.2f})")
+
 # =============================================================================
 # KRIITTISYYSANALYYSI
 # =============================================================================
@@ -298,6 +1836,31 @@ else:
     for warning in warnings:
         print(warning)
 
+# =============================================================================
+# DETECTOR BENCHMARK - TARKKUUDEN REFERENSSITASO
+# =============================================================================
+
+# Oletuksena pieni konfiguraatio; P/R/F1 tallentuu division detection -JSON:iin
+print("\n⏱️ Detector benchmark (ground truth division_times, tolerance ±2):")
+benchmark_results = (benchmark_division_detectors() if FULL_BENCHMARK
+                     else benchmark_division_detectors(**BENCHMARK_CONFIG))
+for detector_name, rows in benchmark_results.items():
+    for row in rows:
+        print(f"  {detector_name:>16s} rate={row['division_rate']:.2f} n={row['length']:5d}: "
+              f"F1={row['f1']:.3f} (P={row['precision']:.3f}, R={row['recall']:.3f}), "
+              f"{row['samples_per_second']:,.0f} samples/s, {row['peak_memory_mb']:.2f} MB")
+
+detection_results['detector_benchmark'] = {
+    detector_name: [{key: row[key] for key in ('division_rate', 'length', 'precision', 'recall', 'f1')}
+                    for row in rows]
+    for detector_name, rows in benchmark_results.items()
+}
+
+benchmark_file = f"{RESULTS_DIR}/{TIMESTAMP}_02_detector_benchmark.json"
+with open(benchmark_file, 'w') as f:
+    json.dump(benchmark_results, f, indent=2)
+print(f"⏱️ Detector benchmark (myös nopeus ja muisti) tallennettu: {benchmark_file}")
+
 # =============================================================================
 # TALLENNA TULOKSET
 # =============================================================================
@@ -309,6 +1872,21 @@ with open(results_file, 'w') as f:
 
 print(f"\n📊 Division detection tulokset tallennettu: {results_file}")
 
+# Kynnyspyyhkäisy välimuistetuista featureista (kaikki kynnykset kerralla)
+threshold_sweeps = {name: division_threshold_sweep(features)
+                    for name, features in division_features.items()}
+for name, sweep in threshold_sweeps.items():
+    rates = sweep['division_rate'][..., 0]
+    print(f"  🎚️ {name}: division rate (strong > {sweep['strong_thresholds'][0]}) "
+          f"välillä {rates.min():.3f}-{rates.max():.3f} kynnysgridissä")
+
+# Feature-matriisit pickle:nä (uudelleenkynnystys ilman detektorien ajoa)
+features_file = f"{RESULTS_DIR}/{TIMESTAMP}_02_division_features.pkl"
+with open(features_file, 'wb') as f:
+    pickle.dump({'columns': DIVISION_FEATURE_COLUMNS, 'features': division_features,
+                 'threshold_sweeps': threshold_sweeps}, f)
+print(f"🗃️ Division features tallennettu: {features_file}")
+
 # Visualisointi
 fig, axes = plt.subplots(2, 2, figsize=(15, 10))
 axes = axes.flatten()
@@ -319,13 +1897,13 @@ for i, (name, process) in enumerate(references.items()):
     # Plottaa aikasarja
     axes[i].plot(time_series, alpha=0.7, color='blue', label='Time series')
     
-    # Merkitse division events
-    events = detection_results[name]['division_events_list']
-    event_times = [e['time'] for e in events if e['time'] < 300]
-    event_scores = [e['score'] for e in events if e['time'] < 300]
+    # Merkitse division events (top 10 -eventit näytettävästä ikkunasta, aikaindeksillä)
+    plot_events = DivisionEventIndex.from_dicts(detection_results[name]['division_events_list']).window(stop=300)
+    event_times = plot_events['time']
+    event_scores = plot_events['score']
     
-    if event_times:
-        scatter = axes[i].scatter(event_times, [time_series[t] for t in event_times], 
+    if len(event_times):
+        scatter = axes[i].scatter(event_times, time_series[event_times], 
                        c=event_scores, cmap='Reds', s=100, alpha=0.8, 
                        label=f'Division events ({len(event_times)})')
         plt.colorbar(scatter, ax=axes[i], shrink=0.8)
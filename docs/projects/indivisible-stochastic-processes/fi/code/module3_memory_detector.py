@@ -4,57 +4,103 @@
 import numpy as np
 import matplotlib.pyplot as plt
 from scipy import stats
+from scipy.signal import find_peaks
+from scipy.spatial import cKDTree
+from scipy.special import digamma
 import json
 import pickle
 from datetime import datetime
 import glob
+import math
+import hashlib
+from collections import OrderedDict
+
+# Natiivi mutual information -kernel (korvaa sklearn mutual_info_score:n)
+def entropy_from_counts(counts, axis=-1):
+    """
+    Shannon-entropia (nats) suoraan frekvensseistä
+    H = log(N) - sum(c * log c) / N, tyhjät binit ohitetaan
+    """
+    counts = np.asarray(counts, dtype=float)
+    total = counts.sum(axis=axis)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        c_log_c = np.where(counts > 0, counts * np.log(np.where(counts > 0, counts, 1.0)), 0.0)
+        h = np.log(total) - c_log_c.sum(axis=axis) / total
+    return np.where(total > 0, h, 0.0)
+
+def discrete_mutual_information(x_codes, y_codes, n_x=None, n_y=None):
+    """
+    Nopea diskreetti mutual information bincount-kernelillä
+    Yhteissymboli koodataan x*k+y ja frekvenssit lasketaan yhdellä np.bincount:lla.
+    BATCH: x_codes ja y_codes voivat olla muotoa (m, n) - jokainen rivi on oma
+    (x, y)-pari (esim. kaikki lagit samasta sarjasta), palauttaa (m,) taulukon.
+    Koodien pitää olla ei-negatiivisia kokonaislukuja (< n_x, < n_y).
+    """
+    x_codes = np.asarray(x_codes, dtype=np.int64)
+    y_codes = np.asarray(y_codes, dtype=np.int64)
+    single = x_codes.ndim == 1
+    x_codes = np.atleast_2d(x_codes)
+    y_codes = np.atleast_2d(y_codes)
+    x_codes, y_codes = np.broadcast_arrays(x_codes, y_codes)
+    
+    m, n = x_codes.shape
+    if n == 0:
+        mi = np.zeros(m)
+        return float(mi[0]) if single else mi
+    
+    if n_x is None:
+        n_x = int(x_codes.max()) + 1
+    if n_y is None:
+        n_y = int(y_codes.max()) + 1
+    
+    # Yksi bincount kaikille riveille: rivi-offset + x*k + y
+    block = n_x * n_y
+    row_offset = (np.arange(m, dtype=np.int64) * block)[:, None]
+    joint_codes = row_offset + x_codes * n_y + y_codes
+    joint_counts = np.bincount(joint_codes.ravel(), minlength=m * block).reshape(m, n_x, n_y)
+    
+    # Entropiat frekvensseistä: I(X;Y) = H(X) + H(Y) - H(X,Y)
+    h_x = entropy_from_counts(joint_counts.sum(axis=2))
+    h_y = entropy_from_counts(joint_counts.sum(axis=1))
+    h_xy = entropy_from_counts(joint_counts.reshape(m, block))
+    mi = np.maximum(0.0, h_x + h_y - h_xy)
+    
+    return float(mi[0]) if single else mi
+
+def lagged_mutual_information(discretized, max_lag=10, n_bins=None):
+    """
+    I(X_t; X_{t-k}) kaikille lageille k=1..max_lag yhdellä kernel-kutsulla
+    Kaikki parit käyttävät samaa aikaväliä t = max_lag..n-1, joten tulokset
+    ovat vertailukelpoisia lagien välillä.
+    """
+    discretized = np.asarray(discretized, dtype=np.int64)
+    n = len(discretized)
+    if n <= max_lag:
+        return np.zeros(max_lag)
+    
+    present = discretized[max_lag:]
+    # (max_lag, n - max_lag) näkymät menneisyyteen ilman kopiointia: rivi i = X_{t-(i+1)}
+    windows = np.lib.stride_tricks.sliding_window_view(discretized, n - max_lag)
+    past = windows[max_lag - 1::-1]
+    
+    return discrete_mutual_information(present[None, :], past, n_bins, n_bins)
 
-# Korvaa sklearn mutual_info_score scipy-versiolla
 def mutual_info_score(x, y):
     """
-    Parannettu mutual information scipy:llä
+    Mutual information kahden label-sarjan välillä (nats)
+    Sama tulos kuin sklearn.metrics.mutual_info_score, mutta natiivi bincount-kernel
     """
-    try:
-        from sklearn.metrics import mutual_info_score as sklearn_mi
-        return sklearn_mi(x, y)
-    except ImportError:
-        # Fallback: käytä histogrammi-pohjaista laskentaa
-        from scipy.stats import entropy
-        
-        # Varmista että input on valid
-        if len(x) != len(y) or len(x) < 10:
-            return 0.0
-            
-        # Poista NaN arvot
-        valid_mask = ~(np.isnan(x) | np.isnan(y))
-        x_clean = x[valid_mask]
-        y_clean = y[valid_mask]
-        
-        if len(x_clean) < 5:
-            return 0.0
-        
-        # Normalisoi [0, 1] välille
-        x_norm = (x_clean - x_clean.min()) / (x_clean.max() - x_clean.min() + 1e-10)
-        y_norm = (y_clean - y_clean.min()) / (y_clean.max() - y_clean.min() + 1e-10)
-        
-        # Discretize 5 biniin (ei liikaa)
-        x_discrete = np.digitize(x_norm, np.linspace(0, 1, 6)) - 1
-        y_discrete = np.digitize(y_norm, np.linspace(0, 1, 6)) - 1
-        
-        # Laske entropiat
-        x_entropy = entropy(np.bincount(x_discrete, minlength=5) + 1e-10)
-        y_entropy = entropy(np.bincount(y_discrete, minlength=5) + 1e-10)
-        
-        # Joint entropy
-        joint_counts = np.zeros((5, 5))
-        for i in range(len(x_discrete)):
-            joint_counts[x_discrete[i], y_discrete[i]] += 1
-        joint_entropy = entropy((joint_counts + 1e-10).flatten())
-        
-        # Mutual information = H(X) + H(Y) - H(X,Y)
-        mi = x_entropy + y_entropy - joint_entropy
-        
-        return max(0, mi)
+    x = np.asarray(x)
+    y = np.asarray(y)
+    
+    if len(x) != len(y) or len(x) == 0:
+        return 0.0
+    
+    # Labelit -> kokonaislukukoodit (kuten sklearn contingency matrix)
+    x_labels, x_codes = np.unique(x, return_inverse=True)
+    y_labels, y_codes = np.unique(y, return_inverse=True)
+    
+    return discrete_mutual_information(x_codes, y_codes, len(x_labels), len(y_labels))
 
 # Lataa timestamp Moduuli 1:stä
 timestamp_file = "/content/drive/MyDrive/indivisible_research_*/session_timestamp.txt"
@@ -90,34 +136,190 @@ def discretize_time_series(time_series, n_bins=10):
     
     return discretized
 
-def conditional_independence_test(present, past_lag1, past_lag2, n_bins=10):
+# Diskretisointivälimuisti: (muoto, dtype, n_bins, sisällön tiiviste) -> koodit
+# Avain on sisältöpohjainen, joten paikallaan muokattu sarja ei palauta vanhentuneita
+# koodeja; koko rajattu (LRU), eikä välimuisti pidä viitteitä alkuperäisiin sarjoihin.
+DISCRETIZATION_CACHE = OrderedDict()
+DISCRETIZATION_CACHE_SIZE = 32
+
+def cached_discretization(time_series, n_bins=10):
+    """
+    Diskretisoi sarja kerran per (sarjan sisältö, n_bins) ja palauta välimuistista
+    Toistuvat MI/CMI/Markov-testit samalle sarjalle käyttävät samoja quantile-binejä
+    ja koodeja. Koodit ovat read-only, koska lagatut muuttujat jaetaan niistä
+    zero-copy slicenä.
+    """
+    x = np.ascontiguousarray(time_series)
+    key = (x.shape, x.dtype.str, n_bins, hashlib.blake2b(x.view(np.uint8), digest_size=16).digest())
+    codes = DISCRETIZATION_CACHE.get(key)
+    if codes is not None:
+        DISCRETIZATION_CACHE.move_to_end(key)
+        return codes
+    
+    codes = discretize_time_series(x, n_bins).astype(np.int64)
+    codes.setflags(write=False)
+    DISCRETIZATION_CACHE[key] = codes
+    while len(DISCRETIZATION_CACHE) > DISCRETIZATION_CACHE_SIZE:
+        DISCRETIZATION_CACHE.popitem(last=False)
+    return codes
+
+def clear_discretization_cache():
+    """Tyhjennä diskretisointivälimuisti (kutsutaan jokaisen prosessin analyysin lopussa)"""
+    DISCRETIZATION_CACHE.clear()
+
+def shifted_codes(time_series, lags, n_bins=10):
+    """
+    Lagatut diskreetit muuttujat zero-copy slicenä samasta koodi-taulukosta
+    Palauttaa (present, {k: X_{t-k}}) yhteisellä aikavälillä t = max(lags)..n-1
+    """
+    codes = cached_discretization(time_series, n_bins)
+    n = len(codes)
+    max_lag = max(lags)
+    present = codes[max_lag:]
+    past = {k: codes[max_lag - k:n - k] for k in lags}
+    return present, past
+
+def ksg_prepare(*variables, noise=1e-10, seed=0):
+    """
+    KSG-esikäsittely: standardointi ja pieni jitter (sidosten purku diskreeteille sarjoille)
+    Palauttaa listan (n, d) -matriiseja
+    """
+    rng = np.random.default_rng(seed)
+    prepared = []
+    for v in variables:
+        v = np.asarray(v, dtype=float)
+        v = v.reshape(len(v), -1)
+        v = (v - v.mean(axis=0)) / np.where(v.std(axis=0) > 0, v.std(axis=0), 1.0)
+        prepared.append(v + noise * rng.standard_normal(v.shape))
+    return prepared
+
+def ksg_neighbor_counts(points, radii, workers=-1, query=None):
+    """
+    Pisteiden määrä aidosti säteen sisällä (max-normi), itseä lukuun ottamatta
+    query: kyselypisteet jos eri kuin points (esim. pinottu usealle lagille)
+    1D-avaruudessa lasku tehdään searchsorted:lla lajitellusta taulukosta (O(n log n))
+    """
+    query = points if query is None else query
+    if points.shape[1] == 1:
+        sorted_points = np.sort(points[:, 0])
+        q = query[:, 0]
+        return (np.searchsorted(sorted_points, q + radii, side='left') -
+                np.searchsorted(sorted_points, q - radii, side='right') - 1)
+    tree = cKDTree(points)
+    radii = np.nextafter(radii, 0)  # Aito epäyhtälö < eps
+    return tree.query_ball_point(query, radii, p=np.inf, return_length=True, workers=workers) - 1
+
+def ksg_mutual_information(x, y, k=4, workers=-1):
+    """
+    Kraskov-Stögbauer-Grassberger MI-estimaattori (algoritmi 1), jatkuville sarjoille
+    I(X;Y) = psi(k) + psi(N) - <psi(n_x + 1) + psi(n_y + 1)>
+    k:nnen naapurin etäisyys yhteisavaruudessa cKDTree:llä (workers rinnakkaisuus)
+    """
+    x, y = ksg_prepare(x, y)
+    n = len(x)
+    joint = np.hstack([x, y])
+    eps = cKDTree(joint).query(joint, k=k + 1, p=np.inf, workers=workers)[0][:, -1]
+    n_x = ksg_neighbor_counts(x, eps, workers)
+    n_y = ksg_neighbor_counts(y, eps, workers)
+    mi = digamma(k) + digamma(n) - np.mean(digamma(n_x + 1) + digamma(n_y + 1))
+    return max(0.0, float(mi))
+
+def ksg_conditional_mutual_information(x, y, z, k=4, workers=-1):
+    """
+    KSG-tyyppinen ehdollinen MI (Frenzel-Pompe):
+    I(X;Y|Z) = psi(k) - <psi(n_xz + 1) + psi(n_yz + 1) - psi(n_z + 1)>
+    """
+    x, y, z = ksg_prepare(x, y, z)
+    joint = np.hstack([x, y, z])
+    eps = cKDTree(joint).query(joint, k=k + 1, p=np.inf, workers=workers)[0][:, -1]
+    n_xz = ksg_neighbor_counts(np.hstack([x, z]), eps, workers)
+    n_yz = ksg_neighbor_counts(np.hstack([y, z]), eps, workers)
+    n_z = ksg_neighbor_counts(z, eps, workers)
+    cmi = digamma(k) - np.mean(digamma(n_xz + 1) + digamma(n_yz + 1) - digamma(n_z + 1))
+    return max(0.0, float(cmi))
+
+def ksg_conditional_mi_curve(time_series, max_lag=10, k=4, workers=-1):
+    """
+    Jatkuva muistikäyrä I(X_t; X_{t-lag} | X_{t-1}) lageille 2..max_lag (KSG)
+    Kaikki lagit yhteisellä aikavälillä t = max_lag..n-1: (X_t, X_{t-1}) ja X_{t-1}
+    -puut rakennetaan kerran ja kaikkien lagien säteet kysytään yhdellä
+    query_ball_point-kutsulla (pisteet pinottuina, säde per piste).
+    Palauttaa {'lags', 'cmi'} kuten conditional_mi_curve.
+    """
+    x = np.asarray(time_series, dtype=float)
+    n = len(x)
+    lags = np.arange(2, max_lag + 1)
+    if n - max_lag <= k + 1 or len(lags) == 0:
+        return {'lags': lags, 'cmi': np.full(len(lags), np.nan)}
+    
+    (jittered,) = ksg_prepare(x)
+    present = jittered[max_lag:]
+    lag1 = jittered[max_lag - 1:n - 1]
+    m = len(present)
+    
+    eps = np.zeros((len(lags), m))
+    n_yz = np.zeros((len(lags), m))
+    for i, lag in enumerate(lags):
+        lagk = jittered[max_lag - lag:n - lag]
+        joint = np.hstack([present, lagk, lag1])
+        eps[i] = cKDTree(joint).query(joint, k=k + 1, p=np.inf, workers=workers)[0][:, -1]
+        n_yz[i] = ksg_neighbor_counts(np.hstack([lagk, lag1]), eps[i], workers)
+    
+    # Lag-riippumattomat avaruudet: yksi puu, kaikki lagit samassa kyselyssä
+    shared = {}
+    for name, points in (('xz', np.hstack([present, lag1])), ('z', lag1)):
+        counts = ksg_neighbor_counts(points, eps.ravel(), workers,
+                                     query=np.tile(points, (len(lags), 1)))
+        shared[name] = counts.reshape(len(lags), m)
+    
+    cmi = digamma(k) - np.mean(digamma(shared['xz'] + 1) + digamma(n_yz + 1)
+                               - digamma(shared['z'] + 1), axis=1)
+    return {'lags': lags, 'cmi': np.maximum(0.0, cmi)}
+
+def conditional_independence_test(present, past_lag1=None, past_lag2=None, n_bins=10,
+                                  estimator='binned', k=4):
     """
     Testaa ehdollista riippumattomuutta: I(X_t; X_{t-2} | X_{t-1})
     BARANDES: Markov: I(X_t; X_{t-2} | X_{t-1}) = 0
     INDIVISIBLE: Riippuvuus division events:ien kautta, ei kaikkiin menneisiin
-    """
-    if len(present) != len(past_lag1) or len(present) != len(past_lag2):
-        return np.nan
     
-    if len(present) < 20:  # Liian vähän dataa
-        return np.nan
-    
-    # Diskretisoi
-    X_t = discretize_time_series(present, n_bins)
-    X_t1 = discretize_time_series(past_lag1, n_bins) 
-    X_t2 = discretize_time_series(past_lag2, n_bins)
+    Jos vain koko sarja annetaan (past_lag1=past_lag2=None), lagit otetaan
+    välimuistin koodeista - ei uutta quantile-laskentaa eikä kopioita.
+    estimator='ksg': jatkuva KSG-estimaatti (k naapuria) ilman diskretisointia
+    """
+    if estimator == 'ksg':
+        if past_lag1 is None and past_lag2 is None:
+            x = np.asarray(present, dtype=float)
+            present, past_lag1, past_lag2 = x[2:], x[1:-1], x[:-2]
+        if len(present) != len(past_lag1) or len(present) != len(past_lag2) or len(present) < 20:
+            return np.nan
+        return ksg_conditional_mutual_information(present, past_lag2, past_lag1, k=k)
     
-    # Laske mutual information
-    try:
-        # I(X_t; X_t-1)
-        I_t_t1 = mutual_info_score(X_t, X_t1)
+    if past_lag1 is None and past_lag2 is None:
+        if len(present) < 22:  # Liian vähän dataa
+            return np.nan
+        X_t, past = shifted_codes(present, (1, 2), n_bins)
+        X_t1, X_t2 = past[1], past[2]
+    else:
+        if len(present) != len(past_lag1) or len(present) != len(past_lag2):
+            return np.nan
         
-        # I(X_t; X_t-2)  
-        I_t_t2 = mutual_info_score(X_t, X_t2)
+        if len(present) < 20:  # Liian vähän dataa
+            return np.nan
         
-        # I(X_t, X_t-1; X_t-2) - yhdistetty mutual info
+        # Diskretisoi
+        X_t = discretize_time_series(present, n_bins)
+        X_t1 = discretize_time_series(past_lag1, n_bins) 
+        X_t2 = discretize_time_series(past_lag2, n_bins)
+    
+    # Laske mutual information - yksi batch-kutsu bincount-kernelille
+    try:
+        # I(X_t; X_t-1) ja I(X_t; X_t-1, X_t-2) - yhdistetty mutual info
         combined_past = X_t1 * n_bins + X_t2  # Yhdistä past states
-        I_t_combined = mutual_info_score(X_t, combined_past)
+        I_t_t1, I_t_combined = discrete_mutual_information(
+            np.vstack([X_t, X_t]), np.vstack([X_t1, combined_past]),
+            n_bins, n_bins * n_bins
+        )
         
         # Ehdollinen mutual info: I(X_t; X_t-2 | X_t-1) ≈ I(X_t, X_t-1; X_t-2) - I(X_t; X_t-1)
         conditional_mi = I_t_combined - I_t_t1
@@ -127,17 +329,210 @@ def conditional_independence_test(present, past_lag1, past_lag2, n_bins=10):
     except:
         return np.nan
 
-def measure_memory_depth(time_series, division_events=None, max_lookback=15):
+def conditional_mi_curve(time_series, max_lag=10, n_bins=5, bias_correction=False):
+    """
+    Tarkka plug-in I(X_t; X_{t-k} | X_{t-1}) kaikille lageille k=2..max_lag kerralla
+    BARANDES: Markov => CMI = 0 kaikilla k >= 2; indivisible => riippuvuus säilyy
+    division events:ien kautta pidemmille lageille
+    
+    Sarja diskretisoidaan kerran, ja 3-suuntaiset frekvenssitensorit (X_{t-1}, X_t, X_{t-k})
+    kaikille lageille lasketaan yhdellä np.bincount:lla yhdistetyistä koodeista - O(n*K).
+    bias_correction=True käyttää Miller-Madow korjausta jokaiselle entropiatermille.
+    """
+    discretized = cached_discretization(time_series, n_bins)
+    n = len(discretized)
+    lags = np.arange(2, max_lag + 1)
+    
+    if len(lags) == 0 or n - max_lag < 20:  # Liian vähän dataa
+        return {'lags': lags, 'cmi': np.full(len(lags), np.nan)}
+    
+    # Yhteinen aikaväli t = max_lag..n-1 kaikille lageille
+    n_eff = n - max_lag
+    present = discretized[max_lag:]
+    past_lag1 = discretized[max_lag - 1:n - 1]
+    # Rivi i = X_{t-(i+2)}: käänteinen slice sliding window -näkymästä, ei kopiota
+    windows = np.lib.stride_tricks.sliding_window_view(discretized, n_eff)
+    past_lagk = windows[max_lag - 2::-1]  # (K-1, n_eff)
+    
+    # Yhdistetty koodi: lag-offset + z*b^2 + x*b + y  (z = X_{t-1}, x = X_t, y = X_{t-k})
+    block = n_bins ** 3
+    lag_offset = (np.arange(len(lags), dtype=np.int64) * block)[:, None]
+    joint_codes = lag_offset + (past_lag1 * n_bins + present) * n_bins + past_lagk
+    counts = np.bincount(joint_codes.ravel(), minlength=len(lags) * block)
+    counts = counts.reshape(len(lags), n_bins, n_bins, n_bins)
+    
+    def entropy_term(c):
+        h = entropy_from_counts(c.reshape(len(lags), -1))
+        if bias_correction:
+            # Miller-Madow: + (havaittujen binien määrä - 1) / 2N
+            h = h + (np.count_nonzero(c.reshape(len(lags), -1), axis=1) - 1) / (2.0 * n_eff)
+        return h
+    
+    # I(X;Y|Z) = H(X,Z) + H(Y,Z) - H(X,Y,Z) - H(Z)
+    h_xz = entropy_term(counts.sum(axis=3))
+    h_yz = entropy_term(counts.sum(axis=2))
+    h_xyz = entropy_term(counts)
+    h_z = entropy_term(counts.sum(axis=(2, 3)))
+    cmi = h_xz + h_yz - h_xyz - h_z
+    
+    return {'lags': lags, 'cmi': np.maximum(0.0, cmi)}
+
+def memory_depth_from_profile(profile, threshold=0.3):
+    """
+    Memory depth korrelaatioprofiilista: viimeinen lagi ennen ensimmäistä lagia jonka
+    |corr| <= threshold (NaN-lagit ohitetaan, -1.0 katkaisee)
+    """
+    memory_depth = 0
+    for lag, correlation in enumerate(profile, start=1):
+        if np.isnan(correlation):
+            continue
+        if correlation > threshold:  # Merkittävä korrelaatio
+            memory_depth = lag
+        else:
+            break  # Riippuvuus katkeaa
+    return memory_depth
+
+def memory_depth_at_point(time_series, t, max_lookback=15, window_size=8, offset=0, threshold=0.3):
+    """
+    Memory depth yhdessä pisteessä t (measure_memory_depth:n sisäsilmukka)
+    offset: time_series[0]:n absoluuttinen aika - sallii laskennan pelkästä
+    trailing-ikkunasta inkrementaalisessa analyysissa
+    PÄIVITETTY: johdetaan memory_correlation_profile:sta (katkaistaan ensimmäiseen
+    kynnyksen alittavaan lagiin, joten turhia korrelaatioita ei lasketa)
+    """
+    profile = memory_correlation_profile(time_series, t, max_lookback, window_size, offset,
+                                         stop_below=threshold)
+    return memory_depth_from_profile(profile, threshold)
+
+def memory_correlation_profile(time_series, t, max_lookback=15, window_size=8, offset=0,
+                               stop_below=None):
+    """
+    memory_depth_at_point:n jatkuvat välitulokset: |corr| jokaiselle lagille 1..max_lookback-1
+    Ei katkaise ensimmäiseen alle kynnyksen olevaan lagiin, joten syvyyden voi laskea
+    jälkikäteen millä tahansa kynnyksellä (memory_depth_threshold_sweep).
+    stop_below: jos annettu, lopetetaan ensimmäiseen lagiin jonka |corr| <= stop_below
+    (loput -1.0); memory_depth_at_point käyttää tätä.
+    Koodaus: NaN = lagi ohitetaan (vakioikkuna), -1.0 = data loppuu tai corr NaN (katkaisee)
+    """
+    n = offset + len(time_series)
+    profile = np.full(max_lookback - 1, -1.0)
+    i = t - offset
+    
+    for lag in range(1, min(max_lookback, t)):
+        if t + window_size >= n or t - lag - window_size < 0:
+            break
+        
+        current_window = time_series[i:i+window_size]
+        past_window = time_series[i-lag:i-lag+window_size]
+        
+        if len(current_window) > 3 and len(past_window) > 3:
+            if np.std(current_window) > 1e-6 and np.std(past_window) > 1e-6:
+                correlation = abs(np.corrcoef(current_window, past_window)[0, 1])
+                profile[lag - 1] = -1.0 if np.isnan(correlation) else correlation
+                if stop_below is not None and not profile[lag - 1] > stop_below:
+                    break
+            else:
+                profile[lag - 1] = np.nan
+        else:
+            profile[lag - 1] = np.nan
+    
+    return profile
+
+def memory_depth_threshold_sweep(profiles, thresholds=(0.2, 0.25, 0.3, 0.35, 0.4)):
+    """
+    Memory depth kaikille korrelaatiokynnyksille kerralla profiilimatriisista (P, L)
+    Sama sääntö kuin memory_depth_at_point: syvyys = viimeinen lagi ennen ensimmäistä
+    lagia jonka |corr| <= kynnys (NaN-lagit ohitetaan). Kattaa moduulien 3/6/9 kynnykset
+    0.3 / 0.25 / 0.2. Palauttaa {'thresholds', 'memory_depths' (T, P), 'avg_memory_depth' (T,)}
+    """
+    profiles = np.atleast_2d(np.asarray(profiles, dtype=float))
+    thr = np.asarray(thresholds, dtype=float)[:, None, None]
+    n_points, n_lags = profiles.shape
+    
+    skip = np.isnan(profiles)[None, :, :]
+    with np.errstate(invalid='ignore'):
+        fail = ~skip & ~(profiles[None, :, :] > thr)           # (T, P, L)
+    has_fail = fail.any(axis=2)
+    first_fail = np.where(has_fail, fail.argmax(axis=2), n_lags)  # (T, P)
+    
+    # Suurin ei-ohitettu lagi ennen ensimmäistä katkaisua
+    lag_numbers = np.arange(1, n_lags + 1)
+    before_fail = lag_numbers[None, None, :] <= first_fail[:, :, None]
+    passing = before_fail & ~skip
+    depths = np.where(passing, lag_numbers[None, None, :], 0).max(axis=2) if n_lags else np.zeros((len(thresholds), n_points))
+    
+    return {
+        'thresholds': list(thresholds),
+        'memory_depths': depths,
+        'avg_memory_depth': depths.mean(axis=1) if n_points else np.zeros(len(thresholds))
+    }
+
+class DivisionTimeIndex:
+    """
+    Aikajärjestetty division-aikaindeksi (kevyt versio Module 2:n DivisionEventIndex:stä)
+    Oma nimi, koska rakentaja ottaa (ajat, scoret) eikä Module 2:n rakenteista
+    event-taulukkoa. int32 ajat + rinnakkaiset scoret; ikkuna-, kynnys- ja
+    lähin-event -kyselyt searchsorted:lla ilman lineaarisia suodatuksia
+    """
+    
+    def __init__(self, times, scores=None):
+        times = np.asarray(times, dtype=np.int32)
+        scores = np.ones(len(times)) if scores is None else np.asarray(scores, dtype=float)
+        order = np.argsort(times, kind='stable')
+        self.times = times[order]
+        self.scores = scores[order]
+        self._score_order = np.argsort(-self.scores, kind='stable')
+        self._neg_sorted_scores = -self.scores[self._score_order]
+    
+    @classmethod
+    def from_dicts(cls, event_dicts):
+        """Module 2:n JSON-muotoisesta division_events_list:stä"""
+        times = np.array([e['time'] for e in event_dicts], dtype=np.int32)
+        scores = np.array([e.get('score', 1.0) for e in event_dicts], dtype=float)
+        return cls(times, scores)
+    
+    def __len__(self):
+        return len(self.times)
+    
+    def times_in(self, start=None, stop=None):
+        """Ajat ikkunassa [start, stop) int32-näkymänä"""
+        lo = 0 if start is None else np.searchsorted(self.times, start, side='left')
+        hi = len(self.times) if stop is None else np.searchsorted(self.times, stop, side='left')
+        return self.times[lo:max(lo, hi)]
+    
+    def above(self, threshold):
+        """Uusi indeksi eventeistä joilla score > threshold"""
+        k = np.searchsorted(self._neg_sorted_scores, -threshold, side='left')
+        selected = self._score_order[:k]
+        return DivisionTimeIndex(self.times[selected], self.scores[selected])
+    
+    def nearest(self, query_times):
+        """Lähin event per kyselyaika: (ajat, etäisyydet); tyhjä indeksi -> (-1, inf)"""
+        query = np.asarray(query_times)
+        if len(self.times) == 0:
+            return np.full(query.shape, -1, dtype=np.int32), np.full(query.shape, np.inf)
+        right = np.clip(np.searchsorted(self.times, query), 0, len(self.times) - 1)
+        left = np.clip(right - 1, 0, len(self.times) - 1)
+        use_left = np.abs(query - self.times[left]) <= np.abs(self.times[right] - query)
+        nearest = np.where(use_left, self.times[left], self.times[right])
+        return nearest, np.abs(query - nearest)
+
+def measure_memory_depth(time_series, division_events=None, max_lookback=15, return_profiles=False):
     """
     KORJATTU: Mittaa kuinka pitkälle menneisyyteen riippuvuus ulottuu
     BARANDES: Indivisible - riippuvuus division events:ien kautta, ei kaikista menneistä
+    return_profiles=True: palauttaa myös {'points', 'profiles'} kynnyspyyhkäisyä varten
+    division_events: DivisionTimeIndex tai list-of-dicts (Module 2 JSON)
     """
     n = len(time_series)
     memory_depths = []
+    points, profiles = [], []
     
     # Jos division events annettu, keskity niiden ympärille + satunnaiset pisteet
     if division_events is not None and len(division_events) > 0:
-        analysis_points = [e['time'] for e in division_events if e['time'] < n - max_lookback]
+        if not isinstance(division_events, DivisionTimeIndex):
+            division_events = DivisionTimeIndex.from_dicts(division_events)
+        analysis_points = list(division_events.times_in(None, n - max_lookback))
         # Lisää satunnaisia pisteitä
         random_points = np.random.choice(range(max_lookback, n-max_lookback), 
                                        size=min(20, n//50), replace=False)
@@ -150,37 +545,395 @@ def measure_memory_depth(time_series, division_events=None, max_lookback=15):
     for t in analysis_points:
         if t < max_lookback or t >= n - 5:
             continue
+        
+        if return_profiles:
+            # Yksi profiili per piste: syvyys johdetaan siitä (ei toista korrelaatiolaskentaa)
+            profile = memory_correlation_profile(time_series, t, max_lookback, window_size=8)
+            memory_depths.append(memory_depth_from_profile(profile))
+            points.append(int(t))
+            profiles.append(profile)
+        else:
+            memory_depths.append(memory_depth_at_point(time_series, t, max_lookback, window_size=8))
+    
+    if return_profiles:
+        profile_matrix = np.array(profiles) if profiles else np.zeros((0, max_lookback - 1))
+        return memory_depths, {'points': points, 'profiles': profile_matrix}
+    return memory_depths
+
+def ordinal_pattern_codes(batch, dims=(3, 4, 5, 6, 7), delay=1):
+    """
+    Ordinaalikuvioiden Lehmer-koodit kaikille upotusdimensioille yhdellä vertailuläpikäynnillä
+    Lehmer-numero paikassa i = #{j > i : x[s+j*delay] < x[s+i*delay]} (tasatilanteessa
+    aikaisempi arvo on pienempi, kuten stabiilissa argsortissa). Viivevertailut
+    x[t+k*delay] < x[t] lasketaan kerran k = 1..max(dims)-1 ja kumulatiivinen summa
+    k:n yli antaa jokaisen dimension numerot suoraan.
+    Palauttaa {d: koodit (trials, n-(d-1)*delay)}, koodit välillä 0..d!-1.
+    """
+    batch = np.atleast_2d(np.asarray(batch, dtype=float))
+    n = batch.shape[1]
+    D = max(dims)
+    
+    # less_cum[k-1][:, t] = #{1 <= k' <= k : x[t+k'*delay] < x[t]}
+    less_cum = []
+    running = np.zeros((batch.shape[0], n), dtype=np.int64)
+    for k in range(1, D):
+        shift = k * delay
+        if shift >= n:
+            break
+        running = running[:, :n - shift] + (batch[:, shift:] < batch[:, :n - shift])
+        less_cum.append(running)
+    
+    codes = {}
+    for d in dims:
+        m = n - (d - 1) * delay
+        if m <= 0:
+            codes[d] = np.zeros((batch.shape[0], 0), dtype=np.int64)
+            continue
+        code = np.zeros((batch.shape[0], m), dtype=np.int64)
+        for i in range(d - 1):
+            digits = d - 1 - i  # Vertailtavia myöhempiä paikkoja
+            start = i * delay
+            code += less_cum[digits - 1][:, start:start + m] * math.factorial(digits)
+        codes[d] = code
+    return codes
+
+def permutation_entropy(time_series, dims=(3, 4, 5, 6, 7), delay=1):
+    """
+    Normalisoitu permutaatioentropia ja Jensen-Shannon statistical complexity (Rosso ym.)
+    time_series: (n,) tai (trials, n). Kuviojakaumat yhdellä bincount:lla per dimensio
+    (rivikohtainen offset). H = S(P) / log(d!), C = Q_J * H, missä Q_J on JS-divergenssi
+    tasajakaumaan normalisoituna maksimiinsa. missing_patterns = puuttuvien kuvioiden osuus.
+    Palauttaa taulukot (trials, n_dims) tai (n_dims,).
+    """
+    single = np.ndim(time_series) == 1
+    batch = np.atleast_2d(np.asarray(time_series, dtype=float))
+    trials = batch.shape[0]
+    dims = tuple(sorted(dims))
+    codes = ordinal_pattern_codes(batch, dims, delay)
+    
+    entropy = np.zeros((trials, len(dims)))
+    complexity = np.zeros((trials, len(dims)))
+    missing = np.zeros((trials, len(dims)))
+    for k, d in enumerate(dims):
+        n_patterns = math.factorial(d)
+        code = codes[d]
+        if code.shape[1] == 0:
+            continue
+        offsets = np.arange(trials)[:, None] * n_patterns
+        counts = np.bincount((code + offsets).ravel(), minlength=trials * n_patterns)
+        probs = counts.reshape(trials, n_patterns) / code.shape[1]
+        
+        uniform = 1.0 / n_patterns
+        s_p = entropy_from_counts(probs)
+        s_mix = entropy_from_counts((probs + uniform) / 2)
+        js = s_mix - s_p / 2 - np.log(n_patterns) / 2
+        js_max = -0.5 * ((n_patterns + 1) / n_patterns * np.log(n_patterns + 1)
+                         + np.log(n_patterns) - 2 * np.log(2 * n_patterns))
+        entropy[:, k] = s_p / np.log(n_patterns)
+        complexity[:, k] = js / js_max * entropy[:, k]
+        missing[:, k] = np.mean(counts.reshape(trials, n_patterns) == 0, axis=1)
+    
+    result = {'dims': dims, 'entropy': entropy, 'complexity': complexity, 'missing_patterns': missing}
+    if single:
+        result.update({key: result[key][0] for key in ('entropy', 'complexity', 'missing_patterns')})
+    return result
+
+def lz76_phrase_count(codes, alphabet_size):
+    """
+    Lempel-Ziv (LZ76) fraasien määrä lineaarisessa ajassa suffiksiautomaatilla
+    Fraasi alkaa kohdasta i ja jatkuu niin kauan kuin s[i..j] esiintyy jo prefiksissä
+    s[0..j-1] (päällekkäisyys sallittu); ensimmäinen uusi symboli päättää fraasin.
+    Automaatti kasvaa symboli kerrallaan, joten tarkistus on yksi siirtymä per symboli.
+    """
+    s = [int(c) for c in codes]
+    n = len(s)
+    A = int(alphabet_size)
+    trans = [-1] * ((2 * n + 1) * A)
+    length = [0] * (2 * n + 1)
+    link = [-1] * (2 * n + 1)
+    size, last = 1, 0
+    cur, cur_len, count = 0, 0, 0
+    
+    for j, c in enumerate(s):
+        # 1. Jatkuuko fraasi: esiintyykö s[i..j] prefiksissä s[0..j-1]?
+        nxt = trans[cur * A + c]
+        if nxt != -1:
+            cur, cur_len = nxt, cur_len + 1
+        else:
+            count += 1
+            cur, cur_len = 0, 0
+        
+        # 2. Laajenna automaatti symbolilla s[j]
+        new = size
+        size += 1
+        length[new] = length[last] + 1
+        p = last
+        while p != -1 and trans[p * A + c] == -1:
+            trans[p * A + c] = new
+            p = link[p]
+        if p == -1:
+            link[new] = 0
+        else:
+            q = trans[p * A + c]
+            if length[p] + 1 == length[q]:
+                link[new] = q
+            else:
+                clone = size
+                size += 1
+                length[clone] = length[p] + 1
+                trans[clone * A:(clone + 1) * A] = trans[q * A:(q + 1) * A]
+                link[clone] = link[q]
+                while p != -1 and trans[p * A + c] == q:
+                    trans[p * A + c] = clone
+                    p = link[p]
+                link[q] = link[new] = clone
+                # Avoin fraasi siirtyy kloonille, jos sen pituus mahtuu kloonin alueelle
+                if cur == q and cur_len <= length[clone]:
+                    cur = clone
+        last = new
+    
+    return count + (cur_len > 0)  # Keskeneräinen viimeinen fraasi lasketaan mukaan
+
+def lempel_ziv_complexity(time_series, n_bins=2):
+    """
+    LZ76-kompleksisuus ja entropiaestimaatti symboloiduille sarjoille
+    time_series: (n,) tai (trials, n). Kokonaislukuarvoiset sarjat (binary_01, binary_pm1)
+    pidetään sellaisinaan, jatkuvat binarisoidaan mediaanista (n_bins=2) symbolize_series:llä.
+    normalized = c * log_A(n) / n (~1 satunnaiselle jonolle, vertailukelpoinen eri
+    pituuksilla), entropy_rate = c * log2(n) / n bittiä per symboli.
+    """
+    single = np.ndim(time_series) == 1
+    batch = np.atleast_2d(np.asarray(time_series, dtype=float))
+    trials, n = batch.shape
+    
+    complexity = np.zeros(trials, dtype=np.int64)
+    alphabet = np.zeros(trials, dtype=np.int64)
+    for row in range(trials):
+        codes, A = symbolize_series(batch[row], n_bins)
+        complexity[row] = lz76_phrase_count(codes, max(A, 2))
+        alphabet[row] = max(A, 2)
+    
+    entropy_rate = complexity * np.log2(max(n, 2)) / n
+    result = {
+        'complexity': complexity,
+        'normalized': entropy_rate / np.log2(alphabet),
+        'entropy_rate': entropy_rate,
+        'alphabet_size': alphabet
+    }
+    if single:
+        result = {key: value[0].item() for key, value in result.items()}
+    return result
+
+def symbolize_series(time_series, n_bins=4, max_alphabet=64):
+    """
+    Symbolit Markov-järjestystestiin: kokonaislukuarvoiset sarjat (esim. pure_markov_process:n
+    tilat) koodataan sellaisenaan, koska tilojen yhdistäminen biniksi rikkoisi Markov-
+    ominaisuuden; jatkuvat sarjat quantile-diskretisoidaan (välimuistista).
+    Palauttaa (koodit int64, aakkoston koko)
+    """
+    x = np.asarray(time_series)
+    if np.all(np.isfinite(x)) and np.all(x == np.round(x)):
+        states, codes = np.unique(x, return_inverse=True)
+        if len(states) <= max_alphabet:
+            return codes.astype(np.int64), len(states)
+    return np.asarray(cached_discretization(time_series, n_bins), dtype=np.int64), n_bins
+
+def kgram_index(codes, max_order=5, alphabet_size=None):
+    """
+    k-gram frekvenssi-indeksi kertalaskennalla järjestyksille 0..max_order
+    Rullaava kokonaislukukoodaus: konteksti_k = tiivistetty(konteksti_{k-1} * A + symboli),
+    tiivistys np.unique:lla, joten avainavaruus pysyy <= n * A myös suurilla aakkostoilla
+    (harva, ei A^k -kokoista taulukkoa). Kaikki järjestykset yhteisellä aikavälillä
+    t = max_order..n-1, jotta uskottavuudet ovat vertailukelpoisia.
+    Palauttaa {'alphabet_size', 'contexts': [(n_t,) konteksti-id per järjestys],
+    'transition_counts': [(konteksti-id, symboli, count) per järjestys]}
+    """
+    codes = np.asarray(codes, dtype=np.int64)
+    A = int(codes.max()) + 1 if alphabet_size is None else alphabet_size
+    n = len(codes)
+    targets = codes[max_order:]
+    
+    contexts, transitions = [], []
+    context = np.zeros(n - max_order, dtype=np.int64)  # Järjestys 0: tyhjä konteksti
+    for k in range(max_order + 1):
+        if k > 0:
+            # Pidennä kontekstia yhdellä symbolilla taaksepäin: X_{t-k}
+            _, context = np.unique(context * A + codes[max_order - k:n - k], return_inverse=True)
+        contexts.append(context)
+        keys, counts = np.unique(context * A + targets, return_counts=True)
+        transitions.append((keys // A, keys % A, counts))
+    
+    return {'alphabet_size': A, 'max_order': max_order, 'contexts': contexts,
+            'transition_counts': transitions}
+
+def markov_order_test(time_series, max_order=4, n_bins=4, significance=0.05, index=None):
+    """
+    Markov-järjestyksen estimointi k-gram indeksistä: likelihood-ratio ja BIC
+    Parametrimäärä = havaitut kontekstit * (A - 1): harva vastine täydelle A^k (A - 1):lle,
+    joten suuret aakkostot eivät räjäytä penaltya havaitsemattomilla konteksteilla.
+    LR-testi k vs k-1: G = 2 (LL_k - LL_{k-1}) ~ chi2(df_k - df_{k-1})
+    Palauttaa järjestyskohtaiset LL/parametrit/BIC/p-arvot sekä BIC- ja LR-estimaatit.
+    """
+    if index is None:
+        codes, A = symbolize_series(time_series, n_bins)
+        index = kgram_index(codes, max_order, A)
+    n_t = len(index['contexts'][0])
+    
+    log_likelihood, n_params = [], []
+    for context_ids, _, counts in index['transition_counts']:
+        context_totals = np.bincount(context_ids, weights=counts)[context_ids]
+        log_likelihood.append(float(np.sum(counts * np.log(counts / context_totals))))
+        n_params.append(int(len(np.unique(context_ids)) * (index['alphabet_size'] - 1)))
+    log_likelihood = np.array(log_likelihood)
+    n_params = np.array(n_params)
+    bic = -2 * log_likelihood + n_params * np.log(max(n_t, 2))
+    
+    lr_p_values = np.ones(len(log_likelihood))
+    for k in range(1, len(log_likelihood)):
+        df = n_params[k] - n_params[k - 1]
+        statistic = 2 * (log_likelihood[k] - log_likelihood[k - 1])
+        lr_p_values[k] = stats.chi2.sf(statistic, df) if df > 0 else 1.0
+    
+    # LR: pienin järjestys jonka jälkeen seuraava pidennys ei ole merkitsevä
+    lr_order = 0
+    while lr_order + 1 < len(lr_p_values) and lr_p_values[lr_order + 1] < significance:
+        lr_order += 1
+    
+    return {
+        'orders': list(range(len(log_likelihood))),
+        'log_likelihood': log_likelihood,
+        'n_params': n_params,
+        'bic': bic,
+        'lr_p_values': lr_p_values,
+        'bic_order': int(np.argmin(bic)),
+        'lr_order': lr_order,
+        'alphabet_size': index['alphabet_size']
+    }
+
+def context_tree_estimator(time_series, max_order=6, n_bins=4, cutoff=None, min_count=5,
+                           division_times=None, top_contexts=10, index=None):
+    """
+    Muuttuvan pituuden Markov-ketju (VLMC / context tree) yhdellä k-gram läpikäynnillä
+    BARANDES: ehdollistaminen toimii vain tietyillä hetkillä, joten tarvittava
+    kontekstin pituus vaihtelee ajan mukaan eikä ole yksi globaali lag.
+    
+    Solmu c (pituus k) säilyy, jos sen ennuste poikkeaa vanhemmasta (pituus k-1):
+    gain = sum_s N(c,s) log(P(s|c) / P(s|parent)) > cutoff ja N(c) >= min_count.
+    Karsinta alhaalta ylös: solmu säilyy jos se tai jokin jälkeläinen säilyy, ja
+    säilyneen sisäsolmun kaikki havaitut lapset ovat lehtiä (täydellinen puu).
+    Jokaisen ajanhetken kontekstin pituus = syvin säilynyt solmu sen suffiksipolulla.
+    cutoff: oletuksena (A-1)/2 * log(n) (BIC-tyyppinen). Kaikki vaiheet vektoroitu
+    järjestyksittäin, joten 10^6-pituiset sarjat ovat muutaman sekunnin työ.
+    """
+    if index is None:
+        codes, A = symbolize_series(time_series, n_bins)
+        index = kgram_index(codes, max_order, A)
+    else:
+        codes = None  # Valmiista indeksistä ei saada symbolijonoja (division_contexts)
+    A = index['alphabet_size']
+    K = index['max_order']
+    contexts = index['contexts']
+    n_t = len(contexts[0])
+    cutoff = (A - 1) / 2 * np.log(max(n_t, 2)) if cutoff is None else cutoff
+    
+    # Solmukohtaiset tilastot ja vanhempi-linkit
+    n_nodes = [int(c.max()) + 1 for c in contexts]
+    parents = [None]
+    for k in range(1, K + 1):
+        parent = np.zeros(n_nodes[k], dtype=np.int64)
+        parent[contexts[k]] = contexts[k - 1]
+        parents.append(parent)
+    
+    keep = [np.ones(1, dtype=bool)]
+    for k in range(1, K + 1):
+        node, symbol, counts = index['transition_counts'][k]
+        node_total = np.bincount(node, weights=counts, minlength=n_nodes[k])
+        
+        p_node, p_symbol, p_counts = index['transition_counts'][k - 1]
+        p_keys = p_node * A + p_symbol  # Lajiteltu (np.unique)
+        p_total = np.bincount(p_node, weights=p_counts, minlength=n_nodes[k - 1])
+        parent = parents[k][node]
+        parent_counts = p_counts[np.searchsorted(p_keys, parent * A + symbol)]
+        
+        terms = counts * (np.log(counts / node_total[node]) - np.log(parent_counts / p_total[parent]))
+        gain = np.bincount(node, weights=terms, minlength=n_nodes[k])
+        keep.append((gain > cutoff) & (node_total >= min_count))
+    
+    # Karsinta alhaalta ylös: säilyneen solmun vanhempi säilyy (sisäsolmuna)
+    retained = [k_mask.copy() for k_mask in keep]
+    internal = [np.zeros(m, dtype=bool) for m in n_nodes]
+    for k in range(K, 0, -1):
+        internal[k - 1][parents[k][retained[k]]] = True
+        retained[k - 1] |= internal[k - 1]
+    # Täydellinen puu: sisäsolmun kaikki lapset ovat lehtiä
+    for k in range(1, K + 1):
+        retained[k] |= internal[k - 1][parents[k]]
+    
+    # Kontekstin pituus per aika: säilyneet solmut muodostavat suffiksipolun alkuosan
+    lengths = np.zeros(n_t, dtype=np.int64)
+    for k in range(1, K + 1):
+        lengths += retained[k][contexts[k]]
+    
+    result = {
+        'max_order': K,
+        'alphabet_size': A,
+        'context_length_distribution': np.bincount(lengths, minlength=K + 1) / n_t,
+        'mean_context_length': float(lengths.mean()),
+        'n_retained_contexts': [int(r.sum()) for r in retained],
+        'context_lengths': lengths  # Aika t = max_order + indeksi
+    }
+    
+    if division_times is not None:
+        times = np.asarray(division_times, dtype=np.int64)
+        times = times[(times >= K) & (times < K + n_t)]
+        division_lengths = lengths[times - K]
+        result['division_context_length_distribution'] = (
+            np.bincount(division_lengths, minlength=K + 1) / max(len(times), 1))
+        result['division_mean_context_length'] = float(division_lengths.mean()) if len(times) else 0.0
+        
+        # Yleisimmät kontekstit division-hetkillä (symbolijonot X_{t-L}..X_{t-1})
+        if codes is not None and len(times):
+            division_contexts = {}
+            for t, length in zip(times, division_lengths):
+                key = tuple(int(c) for c in codes[t - length:t])
+                division_contexts[key] = division_contexts.get(key, 0) + 1
+            ranked = sorted(division_contexts.items(), key=lambda item: (-item[1], len(item[0])))
+            result['division_contexts'] = [{'context': list(key), 'count': count}
+                                           for key, count in ranked[:top_contexts]]
+    
+    return result
+
+def markov_violations_at_point(time_series, t, n_lags=5, offset=0):
+    """
+    Markov violations yhdessä pisteessä t (markov_property_test:n sisäsilmukka)
+    offset: time_series[0]:n absoluuttinen aika (trailing-ikkuna)
+    """
+    violations_at_t = 0
+    i = t - offset
+    
+    for lag in range(2, min(n_lags + 1, t)):
+        if t - lag < 5:
+            continue
+        
+        # Laske partial correlation: corr(current, lagk | lag1)
+        # Käytä ikkunoita ympärille
+        window = 5
+        if t - lag - window < 0:
+            continue
             
-        # Testaa riippuvuutta eri etäisyyksille - yksinkertaisempi versio
-        memory_depth = 0
-        current_value = time_series[t]
+        current_window = time_series[i-window:i+1]
+        lag1_window = time_series[i-1-window:i]
+        lagk_window = time_series[i-lag-window:i-lag+1]
         
-        for lag in range(1, min(max_lookback, t)):
-            if t-lag < 0:
-                break
+        if (len(current_window) > 3 and len(lag1_window) > 3 and len(lagk_window) > 3 and
+            np.std(current_window) > 1e-6 and np.std(lagk_window) > 1e-6):
             
-            # Ota ikkunat ympärille
-            window_size = 8  # Pienempi ikkuna
-            if t + window_size >= n or t - lag - window_size < 0:
-                break
-                
-            # Nykyhetki vs. lag:in päässä oleva historia
-            current_window = time_series[t:t+window_size]
-            past_window = time_series[t-lag:t-lag+window_size]
+            corr_curr_lagk = abs(np.corrcoef(current_window, lagk_window)[0, 1])
             
-            # Yksinkertainen korrelaatiotesti
-            if len(current_window) > 3 and len(past_window) > 3:
-                if np.std(current_window) > 1e-6 and np.std(past_window) > 1e-6:
-                    correlation = abs(np.corrcoef(current_window, past_window)[0, 1])
-                    
-                    if not np.isnan(correlation) and correlation > 0.3:  # Merkittävä korrelaatio
-                        memory_depth = lag
-                    else:
-                        break  # Riippuvuus katkeaa
-        
-        memory_depths.append(memory_depth)
+            if not np.isnan(corr_curr_lagk) and corr_curr_lagk > 0.2:
+                violations_at_t += 1
     
-    return memory_depths
+    return violations_at_t
 
 def markov_property_test(time_series, n_lags=5):
     """
@@ -196,43 +949,553 @@ def markov_property_test(time_series, n_lags=5):
                                   size=min(20, n//50), replace=False)
     
     for t in test_points:
-        violations_at_t = 0
-        
-        for lag in range(2, min(n_lags + 1, t)):
-            if t - lag < 5:
-                continue
-                
-            # Yksinkertainen autocorrelation testi
-            current_val = time_series[t]
-            lag1_val = time_series[t-1] 
-            lagk_val = time_series[t-lag]
-            
-            # Laske partial correlation: corr(current, lagk | lag1)
-            # Käytä ikkunoita ympärille
-            window = 5
-            if t - lag - window < 0:
-                continue
-                
-            current_window = time_series[t-window:t+1]
-            lag1_window = time_series[t-1-window:t]
-            lagk_window = time_series[t-lag-window:t-lag+1]
-            
-            if (len(current_window) > 3 and len(lag1_window) > 3 and len(lagk_window) > 3 and
-                np.std(current_window) > 1e-6 and np.std(lagk_window) > 1e-6):
-                
-                corr_curr_lagk = abs(np.corrcoef(current_window, lagk_window)[0, 1])
-                
-                if not np.isnan(corr_curr_lagk) and corr_curr_lagk > 0.2:
-                    violations_at_t += 1
-        
         violations.append({
             'time': t,
             'violations': [],  # Simplified
-            'total_violations': violations_at_t
+            'total_violations': markov_violations_at_point(time_series, t, n_lags)
         })
     
     return violations
 
+def autocorrelation_fft(batch, max_lag=None):
+    """
+    Autokorrelaatiofunktio FFT:llä O(n log n), batchattuna (trials, n) tai (n,)
+    Biasoitu estimaattori (jakaja n), joten ACF-matriisi on positiivisesti definiitti
+    ja kelpaa suoraan Durbin-Levinsonille. Vakiosarjalle ACF = [1, 0, 0, ...].
+    """
+    x = np.asarray(batch, dtype=float)
+    n = x.shape[-1]
+    max_lag = n - 1 if max_lag is None else min(max_lag, n - 1)
+    
+    x = x - x.mean(axis=-1, keepdims=True)
+    n_fft = 1 << int(np.ceil(np.log2(2 * n - 1)))  # Nollatäyttö: ei kehäkorrelaatiota
+    spectrum = np.fft.rfft(x, n=n_fft, axis=-1)
+    autocov = np.fft.irfft(spectrum * spectrum.conj(), n=n_fft, axis=-1)[..., :max_lag + 1]
+    
+    variance = autocov[..., :1]
+    acf = np.where(variance > 1e-12, autocov / np.where(variance > 1e-12, variance, 1.0), 0.0)
+    acf[..., 0] = 1.0
+    return acf
+
+def partial_autocorrelation(acf, max_lag=None):
+    """
+    PACF Durbin-Levinson-rekursiolla ACF:stä, batchattuna viimeisen akselin yli
+    Palauttaa (..., max_lag + 1), pacf[..., 0] = 1
+    """
+    acf = np.asarray(acf, dtype=float)
+    max_lag = acf.shape[-1] - 1 if max_lag is None else max_lag
+    batch_shape = acf.shape[:-1]
+    
+    pacf = np.zeros(batch_shape + (max_lag + 1,))
+    pacf[..., 0] = 1.0
+    phi = np.zeros(batch_shape + (max_lag + 1,))  # phi[..., 1:k+1] = AR(k)-kertoimet
+    variance = np.ones(batch_shape)  # Ennustevirheen suhteellinen varianssi
+    
+    for k in range(1, max_lag + 1):
+        numerator = acf[..., k] - np.einsum('...j,...j->...', phi[..., 1:k], acf[..., k - 1:0:-1])
+        reflection = np.where(variance > 1e-12, numerator / np.maximum(variance, 1e-12), 0.0)
+        previous = phi[..., 1:k].copy()
+        phi[..., 1:k] = previous - reflection[..., None] * previous[..., ::-1]
+        phi[..., k] = reflection
+        variance = variance * (1.0 - reflection ** 2)
+        pacf[..., k] = reflection
+    
+    return pacf
+
+def acf_decay_lag(acf, threshold=np.exp(-1)):
+    """
+    Memory depth -tilasto: ensimmäinen viive jolla |ACF| < threshold
+    Jos ACF ei putoa kynnyksen alle, palauttaa ACF:n pituuden (alaraja)
+    """
+    below = np.abs(np.asarray(acf))[..., 1:] < threshold
+    return np.where(below.any(axis=-1), below.argmax(axis=-1) + 1, below.shape[-1] + 1)
+
+def pacf_markov_violation(pacf, n, max_lag=None):
+    """
+    Markov violation -tilasto: PACF viiveillä > 1
+    AR(1)/Markov-nollahypoteesilla pacf[k] ~ N(0, 1/n) kun k >= 2, joten
+    Q = n * sum pacf[k]^2 ~ chi2(max_lag - 1). violation_rate = merkitsevien
+    viiveiden osuus (|pacf| > 1.96 / sqrt(n)).
+    """
+    pacf = np.asarray(pacf)
+    max_lag = pacf.shape[-1] - 1 if max_lag is None else max_lag
+    beyond = pacf[..., 2:max_lag + 1]
+    statistic = n * np.sum(beyond ** 2, axis=-1)
+    return {
+        'statistic': statistic,
+        'p_value': stats.chi2.sf(statistic, df=max(1, beyond.shape[-1])),
+        'violation_rate': np.mean(np.abs(beyond) > 1.96 / np.sqrt(n), axis=-1)
+    }
+
+def acf_memory_statistics(batch, max_lag=20):
+    """
+    Globaali täydennys ikkunoiduille testeille: ACF (FFT) + PACF (Durbin-Levinson)
+    batch: (n,) tai (trials, n). Palauttaa acf, pacf, acf_decay_lag ja
+    PACF beyond lag 1 -tilastot (statistic, p_value, violation_rate).
+    """
+    x = np.asarray(batch, dtype=float)
+    acf = autocorrelation_fft(x, max_lag)
+    pacf = partial_autocorrelation(acf)
+    violation = pacf_markov_violation(pacf, x.shape[-1])
+    return {
+        'acf': acf,
+        'pacf': pacf,
+        'acf_decay_lag': acf_decay_lag(acf),
+        'pacf_statistic': violation['statistic'],
+        'pacf_p_value': violation['p_value'],
+        'pacf_violation_rate': violation['violation_rate']
+    }
+
+def dfa_scales(n, min_scale=4, max_scale=None, n_scales=20):
+    """Logaritmisesti tasavälit DFA-skaalat (uniikit kokonaisluvut, max n // 4)"""
+    max_scale = n // 4 if max_scale is None else min(max_scale, n // 4)
+    if max_scale < min_scale:
+        return np.zeros(0, dtype=int)
+    return np.unique(np.round(np.logspace(np.log10(min_scale), np.log10(max_scale), n_scales)).astype(int))
+
+def detrended_fluctuation(batch, scales=None, order=1):
+    """
+    DFA fluktuaatiofunktio F(s) koko (trials, n) batchille
+    Profiili yhdellä cumsum:lla; jokaisella skaalalla profiili reshape:taan
+    (trials, segmentit, s) -muotoon (alusta ja lopusta, jotta koko sarja kattuu) ja
+    kaikki segmentit detrendataan yhdellä pienimmän neliösumman projektiolla.
+    Palauttaa (scales, F (trials, n_scales))
+    """
+    x = np.atleast_2d(np.asarray(batch, dtype=float))
+    trials, n = x.shape
+    scales = dfa_scales(n) if scales is None else np.asarray(scales, dtype=int)
+    profile = np.cumsum(x - x.mean(axis=1, keepdims=True), axis=1)
+    
+    fluctuation = np.zeros((trials, len(scales)))
+    for i, s in enumerate(scales):
+        n_seg = n // s
+        segments = np.concatenate([
+            profile[:, :n_seg * s].reshape(trials, n_seg, s),
+            profile[:, n - n_seg * s:].reshape(trials, n_seg, s)
+        ], axis=1)
+        
+        # Polynomitrendin projektio: residuaali = (I - Q Q^T) y, Q ortonormaali kanta
+        design = np.vander(np.linspace(-1, 1, s), order + 1)
+        q, _ = np.linalg.qr(design)
+        residual = segments - (segments @ q) @ q.T
+        fluctuation[:, i] = np.sqrt(np.mean(residual ** 2, axis=(1, 2)))
+    
+    return scales, fluctuation
+
+def hurst_exponent_dfa(batch, scales=None, order=1):
+    """
+    Skaalavapaa muistimittari: DFA-eksponentti alpha (~ Hurst) per sarja
+    alpha ~ 0.5: ei pitkää muistia (white noise, Markov lyhyellä skaalalla)
+    alpha > 0.5: pitkä muisti / persistenssi (fractional_brownian, pink_noise ~ 1.0)
+    alpha < 0.5: antipersistenssi
+    Log-log regressio kaikille sarjoille kerralla, skaalamaski rivikohtaisesti:
+    vakiosarjan (F ~ 0 pyöristysvirheen tasolla) skaalat eivät kaada muiden rivien
+    sovitusta. NaN vain riveille, joilla on alle 2 validia skaalaa.
+    Palauttaa {'hurst' (trials,) tai skalaari, 'scales', 'fluctuation'}
+    """
+    single = np.ndim(batch) == 1
+    scales, fluctuation = detrended_fluctuation(batch, scales, order)
+    
+    # Validi skaala: F selvästi yli sarjan suuruusluokan pyöristysvirheen
+    magnitude = np.max(np.abs(np.atleast_2d(np.asarray(batch, dtype=float))), axis=1, keepdims=True)
+    valid = fluctuation > 1e-10 * magnitude
+    log_f = np.log(np.where(valid, fluctuation, 1.0))
+    log_s = np.broadcast_to(np.log(scales), fluctuation.shape)
+    
+    # Maskattu pienimmän neliösumman kulmakerroin per rivi
+    count = valid.sum(axis=1)
+    safe_count = np.maximum(count, 1)
+    mean_s = np.sum(valid * log_s, axis=1) / safe_count
+    mean_f = np.sum(valid * log_f, axis=1) / safe_count
+    ds = np.where(valid, log_s - mean_s[:, None], 0.0)
+    sxx = np.sum(ds * ds, axis=1)
+    sxy = np.sum(ds * (log_f - mean_f[:, None]), axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        hurst = np.where((count >= 2) & (sxx > 0), sxy / sxx, np.nan)
+    
+    return {
+        'hurst': float(hurst[0]) if single else hurst,
+        'scales': scales,
+        'fluctuation': fluctuation[0] if single else fluctuation
+    }
+
+def generate_surrogates(time_series, n_surrogates=1000, method='shuffle', n_iter=20, rng=None):
+    """
+    Surrogaattisarjat yhtenä (B, n) batchina
+    'shuffle': satunnainen permutaatio (nollahypoteesi: ei aikariippuvuutta)
+    'phase': FFT-vaiheiden satunnaistus (säilyttää tehospektrin / lineaarisen ACF:n)
+    'iaaft': iteroitu amplitudikorjattu FFT (spektri + jakauma säilyvät)
+    """
+    rng = np.random.default_rng() if rng is None else rng
+    x = np.asarray(time_series, dtype=float)
+    n = len(x)
+    
+    if method == 'shuffle':
+        return rng.permuted(np.tile(x, (n_surrogates, 1)), axis=1)
+    
+    spectrum = np.fft.rfft(x)
+    amplitude = np.abs(spectrum)
+    
+    def randomize_phases():
+        phases = rng.uniform(0, 2 * np.pi, (n_surrogates, len(spectrum)))
+        phases[:, 0] = 0.0  # DC-komponentti (keskiarvo) säilyy
+        if n % 2 == 0:
+            phases[:, -1] = 0.0  # Nyquist-taajuus pysyy reaalisena
+        return np.fft.irfft(amplitude * np.exp(1j * phases), n=n, axis=1)
+    
+    if method == 'phase':
+        return randomize_phases()
+    
+    if method == 'iaaft':
+        sorted_values = np.sort(x)
+        surrogates = sorted_values[np.argsort(np.argsort(randomize_phases(), axis=1), axis=1)]
+        for _ in range(n_iter):
+            # Spektrin korjaus: alkuperäiset amplitudit, nykyiset vaiheet
+            current = np.fft.rfft(surrogates, axis=1)
+            surrogates = np.fft.irfft(amplitude * np.exp(1j * np.angle(current)), n=n, axis=1)
+            # Jakauman korjaus: rank-order remap alkuperäisiin arvoihin
+            surrogates = sorted_values[np.argsort(np.argsort(surrogates, axis=1), axis=1)]
+        return surrogates
+    
+    raise ValueError(f"Tuntematon surrogaattimenetelmä: {method}")
+
+def memory_depth_batch(batch, points, max_lookback=15, window_size=8, threshold=0.3):
+    """
+    measure_memory_depth:n sääntö koko (B, n) batchille kiinteissä pisteissä
+    Korrelaatioprofiilit (B, P, L) sliding window -näkymistä, syvyys
+    memory_depth_threshold_sweep:llä. Palauttaa keskimääräisen syvyyden per sarja.
+    """
+    batch = np.atleast_2d(np.asarray(batch, dtype=float))
+    B, n = batch.shape
+    points = np.asarray(points, dtype=int)
+    w = window_size
+    lags = np.arange(1, max_lookback)
+    if len(points) == 0 or n < w:
+        return np.zeros(B)
+    
+    windows = np.lib.stride_tricks.sliding_window_view(batch, w, axis=1)  # (B, n-w+1, w)
+    past_rows = points[:, None] - lags[None, :]                            # (P, L)
+    in_range = (points[:, None] + w < n) & (past_rows - w >= 0) & (lags[None, :] < np.minimum(max_lookback, points)[:, None])
+    
+    current = windows[:, np.minimum(points, n - w)]                       # (B, P, w)
+    past = windows[:, np.clip(past_rows, 0, n - w)]                       # (B, P, L, w)
+    current_c = current - current.mean(axis=2, keepdims=True)
+    past_c = past - past.mean(axis=3, keepdims=True)
+    current_std = current.std(axis=2)
+    past_std = past.std(axis=3)
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        corr = np.abs(np.einsum('bpw,bplw->bpl', current_c, past_c) /
+                      np.sqrt((current_c ** 2).sum(axis=2)[:, :, None] * (past_c ** 2).sum(axis=3)))
+    corr = np.where(np.isnan(corr), -1.0, np.minimum(corr, 1.0))
+    profiles = np.where((current_std[:, :, None] > 1e-6) & (past_std > 1e-6), corr, np.nan)
+    profiles = np.where(in_range[None, :, :], profiles, -1.0)
+    
+    depths = memory_depth_threshold_sweep(profiles.reshape(B * len(points), -1), (threshold,))['memory_depths']
+    return depths.reshape(B, len(points)).mean(axis=1)
+
+def markov_violation_rate_batch(batch, points, n_lags=5, window=5, threshold=0.2):
+    """
+    markov_property_test:n violation rate koko (B, n) batchille kiinteissä pisteissä
+    Sama sääntö kuin markov_violations_at_point: |corr(x[t-5:t+1], x[t-k-5:t-k+1])| > 0.2
+    """
+    batch = np.atleast_2d(np.asarray(batch, dtype=float))
+    B, n = batch.shape
+    points = np.asarray(points, dtype=int)
+    lags = np.arange(2, n_lags + 1)
+    if len(points) == 0:
+        return np.zeros(B)
+    
+    windows = np.lib.stride_tricks.sliding_window_view(batch, window + 1, axis=1)  # x[s:s+6]
+    starts = points[:, None] - lags[None, :] - window                              # (P, K)
+    valid = (starts >= 0) & (lags[None, :] < np.minimum(n_lags + 1, points)[:, None])
+    
+    current = windows[:, points - window]                          # (B, P, 6)
+    past = windows[:, np.maximum(starts, 0)]                       # (B, P, K, 6)
+    current_c = current - current.mean(axis=2, keepdims=True)
+    past_c = past - past.mean(axis=3, keepdims=True)
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        corr = np.abs(np.einsum('bpw,bpkw->bpk', current_c, past_c) /
+                      np.sqrt((current_c ** 2).sum(axis=2)[:, :, None] * (past_c ** 2).sum(axis=3)))
+    ok = valid[None] & (current.std(axis=2)[:, :, None] > 1e-6) & (past.std(axis=3) > 1e-6)
+    violations = (ok & (corr > threshold)).sum(axis=2)             # (B, P)
+    return violations.mean(axis=1)
+
+def division_rate_batch(batch, interaction_record, strong_threshold=0.5, window_size=10,
+                        lookback_window=20, context=6):
+    """
+    Module 2:n combined_division_detector:n strong-event rate koko (B, n) batchille
+    Kopio division_feature_matrix + detect_from_features -kynnystyksestä (oletuspainot
+    0.3 / 0.2 / 0.5); interaction_record on kaikille surrogaateille sama.
+    """
+    batch = np.atleast_2d(np.asarray(batch, dtype=float))
+    interaction_record = np.asarray(interaction_record, dtype=float)
+    B, n = batch.shape
+    score = np.zeros((B, n))
+    
+    # Method 3: interaction_record[t-1] > 0.3 (sama kaikille)
+    interaction = np.zeros(n)
+    interaction[1:len(interaction_record) + 1] = interaction_record[:n - 1]
+    score += 0.5 * (interaction > 0.3)
+    
+    # Method 1: |corr(ts[t-w:t], ir[t-w:t])| piikit (ts-ikkunan std ts[t-w:t+1]:stä)
+    w = window_size
+    n_corr = min(n, len(interaction_record) + 1)
+    correlations = np.zeros((B, n))
+    if n > w and len(interaction_record) >= w and n_corr > w:
+        ts_full = np.lib.stride_tricks.sliding_window_view(batch, w + 1, axis=1)[:, :n_corr - w]
+        y = np.lib.stride_tricks.sliding_window_view(interaction_record, w)[:n_corr - w]
+        x = ts_full[..., :-1]
+        xc = x - x.mean(axis=2, keepdims=True)
+        yc = y - y.mean(axis=1, keepdims=True)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            corr = np.einsum('btw,tw->bt', xc, yc) / np.sqrt((xc * xc).sum(axis=2) * (yc * yc).sum(axis=1))
+        valid = (ts_full.std(axis=2) > 0) & (y.std(axis=1) > 0)[None, :]
+        correlations[:, w:n_corr] = np.where(valid & np.isfinite(corr), np.abs(np.clip(corr, -1.0, 1.0)), 0.0)
+    for b in range(B):
+        peaks, _ = find_peaks(correlations[b], height=0.2, distance=5)
+        score[b, peaks] += 0.3
+    
+    # Method 2: riippuvuusrakenteen muutos > 0.5
+    c = context
+    if n >= c and n > lookback_window:
+        ctx = np.lib.stride_tricks.sliding_window_view(batch, c, axis=1)
+        ctx_std = ctx.std(axis=2)
+        ctx_valid = ctx_std > 0
+        ctx_z = (ctx - ctx.mean(axis=2, keepdims=True)) / np.where(ctx_valid, ctx_std, 1.0)[..., None]
+        times = np.arange(lookback_window, n)
+        current = ctx_z[:, times - (c - 1)]
+        current_ok = ctx_valid[:, times - (c - 1)]
+        deps = np.full((B, len(times), lookback_window - 1), np.nan)
+        for lag in range(1, lookback_window):
+            # Rivit times - (c-1) - lag ovat yhtenäinen väli: viipale, ei fancy-indeksointia
+            first_row = times[0] - (c - 1) - lag
+            skip = max(0, -first_row)
+            rows = slice(first_row + skip, first_row + len(times))
+            ok = current_ok[:, skip:] & ctx_valid[:, rows]
+            dep = np.abs(np.einsum('btc,btc->bt', current[:, skip:], ctx_z[:, rows]) / c)
+            deps[:, skip:, lag - 1] = np.where(ok, np.minimum(dep, 1.0), np.nan)
+        # nanstd kahdella läpikäynnillä (np.nanstd on hidas isoille batcheille)
+        present = ~np.isnan(deps)
+        counts = present.sum(axis=2)
+        filled = np.where(present, deps, 0.0)
+        mean = filled.sum(axis=2) / np.maximum(counts, 1)
+        dep_change = np.sqrt((np.where(present, deps - mean[..., None], 0.0) ** 2).sum(axis=2) / np.maximum(counts, 1))
+        score[:, times] += 0.2 * ((counts > 3) & (dep_change > 0.5))
+    
+    return np.sum(score > strong_threshold, axis=1) / n
+
+def haar_pyramid(time_series, n_levels=None, min_length=64, undecimated=False):
+    """
+    Haar-wavelet pyramidi O(n): approksimaatiot (parien keskiarvot) ja detaljit
+    (parien puolierotukset) reshape:lla, taso j vastaa aikaskaalaa 2^j.
+    undecimated=True: à-trous -versio (ei harvennusta, pituus pysyy n:nä).
+    Palauttaa {'scales', 'approximations', 'details'}; taso 0 = alkuperäinen sarja.
+    """
+    a = np.asarray(time_series, dtype=float)
+    max_levels = int(np.log2(max(len(a) // min_length, 1)))
+    n_levels = max_levels if n_levels is None else min(n_levels, max_levels)
+    approximations, details = [a], [np.zeros(0)]
+    
+    for level in range(1, n_levels + 1):
+        if undecimated:
+            step = 2 ** (level - 1)
+            shifted = np.concatenate([np.full(step, a[0]), a[:-step]])
+            a, d = (a + shifted) / 2, (a - shifted) / 2
+        else:
+            pairs = a[:2 * (len(a) // 2)].reshape(-1, 2)
+            a, d = pairs.mean(axis=1), (pairs[:, 1] - pairs[:, 0]) / 2
+        approximations.append(a)
+        details.append(d)
+    
+    return {'scales': [2 ** j for j in range(n_levels + 1)],
+            'approximations': approximations, 'details': details}
+
+def coarse_interaction_record(interaction_record, scale):
+    """
+    Interaction record karkealla skaalalla: lohkossa vuorovaikutus jos missä tahansa
+    askeleessa oli (max). Kohdistus: record[t-1] vaikuttaa askeleeseen t.
+    """
+    aligned = np.concatenate([[0.0], np.asarray(interaction_record, dtype=float)])
+    n_blocks = len(aligned) // scale
+    coarse = aligned[:n_blocks * scale].reshape(n_blocks, scale).max(axis=1)
+    return coarse[1:]
+
+MULTIRESOLUTION_METRICS = ('avg_memory_depth', 'markov_violation_rate', 'acf_decay_lag',
+                           'pacf_violation_rate', 'division_rate', 'detail_energy')
+
+def multiresolution_memory_table(time_series, interaction_record=None, n_levels=None,
+                                 min_length=64, strong_threshold=0.5, seed=None):
+    """
+    Multi-resolution muistianalyysi: skaala x mittari -taulukko yhdelle sarjalle
+    Jokaisella Haar-tasolla lasketaan samat mittarit kuin täyden resoluution analyysissa
+    (memory depth -sääntö, Markov violations, ACF/PACF, division rate karkealla
+    interaction recordilla) ilman detektorien uudelleenajoa uudelleennäytteistetyille
+    kopioille. detail_energy = detaljikertoimien varianssi / sarjan varianssi.
+    Palauttaa {'scales', 'metrics', 'table' (n_scales, n_metrics)}; NaN = ei laskettavissa.
+    """
+    rng = np.random.default_rng(seed)
+    pyramid = haar_pyramid(time_series, n_levels, min_length)
+    total_variance = max(np.var(time_series), 1e-12)
+    table = np.full((len(pyramid['scales']), len(MULTIRESOLUTION_METRICS)), np.nan)
+    
+    for level, (scale, a, d) in enumerate(zip(pyramid['scales'], pyramid['approximations'],
+                                              pyramid['details'])):
+        n = len(a)
+        memory_points = rng.choice(np.arange(15, n - 15), size=min(30, n // 30), replace=False)
+        markov_points = rng.choice(np.arange(10, n - 5), size=min(20, n // 50), replace=False)
+        acf_stats = acf_memory_statistics(a, max_lag=min(20, n // 4))
+        
+        row = {
+            'avg_memory_depth': memory_depth_batch(a, memory_points)[0],
+            'markov_violation_rate': markov_violation_rate_batch(a, markov_points)[0],
+            'acf_decay_lag': acf_stats['acf_decay_lag'],
+            'pacf_violation_rate': acf_stats['pacf_violation_rate'],
+            'detail_energy': np.var(d) / total_variance if len(d) else np.nan
+        }
+        if interaction_record is not None:
+            row['division_rate'] = division_rate_batch(
+                a, coarse_interaction_record(interaction_record, scale),
+                strong_threshold=strong_threshold)[0]
+        
+        for j, metric in enumerate(MULTIRESOLUTION_METRICS):
+            if metric in row:
+                table[level, j] = row[metric]
+    
+    return {'scales': pyramid['scales'], 'metrics': list(MULTIRESOLUTION_METRICS), 'table': table}
+
+SURROGATE_METHODS = ('shuffle', 'phase', 'iaaft')
+
+def surrogate_null_distribution(time_series, interaction_record=None, n_surrogates=1000,
+                                methods=SURROGATE_METHODS, strong_threshold=0.5,
+                                quantiles=(0.025, 0.5, 0.975), chunk_size=250, seed=None):
+    """
+    Surrogaattitesti: onko mitattu muisti / division rate merkitsevä nollamalliin nähden?
+    Kaikki mittarit lasketaan samoissa satunnaispisteissä alkuperäiselle sarjalle ja
+    B surrogaatille (batchattuna). p-arvo on ylähäntä: (1 + #{null >= havaittu}) / (B + 1).
+    division_rate lasketaan vain jos interaction_record annettu. Surrogaatit ajetaan
+    chunk_size-kokoisina lohkoina, jotta (B, n, lagit) -välitaulukot pysyvät pieninä.
+    """
+    rng = np.random.default_rng(seed)
+    x = np.asarray(time_series, dtype=float)
+    n = len(x)
+    
+    # Samat testipisteet kuin measure_memory_depth / markov_property_test (ilman eventtejä)
+    memory_points = rng.choice(np.arange(15, n - 15), size=min(30, n // 30), replace=False)
+    markov_points = rng.choice(np.arange(10, n - 5), size=min(20, n // 50), replace=False)
+    
+    metrics = {
+        'avg_memory_depth': lambda batch: memory_depth_batch(batch, memory_points),
+        'markov_violation_rate': lambda batch: markov_violation_rate_batch(batch, markov_points),
+    }
+    if interaction_record is not None:
+        metrics['division_rate'] = lambda batch: division_rate_batch(
+            batch, interaction_record, strong_threshold=strong_threshold)
+    
+    observed = {name: float(metric(x[None, :])[0]) for name, metric in metrics.items()}
+    results = {}
+    for method in methods:
+        surrogates = generate_surrogates(x, n_surrogates, method, rng=rng)
+        results[method] = {}
+        for name, metric in metrics.items():
+            null = np.concatenate([metric(surrogates[i:i + chunk_size])
+                                   for i in range(0, n_surrogates, chunk_size)])
+            results[method][name] = {
+                'observed': observed[name],
+                'p_value': float((1 + np.sum(null >= observed[name])) / (n_surrogates + 1)),
+                'null_mean': float(null.mean()),
+                'null_quantiles': {str(q): float(v) for q, v in zip(quantiles, np.quantile(null, quantiles))}
+            }
+    return results
+
+class IncrementalMemoryAnalysis:
+    """
+    Jatkettava memory/Markov-analyysi: sarjan pidentäminen maksaa vain uuden hännän
+    Tila: trailing-ikkuna (max_lookback + ikkunat), näytepisteiden raja (frontier),
+    kertyneet memory depths ja Markov violations sekä division event -ajat.
+    Toisin kuin measure_memory_depth (kiinteä määrä pisteitä koko sarjasta), pisteet
+    poimitaan Bernoulli-otannalla tiheydellä sample_rate, joten näytemäärä kasvaa
+    sarjan mukana - sopii konvergenssitutkimuksiin (size tuplataan kunnes score vakautuu).
+    """
+    
+    def __init__(self, max_lookback=15, window_size=8, n_lags=5, sample_rate=1/30):
+        self.max_lookback = max_lookback
+        self.window_size = window_size
+        self.n_lags = n_lags
+        self.sample_rate = sample_rate
+        
+        self.n = 0
+        self.tail = np.zeros(0)
+        self.tail_offset = 0
+        self.keep = max_lookback + 2 * window_size + n_lags + 10  # Trailing-ikkunan pituus
+        
+        self.frontier = 0                  # Pisteet < frontier on jo käsitelty
+        self.pending_events = []           # Division events joita ei vielä voi analysoida
+        self.memory_depths = []
+        self.event_memory_depths = []
+        self.markov_violations = []
+        self.division_times = []
+    
+    def extend(self, new_samples, division_times=None):
+        """
+        Lisää uudet näytteet (ja niiden division event -ajat absoluuttisina aikoina)
+        Analysoi vain pisteet joille data on nyt ensimmäistä kertaa riittävä
+        """
+        new_samples = np.asarray(new_samples, dtype=float)
+        self.tail = np.concatenate([self.tail, new_samples])
+        self.n += len(new_samples)
+        if division_times is not None:
+            division_times = [int(t) for t in division_times]
+            self.division_times.extend(division_times)
+            self.pending_events.extend(division_times)
+        
+        # Piste t on valmis kun t + window_size < n ja t < n - 5 (kuten batch-versiossa)
+        ready_until = self.n - max(self.window_size + 1, 5)
+        if ready_until > self.frontier:
+            candidates = np.arange(self.frontier, ready_until)
+            sampled = candidates[np.random.random(len(candidates)) < self.sample_rate]
+            
+            for t in sampled:
+                if t >= self.max_lookback:
+                    self.memory_depths.append(memory_depth_at_point(
+                        self.tail, t, self.max_lookback, self.window_size, self.tail_offset))
+                if t >= self.n_lags + 5:
+                    self.markov_violations.append(markov_violations_at_point(
+                        self.tail, t, self.n_lags, self.tail_offset))
+            
+            still_pending = []
+            for t in self.pending_events:
+                if t >= ready_until:
+                    still_pending.append(t)
+                elif t >= self.max_lookback and (self.tail_offset == 0 or
+                        t - self.max_lookback - self.window_size >= self.tail_offset):
+                    # Historia löytyy vielä trailing-ikkunasta
+                    self.event_memory_depths.append(memory_depth_at_point(
+                        self.tail, t, self.max_lookback, self.window_size, self.tail_offset))
+            self.pending_events = still_pending
+            self.frontier = ready_until
+        
+        # Leikkaa trailing-ikkuna: säilytä vain tuleville pisteille tarvittava historia
+        drop = len(self.tail) - (self.n - self.frontier) - self.keep
+        if drop > 0:
+            self.tail = self.tail[drop:]
+            self.tail_offset += drop
+        
+        return self.summary()
+    
+    def summary(self):
+        """Nykyiset tunnusluvut (sama rakenne kuin memory_results:ssa)"""
+        depths = self.memory_depths + self.event_memory_depths
+        return {
+            'n_samples': self.n,
+            'avg_memory_depth': float(np.mean(depths)) if depths else 0.0,
+            'memory_depth_std': float(np.std(depths)) if depths else 0.0,
+            'markov_violation_rate': float(np.mean(self.markov_violations)) if self.markov_violations else 0.0,
+            'conditioning_sparsity': len(self.division_times) / max(1, self.n),
+            'memory_depth_samples': len(depths)
+        }
+
 def calculate_available_conditioning_times(time_series, division_events):
     """
     BARANDES: Indivisible processes - vähemmän ehdollisia todennäköisyyksiä
@@ -289,11 +1552,17 @@ for name, process in references.items():
     print(f"\n📊 Analysoidaan muisti: {name}")
     
     time_series = process['time_series']
-    division_events = division_results[name]['division_events_list']
+    division_events = DivisionTimeIndex.from_dicts(division_results[name]['division_events_list'])
     
-    # 1. Mittaa memory depth
-    memory_depths = measure_memory_depth(time_series, division_events)
+    # 1. Mittaa memory depth (+ profiilit kynnyspyyhkäisyä varten)
+    memory_depths, memory_profiles = measure_memory_depth(time_series, division_events,
+                                                          return_profiles=True)
     avg_memory_depth = np.mean(memory_depths) if memory_depths else 0.0
+    memory_sweep = memory_depth_threshold_sweep(memory_profiles['profiles'])
+    
+    # Ordinaalikuviot: kynnysvapaa kompleksisuussormenjälki (d = 3..7)
+    ordinal = permutation_entropy(time_series, dims=(3, 4, 5, 6, 7))
+    lz = lempel_ziv_complexity(time_series)  # Mediaanibinarisointi, diskreetit tilat sellaisinaan
     
     # 2. Testaa Markov-ominaisuutta
     markov_violations = markov_property_test(time_series)
@@ -303,7 +1572,32 @@ for name, process in references.items():
     # 3. Laske conditioning sparsity
     conditioning_info = calculate_available_conditioning_times(time_series, division_events)
     
-    # 4. Vertaa odotuksiin
+    # 4. Informaatioteoreettinen muistikäyrä I(X_t; X_{t-k} | X_{t-1})
+    cmi_curve = conditional_mi_curve(time_series, max_lag=10, n_bins=5, bias_correction=True)
+    cmi_lag2 = conditional_independence_test(time_series, n_bins=5)  # Sama välimuisti
+    cmi_lag2_ksg = conditional_independence_test(time_series, estimator='ksg')  # Jatkuva estimaatti
+    cmi_curve_ksg = ksg_conditional_mi_curve(time_series, max_lag=10)
+    
+    # Markov-järjestys k-gram indeksistä (LR + BIC)
+    markov_order = markov_order_test(time_series, max_order=4)
+    
+    # Muuttuvan pituuden kontekstit ja kontekstit havaituilla division-hetkillä
+    context_tree = context_tree_estimator(time_series, max_order=6,
+                                          division_times=division_events.times)
+    
+    # Globaalit ACF/PACF-tilastot (FFT + Durbin-Levinson) ikkunatestien rinnalle
+    acf_stats = acf_memory_statistics(time_series, max_lag=20)
+    
+    # Skaalavapaa pitkän muistin mittari (DFA), ei rajoitu max_lookback:iin
+    dfa = hurst_exponent_dfa(time_series)
+    
+    # Multi-resolution: samat mittarit Haar-pyramidin jokaisella skaalalla
+    multiresolution = multiresolution_memory_table(
+        time_series, process['interaction_record'],
+        strong_threshold=0.3 if name == 'indivisible' else 0.5, seed=0
+    )
+    
+    # 5. Vertaa odotuksiin
     expected_memory = process.get('expected_memory_depth', 1.0)
     
     memory_results[name] = {
@@ -314,12 +1608,94 @@ for name, process in references.items():
         'conditioning_sparsity': conditioning_info['conditioning_sparsity'],
         'available_conditioning_times': conditioning_info['available_conditioning_times'],
         'expected_memory_depth': expected_memory,
-        'memory_depth_samples': len(memory_depths)
+        'memory_depth_samples': len(memory_depths),
+        'permutation_entropy': {str(d): float(v) for d, v in zip(ordinal['dims'], ordinal['entropy'])},
+        'statistical_complexity': {str(d): float(v) for d, v in zip(ordinal['dims'], ordinal['complexity'])},
+        'lz_complexity': float(lz['normalized']),
+        'lz_entropy_rate': float(lz['entropy_rate']),
+        'cmi_lags': [int(k) for k in cmi_curve['lags']],
+        'cmi_curve': [float(v) for v in cmi_curve['cmi']],
+        'cmi_lag2': float(cmi_lag2),
+        'cmi_lag2_ksg': float(cmi_lag2_ksg),
+        'cmi_curve_ksg': [float(v) for v in cmi_curve_ksg['cmi']],
+        'markov_order_bic': markov_order['bic_order'],
+        'markov_order_lr': markov_order['lr_order'],
+        'context_length_distribution': [float(v) for v in context_tree['context_length_distribution']],
+        'mean_context_length': context_tree['mean_context_length'],
+        'division_mean_context_length': context_tree['division_mean_context_length'],
+        'division_contexts': context_tree.get('division_contexts', []),
+        'acf_decay_lag': int(acf_stats['acf_decay_lag']),
+        'pacf_violation_rate': float(acf_stats['pacf_violation_rate']),
+        'pacf_beyond_lag1_p': float(acf_stats['pacf_p_value']),
+        'hurst_dfa': float(dfa['hurst']) if np.isfinite(dfa['hurst']) else None,  # NaN ei ole validia JSON:ia
+        'multiresolution': {
+            'scales': multiresolution['scales'],
+            'metrics': multiresolution['metrics'],
+            'table': [[None if np.isnan(v) else float(v) for v in row] for row in multiresolution['table']]
+        },
+        'memory_depth_by_threshold': {
+            str(thr): float(depth) for thr, depth in
+            zip(memory_sweep['thresholds'], memory_sweep['avg_memory_depth'])
+        }
     }
     
     print(f"  🧠 Memory depth: {avg_memory_depth:.2f} ± {np.std(memory_depths):.2f}")
     print(f"  🔗 Markov violations: {violation_rate:.2f} (total: {total_violations})")
     print(f"  📊 Conditioning sparsity: {conditioning_info['conditioning_sparsity']:.3f}")
+    print(f"  🔀 Permutation entropy (d=5): {ordinal['entropy'][2]:.3f}, "
+          f"JS complexity: {ordinal['complexity'][2]:.3f}")
+    print(f"  🗜️ LZ76 complexity: {lz['normalized']:.3f} ({lz['complexity']} fraasia, "
+          f"aakkosto {lz['alphabet_size']})")
+    print(f"  📉 ACF decay lag: {memory_results[name]['acf_decay_lag']}, "
+          f"PACF beyond lag 1: p={memory_results[name]['pacf_beyond_lag1_p']:.3g}")
+    if memory_results[name]['hurst_dfa'] is not None:
+        print(f"  📐 DFA Hurst: {memory_results[name]['hurst_dfa']:.3f}")
+    else:
+        print("  📐 DFA Hurst: ei määritelty (alle 2 validia skaalaa)")
+    print(f"  🔢 Markov order: BIC={markov_order['bic_order']}, LR={markov_order['lr_order']} "
+          f"(aakkosto {markov_order['alphabet_size']})")
+    print(f"  🌳 Context tree: keskipituus {context_tree['mean_context_length']:.2f}, "
+          f"division-hetkillä {context_tree['division_mean_context_length']:.2f}")
+    depth_column = multiresolution['table'][:, MULTIRESOLUTION_METRICS.index('avg_memory_depth')]
+    print(f"  🔬 Memory depth per skaala {multiresolution['scales']}: {np.round(depth_column, 2).tolist()}")
+    
+    # Prosessin diskretisoinnit eivät ole enää tarpeen
+    clear_discretization_cache()
+
+# =============================================================================
+# SURROGAATTITESTIT - NOLLAJAKAUMAT MUISTILLE JA DIVISION RATELLE
+# =============================================================================
+
+N_SURROGATES = 1000  # Surrogaatteja per menetelmä per sarja
+
+print(f"\n🎲 Surrogaattitestit ({N_SURROGATES} per menetelmä: {', '.join(SURROGATE_METHODS)}):")
+for name, process in references.items():
+    surrogate_tests = surrogate_null_distribution(
+        process['time_series'], process['interaction_record'], n_surrogates=N_SURROGATES,
+        strong_threshold=0.3 if name == 'indivisible' else 0.5,  # Sama kuin Moduuli 2
+        seed=0
+    )
+    memory_results[name]['surrogate_tests'] = surrogate_tests
+    for method, tests in surrogate_tests.items():
+        print(f"  {name:>14s} / {method:<7s}: " + ", ".join(
+            f"{metric} p={result['p_value']:.3f}" for metric, result in tests.items()))
+
+# =============================================================================
+# INKREMENTAALINEN ANALYYSI - KONVERGENSSI SARJAN PITUUDEN MUKAAN
+# =============================================================================
+
+print("\n📈 Inkrementaalinen konvergenssi (indivisible, tuplattava pituus):")
+incremental = IncrementalMemoryAnalysis(sample_rate=1/10)
+indiv_series = references['indivisible']['time_series']
+indiv_divisions = np.asarray(references['indivisible'].get('division_times', []), dtype=int)
+chunk_start, chunk_end = 0, 125
+while chunk_start < len(indiv_series):
+    chunk_end = min(chunk_end, len(indiv_series))
+    in_chunk = (indiv_divisions >= chunk_start) & (indiv_divisions < chunk_end)
+    summary = incremental.extend(indiv_series[chunk_start:chunk_end], indiv_divisions[in_chunk])
+    print(f"  n={summary['n_samples']:5d}: memory depth {summary['avg_memory_depth']:.2f}, "
+          f"violations {summary['markov_violation_rate']:.2f} ({summary['memory_depth_samples']} pistettä)")
+    chunk_start, chunk_end = chunk_end, 2 * chunk_end
 
 # =============================================================================
 # KRIITTISYYSANALYYSI MUISTILLE
@@ -28,6 +28,88 @@ print("="*60)
 # INDIVISIBLE SCORE CALCULATION
 # =============================================================================
 
+# Score-komponenttien paloittaiset muodot: lineaarinen nousu 0 -> low, tasanne [low, high]
+# (base + gain * (1 - |x - center| / width), valinnainen sisempi paras alue 'inner'),
+# lineaarinen lasku yli high:n nollaan (falloff)
+# Moduulit 6 ja 9 kopioivat 'rate'/'memory_simple'-muodot ja 'systematic'-profiilin
+SCORE_COMPONENT_SHAPES = {
+    'rate': {'low': 0.01, 'high': 0.25, 'center': 0.15, 'base': 0.8, 'gain': 0.2,
+             'width': 0.15, 'falloff': 0.25},
+    'memory': {'low': 0.5, 'high': 4.0, 'center': 2.25, 'base': 0.7, 'gain': 0.2,
+               'width': 1.75, 'falloff': 6.0, 'inner': (1.5, 3.0, 0.9, 0.1, 0.75)},
+    'memory_simple': {'low': 0.5, 'high': 4.0, 'center': 2.5, 'base': 0.8, 'gain': 0.2,
+                      'width': 2.0, 'falloff': 6.0},
+    'sparsity': {'low': 0.01, 'high': 0.30, 'center': 0.14, 'base': 0.7, 'gain': 0.2,
+                 'width': 0.16, 'falloff': 0.30, 'inner': (0.08, 0.20, 0.9, 0.1, 0.06)},
+    'violations': {'low': 0.1, 'high': 0.8, 'center': 0.45, 'base': 0.7, 'gain': 0.2,
+                   'width': 0.35, 'falloff': 0.2, 'inner': (0.3, 0.6, 0.9, 0.1, 0.15)},
+}
+
+# Painoprofiilit: komponentti -> (syöte, muoto, paino)
+# 'validation' = calculate_indivisible_score (tämä moduuli),
+# 'systematic' = calculate_indivisible_score_simple (Moduuli 6) ja _fast (Moduuli 9)
+INDIVISIBLE_SCORE_PROFILES = {
+    'validation': {
+        'division': ('division_rate', 'rate', 0.3),
+        'memory': ('memory_depth', 'memory', 0.25),
+        'sparsity': ('conditioning_sparsity', 'sparsity', 0.25),
+        'violations': ('markov_violation_rate', 'violations', 0.2),
+    },
+    'systematic': {
+        'division': ('division_rate', 'rate', 0.4),
+        'memory': ('memory_depth', 'memory_simple', 0.4),
+        'interaction': ('interaction_rate', 'rate', 0.2),
+    },
+}
+
+def score_component(values, shape):
+    """
+    Yksi score-komponentti taulukolle np.select + np.clip -muodossa (sama kuin if/elif-ketju)
+    Skalaarisyöte palauttaa float:n, taulukko taulukon. Kopiot: Moduuli 6 ja 9 (pidä synkassa)
+    """
+    x = np.asarray(values, dtype=float)
+    conditions = [x < shape['low']]
+    choices = [x / shape['low']]
+    if 'inner' in shape:
+        inner_low, inner_high, inner_base, inner_gain, inner_width = shape['inner']
+        conditions.append((x >= inner_low) & (x <= inner_high))
+        choices.append(inner_base + inner_gain * (1 - np.abs(x - shape['center']) / inner_width))
+    conditions.append(x <= shape['high'])
+    choices.append(shape['base'] + shape['gain'] * (1 - np.abs(x - shape['center']) / shape['width']))
+    # NaN ohjautuu default-haaraan; vanha max(0, ...) antoi sille 0, np.clip ei
+    beyond = np.nan_to_num(np.clip(1 - (x - shape['high']) / shape['falloff'], 0.0, None), nan=0.0)
+    score = np.select(conditions, choices, default=beyond)
+    return score if score.ndim else float(score)
+
+def indivisible_score_vectorized(division_rate, memory_depth, conditioning_sparsity=None,
+                                 markov_violation_rate=None, interaction_rate=None,
+                                 profile='validation'):
+    """
+    Vektoroitu indivisible score: syötteet skalaareja tai samanmuotoisia taulukoita
+    profile: INDIVISIBLE_SCORE_PROFILES-avain tai oma {komponentti: (syöte, muoto, paino)}
+    Palauttaa {'total_score': taulukko, 'components': {komponentti: taulukko}};
+    miljoonan toiston pisteytys on yksi taulukkolauseke per komponentti.
+    """
+    inputs = {
+        'division_rate': division_rate,
+        'memory_depth': memory_depth,
+        'conditioning_sparsity': conditioning_sparsity,
+        'markov_violation_rate': markov_violation_rate,
+        'interaction_rate': interaction_rate
+    }
+    if isinstance(profile, str):
+        profile = INDIVISIBLE_SCORE_PROFILES[profile]
+    
+    components = {}
+    total_score = 0.0
+    for component, (input_name, shape, weight) in profile.items():
+        if inputs[input_name] is None:
+            raise ValueError(f"Profiili tarvitsee syötteen '{input_name}'")
+        components[component] = score_component(inputs[input_name], SCORE_COMPONENT_SHAPES[shape])
+        total_score = total_score + weight * components[component]
+    
+    return {'total_score': total_score, 'components': components}
+
 def calculate_indivisible_score(division_rate, memory_depth, conditioning_sparsity, 
                                markov_violation_rate, process_type='unknown'):
     """
@@ -40,68 +122,14 @@ def calculate_indivisible_score(division_rate, memory_depth, conditioning_sparsi
     - Markov violations: Moderate määrä, ei liikaa
     
     HUOM: EI OPTIMOI "TÄYDELLISYYTTÄ" - hakee realistisia arvoja!
+    PÄIVITETTY: Komponentit indivisible_score_vectorized:sta ('validation'-profiili)
     """
     
-    # 1. DIVISION EVENTS COMPONENT (0-1)
-    # Optimaalinen: 0.05-0.25 (5-25% ajoista)
-    if division_rate < 0.01:
-        division_component = division_rate / 0.01  # Lineaarinen nousu 0 -> 1
-    elif 0.01 <= division_rate <= 0.25:
-        division_component = 0.8 + 0.2 * (1 - abs(division_rate - 0.15) / 0.15)  # Optimaalinen alue
-    else:
-        division_component = max(0, 1 - (division_rate - 0.25) / 0.25)  # Lasku yli 0.25
-    
-    # 2. MEMORY DEPTH COMPONENT (0-1)  
-    # Optimaalinen: 1.5-4.0 (ei Markov, ei liian kompleksi)
-    if memory_depth < 0.5:
-        memory_component = memory_depth / 0.5  # Liian vähän muistia
-    elif 0.5 <= memory_depth <= 4.0:
-        # Paras alue: 1.5-3.0
-        if 1.5 <= memory_depth <= 3.0:
-            memory_component = 0.9 + 0.1 * (1 - abs(memory_depth - 2.25) / 0.75)
-        else:
-            memory_component = 0.7 + 0.2 * (1 - abs(memory_depth - 2.25) / 1.75)
-    else:
-        memory_component = max(0, 1 - (memory_depth - 4.0) / 6.0)  # Liian paljon muistia
-    
-    # 3. CONDITIONING SPARSITY COMPONENT (0-1)
-    # Optimaalinen: 0.05-0.30 (harva mutta ei liian harva)
-    if conditioning_sparsity < 0.01:
-        sparsity_component = conditioning_sparsity / 0.01  # Liian harva
-    elif 0.01 <= conditioning_sparsity <= 0.30:
-        # Paras alue: 0.08-0.20
-        if 0.08 <= conditioning_sparsity <= 0.20:
-            sparsity_component = 0.9 + 0.1 * (1 - abs(conditioning_sparsity - 0.14) / 0.06)
-        else:
-            sparsity_component = 0.7 + 0.2 * (1 - abs(conditioning_sparsity - 0.14) / 0.16)
-    else:
-        sparsity_component = max(0, 1 - (conditioning_sparsity - 0.30) / 0.30)  # Liian tiheä
-    
-    # 4. MARKOV VIOLATION COMPONENT (0-1)
-    # Optimaalinen: 0.3-0.7 (moderate violations)
-    if markov_violation_rate < 0.1:
-        violation_component = markov_violation_rate / 0.1  # Liian Markov-mainen
-    elif 0.1 <= markov_violation_rate <= 0.8:
-        # Paras alue: 0.3-0.6
-        if 0.3 <= markov_violation_rate <= 0.6:
-            violation_component = 0.9 + 0.1 * (1 - abs(markov_violation_rate - 0.45) / 0.15)
-        else:
-            violation_component = 0.7 + 0.2 * (1 - abs(markov_violation_rate - 0.45) / 0.35)
-    else:
-        violation_component = max(0, 1 - (markov_violation_rate - 0.8) / 0.2)  # Liian ei-Markov
-    
-    # YHDISTÄ KOMPONENTIT (painotettu keskiarvo)
-    weights = {
-        'division': 0.3,      # Division events tärkein Barandes'ille
-        'memory': 0.25,       # Memory depth tärkeä
-        'sparsity': 0.25,     # Conditioning sparsity tärkeä  
-        'violations': 0.2     # Markov violations tukeva
-    }
-    
-    total_score = (weights['division'] * division_component +
-                   weights['memory'] * memory_component +
-                   weights['sparsity'] * sparsity_component + 
-                   weights['violations'] * violation_component)
+    # Komponentit: division (optimi 0.05-0.25), memory (1.5-3.0), sparsity (0.08-0.20),
+    # violations (0.3-0.6); painot 0.3 / 0.25 / 0.25 / 0.2
+    score = indivisible_score_vectorized(division_rate, memory_depth, conditioning_sparsity,
+                                         markov_violation_rate, profile='validation')
+    total_score = float(score['total_score'])
     
     # KRIITTISYYSCHECK: Varoita liian korkeista pisteistä
     if total_score > 0.85:
@@ -109,12 +137,7 @@ def calculate_indivisible_score(division_rate, memory_depth, conditioning_sparsi
     
     return {
         'total_score': total_score,
-        'components': {
-            'division': division_component,
-            'memory': memory_component, 
-            'sparsity': sparsity_component,
-            'violations': violation_component
-        },
+        'components': {name: float(value) for name, value in score['components'].items()},
         'inputs': {
             'division_rate': division_rate,
             'memory_depth': memory_depth,
@@ -281,6 +304,24 @@ else:
     print("❌ JOITAKIN VALIDOINTITESTEJÄ EI LÄPÄISTY!")
     print("⚠️ Mittareita täytyy kalibroida ennen jatkamista")
 
+# =============================================================================
+# SURROGAATTITESTIT (MODUULI 3): ONKO MITATTU MUISTI MERKITSEVÄ?
+# =============================================================================
+
+print(f"\n🎲 Surrogaattitestien p-arvot (ylähäntä, nollamalli vs. havaittu):")
+surrogate_p_values = {}
+for name in references.keys():
+    surrogate_tests = memory_results[name].get('surrogate_tests')
+    if not surrogate_tests:
+        continue
+    surrogate_p_values[name] = {
+        method: {metric: result['p_value'] for metric, result in tests.items()}
+        for method, tests in surrogate_tests.items()
+    }
+    for method, p_values in surrogate_p_values[name].items():
+        significant = [metric for metric, p in p_values.items() if p < 0.05]
+        print(f"  {name} / {method}: merkitsevät (p < 0.05): {', '.join(significant) if significant else '-'}")
+
 # =============================================================================
 # YHTEENVETO JA TILASTOT
 # =============================================================================
@@ -322,7 +363,8 @@ final_results = {
         'markov_violation_rate': memory_results[name]['markov_violation_rate'],
         'indivisible_score': validation_results[name]['indivisible_score']['total_score'],
         'score_components': validation_results[name]['indivisible_score']['components'],
-        'validation_passed': validation_results[name]['score_valid']
+        'validation_passed': validation_results[name]['score_valid'],
+        'surrogate_p_values': surrogate_p_values.get(name, {})
     } for name in references.keys()},
     'summary_statistics': {
         'avg_indivisible_score': float(df_summary['Indivisible_Score'].mean()),
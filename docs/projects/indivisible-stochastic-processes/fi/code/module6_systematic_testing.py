@@ -7,6 +7,7 @@ import json
 import pickle
 from datetime import datetime
 import glob
+import math
 from scipy import stats
 from scipy.signal import find_peaks
 import warnings
@@ -64,50 +65,86 @@ def measure_classical_correlation(time_series, interaction_record, window_size=8
     
     return correlations
 
-def detect_division_events_simple(time_series, interaction_record):
-    """Yksinkertaistettu division events detector - KORJATTU"""
-    division_events = []
+def pelt_change_points_simple(time_series, min_size=4, max_segment=500):
+    """Yksinkertaistettu Moduuli 2:n pelt_change_points (meanvar-cost, BIC-penalty, oletus-max_segment)
+    Optimaalinen segmentointi kun aloituskohtina vain viimeiset max_segment indeksiä,
+    O(n * max_segment). Palauttaa muutoskohdat int64-taulukkona"""
+    x = np.asarray(time_series, dtype=float)
+    x = x - x.mean()
+    n = len(x)
+    P1 = np.concatenate([[0.0], np.cumsum(x)])
+    P2 = np.concatenate([[0.0], np.cumsum(x * x)])
+    
+    def cost(starts, ends):
+        length = ends - starts
+        s1 = P1[ends] - P1[starts]
+        return length * np.log(np.maximum(((P2[ends] - P2[starts]) - s1 * s1 / length) / length, 1e-8))
+    
+    penalty = 3 * np.log(max(n, 2))
+    F = np.full(n + 1, np.inf)
+    F[0] = -penalty
+    last = np.zeros(n + 1, dtype=np.int64)
+    for t in range(min_size, n + 1):
+        starts = np.arange(max(0, t - max_segment), t - min_size + 1)
+        starts = starts[(starts == 0) | (starts >= min_size)]
+        values = F[starts] + cost(starts, t)
+        best = values.argmin()
+        F[t], last[t] = values[best] + penalty, starts[best]
+    
+    cps = []
+    t = last[n]
+    while t > 0:
+        cps.append(t)
+        t = last[t]
+    cps = np.array(cps[::-1], dtype=np.int64)
+    if len(cps) == 0:
+        return cps
+    bounds = np.concatenate([[0], cps, [n]])
+    gain = cost(bounds[:-2], bounds[2:]) - cost(bounds[:-2], bounds[1:-1]) - cost(bounds[1:-1], bounds[2:])
+    return cps[gain > penalty]
+
+def detect_division_events_simple(time_series, interaction_record, as_dicts=True, changepoints=False):
+    """Yksinkertaistettu division events detector - KORJATTU
+    PÄIVITETTY: Metodien osumat bool-maskeina, score vektorisummana.
+    as_dicts=False palauttaa (times int32, scores) taulukot
+    changepoints=True lisää PELT-muutoskohdat kolmanneksi metodiksi"""
+    n = len(time_series)
     
     # Varmista että inputs ovat valideja
-    if len(time_series) < 10 or len(interaction_record) < 5:
-        return division_events
+    if n < 10 or len(interaction_record) < 5:
+        empty = (np.zeros(0, dtype=np.int32), np.zeros(0))
+        return [] if as_dicts else empty
     
+    correlations = np.zeros(n)
+    correlation_mask = np.zeros(n, dtype=bool)
     try:
         # Metodi 1: Korrelaatio
         correlations = measure_classical_correlation(time_series, interaction_record)
         if np.any(correlations > 0):
-            correlation_events = find_peaks(correlations, height=0.2, distance=5)[0]
-        else:
-            correlation_events = []
+            correlation_mask[find_peaks(correlations, height=0.2, distance=5)[0]] = True
     except:
-        correlation_events = []
+        pass
     
-    try:
-        # Metodi 2: Suorat vuorovaikutukset  
-        interaction_events = np.where(interaction_record > 0.3)[0]
-    except:
-        interaction_events = []
+    # Metodi 2: Suorat vuorovaikutukset (+1 for offset)
+    interaction_mask = np.zeros(n, dtype=bool)
+    interaction_mask[1:len(interaction_record) + 1] = interaction_record[:n - 1] > 0.3
     
-    # Yhdistä (yksinkertainen)
-    all_events = set(correlation_events) | set(interaction_events + 1)  # +1 for offset
+    # Metodi 3 (valinnainen): PELT change-pointit
+    changepoint_mask = np.zeros(n, dtype=bool)
+    if changepoints:
+        changepoint_mask[pelt_change_points_simple(time_series)] = True
     
-    for t in all_events:
-        if 0 < t < len(time_series):
-            score = 0.5  # Yksinkertainen score
-            try:
-                if t-1 in range(len(interaction_record)) and interaction_record[t-1] > 0.3:
-                    score += 0.4
-                if t < len(correlations) and correlations[t] > 0.2:
-                    score += 0.3
-            except:
-                pass
-            
-            division_events.append({
-                'time': int(t),
-                'score': min(1.0, score)
-            })
+    # Yhdistä maskeina (t = 0 ei kelpaa)
+    event_mask = correlation_mask | interaction_mask | changepoint_mask
+    event_mask[0] = False
+    
+    score = 0.5 + 0.4 * interaction_mask + 0.3 * (correlations > 0.2) + 0.2 * changepoint_mask  # Yksinkertainen score
+    times = np.flatnonzero(event_mask).astype(np.int32)
+    scores = np.minimum(1.0, score[times])
     
-    return division_events
+    if not as_dicts:
+        return times, scores
+    return [{'time': int(t), 'score': float(sc)} for t, sc in zip(times, scores)]
 
 def measure_memory_depth_simple(time_series, max_lookback=10):
     """Yksinkertaistettu memory depth mittari"""
@@ -143,40 +180,224 @@ def measure_memory_depth_simple(time_series, max_lookback=10):
     
     return memory_depths
 
-def calculate_indivisible_score_simple(division_rate, memory_depth, interaction_rate):
-    """Yksinkertaistettu indivisible score"""
-    # Division component (optimum 0.05-0.25)
-    if division_rate < 0.01:
-        div_comp = division_rate / 0.01
-    elif 0.01 <= division_rate <= 0.25:
-        div_comp = 0.8 + 0.2 * (1 - abs(division_rate - 0.15) / 0.15)
-    else:
-        div_comp = max(0, 1 - (division_rate - 0.25) / 0.25)
+def acf_pacf_statistics_simple(batch, max_lag=10):
+    """Yksinkertaistettu Moduuli 3:n acf_memory_statistics (FFT-ACF + Durbin-Levinson PACF)
+    batch: (trials, n). Palauttaa ACF decay lag:n ja PACF beyond lag 1 -violation raten per sarja"""
+    x = np.asarray(batch, dtype=float)
+    n = x.shape[-1]
+    x = x - x.mean(axis=-1, keepdims=True)
+    n_fft = 1 << int(np.ceil(np.log2(2 * n - 1)))
+    spectrum = np.fft.rfft(x, n=n_fft, axis=-1)
+    autocov = np.fft.irfft(spectrum * spectrum.conj(), n=n_fft, axis=-1)[..., :max_lag + 1]
+    variance = np.maximum(autocov[..., :1], 1e-12)
+    acf = autocov / variance
+    
+    # Durbin-Levinson
+    pacf = np.zeros_like(acf)
+    phi = np.zeros_like(acf)
+    error = np.ones(acf.shape[:-1])
+    for k in range(1, max_lag + 1):
+        reflection = (acf[..., k] - np.sum(phi[..., 1:k] * acf[..., k - 1:0:-1], axis=-1)) / np.maximum(error, 1e-12)
+        phi[..., 1:k] = phi[..., 1:k] - reflection[..., None] * phi[..., k - 1:0:-1]
+        phi[..., k] = reflection
+        error = error * (1.0 - reflection ** 2)
+        pacf[..., k] = reflection
+    
+    below = np.abs(acf[..., 1:]) < np.exp(-1)
+    return {
+        'acf_decay_lag': np.where(below.any(axis=-1), below.argmax(axis=-1) + 1, max_lag + 1),
+        'pacf_violation_rate': np.mean(np.abs(pacf[..., 2:]) > 1.96 / np.sqrt(n), axis=-1)
+    }
+
+def granger_causality_simple(batch, interaction_batch, max_lag=3):
+    """Yksinkertaistettu Moduuli 2:n granger_causality_test (viiveet 1..max_lag)
+    batch: (trials, n), interaction_batch: (trials, n-1). Normaaliyhtälöt yhdestä
+    Gram-matriisista koko batchille. Palauttaa F-tilastot ja p-arvot (trials, max_lag)"""
+    x = np.asarray(batch, dtype=float)
+    y = np.asarray(interaction_batch, dtype=float)
+    P = max_lag
+    x_lags = np.lib.stride_tricks.sliding_window_view(x[:, :-1], P, axis=1)[..., ::-1]
+    y_lags = np.lib.stride_tricks.sliding_window_view(y[:, :x.shape[1] - 1], P, axis=1)[..., ::-1]
+    target = x[:, P:]
+    design = np.concatenate([np.ones(target.shape + (1,)), x_lags, y_lags, target[..., None]], axis=2)
+    gram = np.matmul(design.transpose(0, 2, 1), design)
+    n_obs = target.shape[1]
+    
+    def rss(columns):
+        xtz = gram[:, columns, -1]
+        beta = np.einsum('bij,bj->bi', np.linalg.pinv(gram[:, columns][:, :, columns], hermitian=True), xtz)
+        return np.maximum(gram[:, -1, -1] - np.einsum('bi,bi->b', beta, xtz), 0.0)
+    
+    f_stat = np.zeros((len(x), P))
+    p_values = np.ones((len(x), P))
+    for p in range(1, P + 1):
+        restricted = list(range(p + 1))
+        rss_r, rss_u = rss(restricted), rss(restricted + list(range(P + 1, P + 1 + p)))
+        df = n_obs - (2 * p + 1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            f = ((rss_r - rss_u) / p) / (rss_u / df)
+        f_stat[:, p - 1] = np.where(np.isfinite(f), np.maximum(f, 0.0), 0.0)
+        p_values[:, p - 1] = stats.f.sf(f_stat[:, p - 1], p, df)
+    return {'f_stat': f_stat, 'p_values': p_values}
+
+def permutation_entropy_simple(batch, dims=(3, 4, 5, 6, 7)):
+    """Yksinkertaistettu Moduuli 3:n permutation_entropy (delay 1)
+    Lehmer-koodit jaetuista viivevertailuista, kuviojakaumat bincount:lla koko batchille.
+    Palauttaa normalisoidun entropian ja JS statistical complexityn (trials, n_dims)"""
+    x = np.asarray(batch, dtype=float)
+    trials, n = x.shape
+    less_cum, running = [], np.zeros((trials, n), dtype=np.int64)
+    for k in range(1, max(dims)):
+        running = running[:, :n - k] + (x[:, k:] < x[:, :n - k])
+        less_cum.append(running)
     
-    # Memory component (optimum 1.5-4.0)
-    if memory_depth < 0.5:
-        mem_comp = memory_depth / 0.5
-    elif 0.5 <= memory_depth <= 4.0:
-        mem_comp = 0.8 + 0.2 * (1 - abs(memory_depth - 2.5) / 2.0)
-    else:
-        mem_comp = max(0, 1 - (memory_depth - 4.0) / 6.0)
+    def shannon(p):
+        return -np.sum(np.where(p > 0, p * np.log(np.where(p > 0, p, 1.0)), 0.0), axis=1)
     
-    # Interaction component (optimum 0.05-0.25)
-    if interaction_rate < 0.01:
-        int_comp = interaction_rate / 0.01
-    elif 0.01 <= interaction_rate <= 0.25:
-        int_comp = 0.8 + 0.2 * (1 - abs(interaction_rate - 0.15) / 0.15)
-    else:
-        int_comp = max(0, 1 - (interaction_rate - 0.25) / 0.25)
+    entropy = np.zeros((trials, len(dims)))
+    complexity = np.zeros((trials, len(dims)))
+    for idx, d in enumerate(dims):
+        m, n_patterns = n - d + 1, math.factorial(d)
+        code = sum(less_cum[d - 2 - i][:, i:i + m] * math.factorial(d - 1 - i) for i in range(d - 1))
+        code = code + np.arange(trials)[:, None] * n_patterns
+        probs = np.bincount(code.ravel(), minlength=trials * n_patterns).reshape(trials, n_patterns) / m
+        s_p = shannon(probs)
+        js = shannon((probs + 1.0 / n_patterns) / 2) - s_p / 2 - np.log(n_patterns) / 2
+        js_max = -0.5 * ((n_patterns + 1) / n_patterns * np.log(n_patterns + 1)
+                         + np.log(n_patterns) - 2 * np.log(2 * n_patterns))
+        entropy[:, idx] = s_p / np.log(n_patterns)
+        complexity[:, idx] = js / js_max * entropy[:, idx]
+    return {'entropy': entropy, 'complexity': complexity}
+
+def lz76_phrase_count(codes, alphabet_size):
+    """Kopio Moduuli 3:n lz76_phrase_count:sta: LZ76 fraasien määrä suffiksiautomaatilla, O(n)"""
+    s = [int(c) for c in codes]
+    n = len(s)
+    A = int(alphabet_size)
+    trans = [-1] * ((2 * n + 1) * A)
+    length = [0] * (2 * n + 1)
+    link = [-1] * (2 * n + 1)
+    size, last = 1, 0
+    cur, cur_len, count = 0, 0, 0
     
-    # Kombinoi
-    total_score = 0.4 * div_comp + 0.4 * mem_comp + 0.2 * int_comp
+    for j, c in enumerate(s):
+        # 1. Jatkuuko fraasi: esiintyykö s[i..j] prefiksissä s[0..j-1]?
+        nxt = trans[cur * A + c]
+        if nxt != -1:
+            cur, cur_len = nxt, cur_len + 1
+        else:
+            count += 1
+            cur, cur_len = 0, 0
+        
+        # 2. Laajenna automaatti symbolilla s[j]
+        new = size
+        size += 1
+        length[new] = length[last] + 1
+        p = last
+        while p != -1 and trans[p * A + c] == -1:
+            trans[p * A + c] = new
+            p = link[p]
+        if p == -1:
+            link[new] = 0
+        else:
+            q = trans[p * A + c]
+            if length[p] + 1 == length[q]:
+                link[new] = q
+            else:
+                clone = size
+                size += 1
+                length[clone] = length[p] + 1
+                trans[clone * A:(clone + 1) * A] = trans[q * A:(q + 1) * A]
+                link[clone] = link[q]
+                while p != -1 and trans[p * A + c] == q:
+                    trans[p * A + c] = clone
+                    p = link[p]
+                link[q] = link[new] = clone
+                # Avoin fraasi siirtyy kloonille, jos sen pituus mahtuu kloonin alueelle
+                if cur == q and cur_len <= length[clone]:
+                    cur = clone
+        last = new
     
+    return count + (cur_len > 0)  # Keskeneräinen viimeinen fraasi lasketaan mukaan
+
+def symbolize_simple(time_series, n_bins=2, max_alphabet=64):
+    """Kopio Moduuli 3:n symbolize_series:stä (ilman välimuistia)
+    Kokonaislukuarvoiset sarjat (binary_01, binary_pm1) pidetään omina tiloinaan,
+    jatkuvat quantile-diskretisoidaan (n_bins=2: mediaanijako, x >= mediaani -> 1).
+    Palauttaa (koodit int64, aakkoston koko)"""
+    x = np.asarray(time_series)
+    if np.all(np.isfinite(x)) and np.all(x == np.round(x)):
+        states, codes = np.unique(x, return_inverse=True)
+        if len(states) <= max_alphabet:
+            return codes.astype(np.int64), len(states)
+    bin_edges = np.quantile(x, np.linspace(0, 1, n_bins + 1))
+    bin_edges[-1] += 1e-10
+    codes = np.clip(np.digitize(x, bin_edges) - 1, 0, n_bins - 1)
+    return codes.astype(np.int64), n_bins
+
+def lempel_ziv_simple(batch, n_bins=2):
+    """Yksinkertaistettu Moduuli 3:n lempel_ziv_complexity: sama symbolisointi (symbolize_simple)
+    Palauttaa normalisoidun LZ76-kompleksisuuden c * log_A(n) / n (trials,)"""
+    x = np.asarray(batch, dtype=float)
+    n = x.shape[1]
+    normalized = np.zeros(x.shape[0])
+    for row in range(x.shape[0]):
+        codes, A = symbolize_simple(x[row], n_bins)
+        A = max(A, 2)
+        normalized[row] = lz76_phrase_count(codes, A) * np.log2(max(n, 2)) / n / np.log2(A)
+    return normalized
+
+# Kopio Moduuli 4:n SCORE_COMPONENT_SHAPES/score_component:sta (NaN -> 0): score-komponenttien
+# paloittaiset muodot ja 'systematic'-profiili. Päivitä yhdessä Moduuli 4:n kanssa.
+SCORE_COMPONENT_SHAPES = {
+    'rate': {'low': 0.01, 'high': 0.25, 'center': 0.15, 'base': 0.8, 'gain': 0.2,
+             'width': 0.15, 'falloff': 0.25},
+    'memory_simple': {'low': 0.5, 'high': 4.0, 'center': 2.5, 'base': 0.8, 'gain': 0.2,
+                      'width': 2.0, 'falloff': 6.0},
+}
+INDIVISIBLE_SCORE_PROFILES = {
+    'systematic': {
+        'division': ('division_rate', 'rate', 0.4),
+        'memory': ('memory_depth', 'memory_simple', 0.4),
+        'interaction': ('interaction_rate', 'rate', 0.2),
+    },
+}
+
+def score_component(values, shape):
+    """Kopio Moduuli 4:stä: yksi score-komponentti np.select + np.clip -muodossa
+    Skalaarisyöte palauttaa float:n, taulukko taulukon"""
+    x = np.asarray(values, dtype=float)
+    conditions = [x < shape['low'], x <= shape['high']]
+    choices = [x / shape['low'],
+               shape['base'] + shape['gain'] * (1 - np.abs(x - shape['center']) / shape['width'])]
+    # NaN ohjautuu default-haaraan; vanha max(0, ...) antoi sille 0, np.clip ei
+    beyond = np.nan_to_num(np.clip(1 - (x - shape['high']) / shape['falloff'], 0.0, None), nan=0.0)
+    score = np.select(conditions, choices, default=beyond)
+    return score if score.ndim else float(score)
+
+def indivisible_score_vectorized(division_rate, memory_depth, interaction_rate, profile='systematic'):
+    """Kopio Moduuli 4:stä (division/memory/interaction-syötteet): skalaarit tai taulukot
+    Palauttaa {'total_score', 'components'}: float skalaarisyötteille, muuten taulukot"""
+    inputs = {'division_rate': division_rate, 'memory_depth': memory_depth,
+              'interaction_rate': interaction_rate}
+    if isinstance(profile, str):
+        profile = INDIVISIBLE_SCORE_PROFILES[profile]
+    components = {}
+    total_score = 0.0
+    for component, (input_name, shape, weight) in profile.items():
+        components[component] = score_component(inputs[input_name], SCORE_COMPONENT_SHAPES[shape])
+        total_score = total_score + weight * components[component]
+    return {'total_score': total_score, 'components': components}
+
+def calculate_indivisible_score_simple(division_rate, memory_depth, interaction_rate):
+    """Yksinkertaistettu indivisible score
+    PÄIVITETTY: indivisible_score_vectorized ('systematic'-profiili), toimii myös taulukoille"""
+    score = indivisible_score_vectorized(division_rate, memory_depth, interaction_rate)
     return {
-        'total_score': total_score,
-        'division_component': div_comp,
-        'memory_component': mem_comp,
-        'interaction_component': int_comp
+        'total_score': score['total_score'],
+        'division_component': score['components']['division'],
+        'memory_component': score['components']['memory'],
+        'interaction_component': score['components']['interaction']
     }
 
 # Lataa satunnaisuusgeneraattorit Moduuli 5:stä
@@ -261,6 +482,7 @@ print("\n🔄 Aloitetaan systemaattinen Monte Carlo testaus...")
 N_MONTE_CARLO = 30  # 30 toistoa per tyyppi (tasapaino aika vs tarkkuus)
 TIME_SERIES_LENGTH = 800  # Lyhyempi koko (nopeus)
 INTERACTION_STRENGTHS = [0.1, 0.15, 0.2]  # Testaa eri interaction vahvuuksia
+USE_CHANGEPOINTS = False  # True: PELT-muutoskohdat division-metodiksi (lineaarinen, max_segment=500)
 
 # Suodata toimivat generaattorit
 working_generators = {}
@@ -278,6 +500,7 @@ for name, generator in randomness_generators.items():
 print(f"\n🎯 Testataan {len(working_generators)} satunnaisuustyyppiä")
 print(f"🔬 {N_MONTE_CARLO} Monte Carlo toistoa per tyyppi")
 print(f"📏 {TIME_SERIES_LENGTH} pisteen aikasarjat")
+print(f"✂️ PELT change-pointit: {'käytössä' if USE_CHANGEPOINTS else 'pois'}")
 
 # Pääsilmukka
 systematic_results = {}
@@ -292,6 +515,8 @@ for interaction_strength in INTERACTION_STRENGTHS:
         
         # Monte Carlo toistot
         trial_results = []
+        trial_series = []  # Onnistuneet sarjat batch-ACF/PACF:ia varten
+        trial_interactions = []  # Vastaavat interaction recordit (batch-Granger)
         
         for trial in range(N_MONTE_CARLO):
             test_counter += 1
@@ -306,29 +531,24 @@ for interaction_strength in INTERACTION_STRENGTHS:
                 )
                 
                 # 3. Analysoi indivisible ominaisuudet
-                division_events = detect_division_events_simple(time_series, interaction_record)
+                event_times, event_scores = detect_division_events_simple(
+                    time_series, interaction_record, as_dicts=False,
+                    changepoints=USE_CHANGEPOINTS
+                )
                 memory_depths = measure_memory_depth_simple(time_series)
                 
                 # 4. Laske mittarit
-                division_rate = len(division_events) / len(time_series)
+                division_rate = len(event_times) / len(time_series)
                 avg_memory_depth = np.mean(memory_depths) if memory_depths else 0.0
                 interaction_rate = np.mean(interaction_record)
                 
-                # 5. Indivisible score
-                score_result = calculate_indivisible_score_simple(
-                    division_rate, avg_memory_depth, interaction_rate
-                )
-                
+                # 5. Indivisible score lasketaan kaikille toistoille kerralla silmukan jälkeen
+                trial_series.append(time_series)
+                trial_interactions.append(interaction_record)
                 trial_results.append({
                     'division_rate': division_rate,
                     'memory_depth': avg_memory_depth,
-                    'interaction_rate': interaction_rate,
-                    'indivisible_score': score_result['total_score'],
-                    'score_components': {
-                        'division': score_result['division_component'],
-                        'memory': score_result['memory_component'],
-                        'interaction': score_result['interaction_component']
-                    }
+                    'interaction_rate': interaction_rate
                 })
                 
             except Exception as e:
@@ -342,6 +562,19 @@ for interaction_strength in INTERACTION_STRENGTHS:
         successful_trials = [t for t in trial_results if 'error' not in t]
         
         if successful_trials:
+            # Vektoroitu indivisible score kaikille onnistuneille toistoille
+            score_batch = calculate_indivisible_score_simple(
+                np.array([t['division_rate'] for t in successful_trials]),
+                np.array([t['memory_depth'] for t in successful_trials]),
+                np.array([t['interaction_rate'] for t in successful_trials])
+            )
+            
+            # Globaalit ACF/PACF-tilastot kaikille toistoille yhtenä batchina
+            acf_stats = acf_pacf_statistics_simple(np.stack(trial_series))
+            granger_stats = granger_causality_simple(np.stack(trial_series), np.stack(trial_interactions))
+            ordinal_stats = permutation_entropy_simple(np.stack(trial_series))
+            lz_complexity = lempel_ziv_simple(np.stack(trial_series))
+            
             systematic_results[f"{rand_name}_int{interaction_strength}"] = {
                 'randomness_type': rand_name,
                 'interaction_strength': interaction_strength,
@@ -353,19 +586,26 @@ for interaction_strength in INTERACTION_STRENGTHS:
                 'avg_division_rate': np.mean([t['division_rate'] for t in successful_trials]),
                 'avg_memory_depth': np.mean([t['memory_depth'] for t in successful_trials]),
                 'avg_interaction_rate': np.mean([t['interaction_rate'] for t in successful_trials]),
-                'avg_indivisible_score': np.mean([t['indivisible_score'] for t in successful_trials]),
+                'avg_indivisible_score': float(np.mean(score_batch['total_score'])),
+                'avg_acf_decay_lag': float(np.mean(acf_stats['acf_decay_lag'])),
+                'avg_pacf_violation_rate': float(np.mean(acf_stats['pacf_violation_rate'])),
+                'avg_granger_f': [float(v) for v in granger_stats['f_stat'].mean(axis=0)],  # Viiveet 1..3
+                'granger_significant_rate': [float(v) for v in (granger_stats['p_values'] < 0.05).mean(axis=0)],
+                'avg_permutation_entropy': [float(v) for v in ordinal_stats['entropy'].mean(axis=0)],  # d = 3..7
+                'avg_statistical_complexity': [float(v) for v in ordinal_stats['complexity'].mean(axis=0)],
+                'avg_lz_complexity': float(np.mean(lz_complexity)),
                 
                 # Keskihajonnat
                 'std_division_rate': np.std([t['division_rate'] for t in successful_trials]),
                 'std_memory_depth': np.std([t['memory_depth'] for t in successful_trials]),
                 'std_interaction_rate': np.std([t['interaction_rate'] for t in successful_trials]),
-                'std_indivisible_score': np.std([t['indivisible_score'] for t in successful_trials]),
+                'std_indivisible_score': float(np.std(score_batch['total_score'])),
                 
                 # Score komponentit
                 'avg_score_components': {
-                    'division': np.mean([t['score_components']['division'] for t in successful_trials]),
-                    'memory': np.mean([t['score_components']['memory'] for t in successful_trials]),
-                    'interaction': np.mean([t['score_components']['interaction'] for t in successful_trials])
+                    'division': float(np.mean(score_batch['division_component'])),
+                    'memory': float(np.mean(score_batch['memory_component'])),
+                    'interaction': float(np.mean(score_batch['interaction_component']))
                 }
             }
             
@@ -392,6 +632,7 @@ results_data = {
         'n_monte_carlo': N_MONTE_CARLO,
         'time_series_length': TIME_SERIES_LENGTH,
         'interaction_strengths': INTERACTION_STRENGTHS,
+        'use_changepoints': USE_CHANGEPOINTS,
         'n_randomness_types': len(working_generators),
         'total_tests_run': test_counter
     },
@@ -82,7 +82,8 @@ for key, result in systematic_results.items():
             'success_rate': result.get('success_rate', 0.0),
             'division_component': result.get('avg_score_components', {}).get('division', 0.0),
             'memory_component': result.get('avg_score_components', {}).get('memory', 0.0),
-            'interaction_component': result.get('avg_score_components', {}).get('interaction', 0.0)
+            'interaction_component': result.get('avg_score_components', {}).get('interaction', 0.0),
+            'avg_lz_complexity': result.get('avg_lz_complexity', np.nan)  # Puuttuu vanhoista ajoista
         })
 
 if len(analysis_data) == 0:
@@ -245,6 +246,19 @@ except Exception as e:
     print(f"  ❌ Komponenttianalyysi epäonnistui: {str(e)[:50]}")
     component_analysis = pd.DataFrame()
 
+# 5. LZ76-kompleksisuus: erottaako rakenteen binäärityypit (binary_pm1, binary_01) muista?
+print(f"\n🗜️ LZ76-KOMPLEKSISUUS (normalisoitu, ~1 = satunnainen binäärijono):")
+lz_by_type = df.groupby('randomness_type')['avg_lz_complexity'].mean().dropna()
+if len(lz_by_type) > 0:
+    for rand_type in best_per_type.head(10).index:
+        if rand_type in lz_by_type.index:
+            print(f"  {rand_type:20s} | LZ={lz_by_type[rand_type]:.3f} | "
+                  f"score={best_per_type[rand_type]:.3f}")
+    lz_score_corr = df[['avg_lz_complexity', 'avg_indivisible_score']].dropna().corr().iloc[0, 1]
+    print(f"  Korrelaatio LZ vs indivisible score: {lz_score_corr:.3f}")
+else:
+    print(f"  ⚠️ LZ-kompleksisuutta ei löydy (aja Moduuli 6 uudelleen)")
+
 # =============================================================================
 # VISUALISOINNIT
 # =============================================================================
@@ -364,7 +378,8 @@ final_results = {
     'physical_conclusions': {
         'complex_numbers_beneficial': recommendations['complex_numbers_beneficial'],
         'optimal_division_event_rate': float(optimal_interaction),
-        'dominant_score_component': component_analysis.mean().idxmax() if len(component_analysis) > 0 else 'unknown'
+        'dominant_score_component': component_analysis.mean().idxmax() if len(component_analysis) > 0 else 'unknown',
+        'lz_complexity_by_type': {k: float(v) for k, v in lz_by_type.items()}
     },
     'phase3_recommendations': recommendations,
     'statistical_tests': {
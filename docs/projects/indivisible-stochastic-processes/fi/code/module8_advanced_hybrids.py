@@ -9,6 +9,7 @@ from datetime import datetime
 import glob
 from scipy import stats
 from scipy.linalg import expm
+from scipy.signal import find_peaks
 import warnings
 warnings.filterwarnings('ignore')
 
@@ -458,6 +459,145 @@ def triple_hybrid_model(randomness_type, size=1000, rmt_weight=0.4, fractal_weig
         }
     }
 
+# =============================================================================
+# MULTI-RESOLUTION ANALYYSI (YKSINKERTAISTETTU KOPIO MODUULI 3:STA)
+# =============================================================================
+
+def memory_depth_simple(a, points, max_lookback=15, window_size=8, threshold=0.3):
+    """
+    Moduuli 3:n memory_depth_batch yhdelle sarjalle: |corr(nykyinen ikkuna, ikkuna
+    lagin verran taaempana)| -profiilit pisteissä, syvyys = viimeinen lagi ennen
+    ensimmäistä lagia jonka |corr| <= threshold (vakioikkunat ohitetaan)
+    """
+    n, w = len(a), window_size
+    points = np.asarray(points, dtype=int)
+    lags = np.arange(1, max_lookback)
+    if len(points) == 0 or n < w:
+        return 0.0
+    
+    windows = np.lib.stride_tricks.sliding_window_view(a, w)
+    past_rows = points[:, None] - lags[None, :]
+    in_range = (points[:, None] + w < n) & (past_rows - w >= 0) & (lags[None, :] < np.minimum(max_lookback, points)[:, None])
+    current = windows[np.minimum(points, n - w)]
+    past = windows[np.clip(past_rows, 0, n - w)]
+    current_c = current - current.mean(axis=1, keepdims=True)
+    past_c = past - past.mean(axis=2, keepdims=True)
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        corr = np.abs(np.einsum('pw,plw->pl', current_c, past_c) /
+                      np.sqrt((current_c ** 2).sum(axis=1)[:, None] * (past_c ** 2).sum(axis=2)))
+    corr = np.where(np.isnan(corr), -1.0, np.minimum(corr, 1.0))
+    profiles = np.where((current.std(axis=1)[:, None] > 1e-6) & (past.std(axis=2) > 1e-6), corr, np.nan)
+    profiles = np.where(in_range, profiles, -1.0)
+    
+    skip = np.isnan(profiles)
+    with np.errstate(invalid='ignore'):
+        fail = ~skip & ~(profiles > threshold)
+    first_fail = np.where(fail.any(axis=1), fail.argmax(axis=1), len(lags))
+    lag_numbers = np.arange(1, len(lags) + 1)
+    passing = (lag_numbers[None, :] <= first_fail[:, None]) & ~skip
+    return float(np.where(passing, lag_numbers[None, :], 0).max(axis=1).mean())
+
+def division_rate_simple(a, interaction_record, strong_threshold=0.5, window_size=10,
+                         lookback_window=20, context=6):
+    """
+    Moduuli 3:n division_rate_batch yhdelle sarjalle (Module 2:n oletuspainot):
+    0.5 * interaction[t-1] > 0.3 + 0.3 * |corr(ts, ir)| -piikit + 0.2 * riippuvuusmuutos > 0.5,
+    strong-eventtien osuus score > strong_threshold
+    """
+    n = len(a)
+    interaction_record = np.asarray(interaction_record, dtype=float)
+    score = np.zeros(n)
+    
+    interaction = np.zeros(n)
+    interaction[1:len(interaction_record) + 1] = interaction_record[:n - 1]
+    score += 0.5 * (interaction > 0.3)
+    
+    w = window_size
+    n_corr = min(n, len(interaction_record) + 1)
+    correlations = np.zeros(n)
+    if n > w and len(interaction_record) >= w and n_corr > w:
+        ts_full = np.lib.stride_tricks.sliding_window_view(a, w + 1)[:n_corr - w]
+        y = np.lib.stride_tricks.sliding_window_view(interaction_record, w)[:n_corr - w]
+        xc = ts_full[:, :-1] - ts_full[:, :-1].mean(axis=1, keepdims=True)
+        yc = y - y.mean(axis=1, keepdims=True)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            corr = np.einsum('tw,tw->t', xc, yc) / np.sqrt((xc * xc).sum(axis=1) * (yc * yc).sum(axis=1))
+        valid = (ts_full.std(axis=1) > 0) & (y.std(axis=1) > 0)
+        correlations[w:n_corr] = np.where(valid & np.isfinite(corr), np.abs(np.clip(corr, -1.0, 1.0)), 0.0)
+    peaks, _ = find_peaks(correlations, height=0.2, distance=5)
+    score[peaks] += 0.3
+    
+    c = context
+    if n >= c and n > lookback_window:
+        ctx = np.lib.stride_tricks.sliding_window_view(a, c)
+        ctx_std = ctx.std(axis=1)
+        ctx_valid = ctx_std > 0
+        ctx_z = (ctx - ctx.mean(axis=1, keepdims=True)) / np.where(ctx_valid, ctx_std, 1.0)[:, None]
+        rows = np.arange(lookback_window, n)[:, None] - (c - 1) - np.arange(1, lookback_window)[None, :]
+        current = np.arange(lookback_window, n) - (c - 1)
+        ok = (rows >= 0) & ctx_valid[current][:, None] & ctx_valid[np.maximum(rows, 0)]
+        dep = np.abs(np.einsum('tc,tlc->tl', ctx_z[current], ctx_z[np.maximum(rows, 0)]) / c)
+        deps = np.where(ok, np.minimum(dep, 1.0), np.nan)
+        counts = (~np.isnan(deps)).sum(axis=1)
+        dep_change = np.nanstd(deps, axis=1)
+        score[lookback_window:] += 0.2 * ((counts > 3) & (dep_change > 0.5))
+    
+    return float(np.sum(score > strong_threshold) / n)
+
+def multiresolution_table_simple(time_series, interaction_record, n_levels=4, min_length=64, seed=None):
+    """
+    Haar-pyramidi reshape:lla ja mittarit jokaisella skaalalla 2^j:
+    avg_memory_depth (memory_depth_simple satunnaisissa pisteissä kuten Moduuli 3),
+    division_rate (division_rate_simple karkealla recordilla), acf_decay_lag
+    (FFT-ACF < 1/e), pacf_lag2 (Markov violation -indikaattori), interaction_rate
+    (karkea record, max lohkossa), detail_energy ja detail_jump_ratio =
+    |detalji| vuorovaikutuslohkoissa / muualla (division-signatuuri)
+    """
+    rng = np.random.default_rng(seed)
+    a = np.asarray(time_series, dtype=float)
+    aligned = np.concatenate([[0.0], np.asarray(interaction_record, dtype=float)])
+    total_variance = max(np.var(a), 1e-12)
+    n_levels = min(n_levels, int(np.log2(max(len(a) // min_length, 1))))
+    rows = []
+    
+    for level in range(n_levels + 1):
+        if level > 0:
+            pairs = a[:2 * (len(a) // 2)].reshape(-1, 2)
+            a, detail = pairs.mean(axis=1), (pairs[:, 1] - pairs[:, 0]) / 2
+            aligned = aligned[:2 * (len(aligned) // 2)].reshape(-1, 2).max(axis=1)
+        
+        n = len(a)
+        centered = a - a.mean()
+        n_fft = 1 << int(np.ceil(np.log2(2 * n - 1)))
+        spectrum = np.fft.rfft(centered, n=n_fft)
+        acf = np.fft.irfft(spectrum * spectrum.conj(), n=n_fft)[:21]
+        acf = acf / max(acf[0], 1e-12)
+        below = np.abs(acf[1:]) < np.exp(-1)
+        pacf_lag2 = (acf[2] - acf[1] ** 2) / max(1 - acf[1] ** 2, 1e-12)
+        
+        memory_points = rng.choice(np.arange(15, n - 15), size=min(30, n // 30), replace=False)
+        
+        row = {
+            'scale': 2 ** level,
+            'avg_memory_depth': memory_depth_simple(a, memory_points),
+            'division_rate': division_rate_simple(a, aligned[1:]),
+            'acf_decay_lag': int(below.argmax() + 1) if below.any() else len(below) + 1,
+            'pacf_lag2': float(pacf_lag2),
+            'interaction_rate': float(np.mean(aligned[1:n] > 0)) if n > 1 else 0.0,
+            'detail_energy': None,
+            'detail_jump_ratio': None
+        }
+        if level > 0:
+            row['detail_energy'] = float(np.var(detail) / total_variance)
+            active = aligned[:len(detail)] > 0
+            if active.any() and (~active).any():
+                row['detail_jump_ratio'] = float(np.mean(np.abs(detail[active])) /
+                                                 max(np.mean(np.abs(detail[~active])), 1e-12))
+        rows.append(row)
+    
+    return rows
+
 # =============================================================================
 # TESTAA ADVANCED HYBRID MODELS
 # =============================================================================
@@ -515,6 +655,14 @@ for randomness_type in TOP_RANDOMNESS_TYPES[:2]:  # Testaa 2 parasta
                 'model_type': model_name
             }
             print(f"❌ Error: {str(e)[:30]}")
+            continue
+        
+        # Multi-resolution -taulukko erikseen: sen virhe ei kaada mallin sanity checkiä
+        try:
+            hybrid_test_results[test_key]['multiresolution'] = multiresolution_table_simple(ts, interactions)
+        except Exception as e:
+            hybrid_test_results[test_key]['multiresolution'] = None
+            print(f"    ⚠️ Multi-resolution epäonnistui: {str(e)[:30]}")
 
 # =============================================================================
 # TALLENNA ADVANCED HYBRID MODELS & TESTIT
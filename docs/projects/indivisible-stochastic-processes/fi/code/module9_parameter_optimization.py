@@ -138,36 +138,52 @@ def measure_memory_depth_fast(time_series, max_lookback=8):
     
     return memory_depths if memory_depths else [0.0]
 
+# Kopio Moduuli 4:n SCORE_COMPONENT_SHAPES/score_component:sta (NaN -> 0): score-komponenttien
+# paloittaiset muodot ja 'systematic'-profiili. Päivitä yhdessä Moduuli 4:n kanssa.
+SCORE_COMPONENT_SHAPES = {
+    'rate': {'low': 0.01, 'high': 0.25, 'center': 0.15, 'base': 0.8, 'gain': 0.2,
+             'width': 0.15, 'falloff': 0.25},
+    'memory_simple': {'low': 0.5, 'high': 4.0, 'center': 2.5, 'base': 0.8, 'gain': 0.2,
+                      'width': 2.0, 'falloff': 6.0},
+}
+INDIVISIBLE_SCORE_PROFILES = {
+    'systematic': {
+        'division': ('division_rate', 'rate', 0.4),
+        'memory': ('memory_depth', 'memory_simple', 0.4),
+        'interaction': ('interaction_rate', 'rate', 0.2),
+    },
+}
+
+def score_component(values, shape):
+    """Kopio Moduuli 4:stä: yksi score-komponentti np.select + np.clip -muodossa
+    Skalaarisyöte palauttaa float:n, taulukko taulukon"""
+    x = np.asarray(values, dtype=float)
+    conditions = [x < shape['low'], x <= shape['high']]
+    choices = [x / shape['low'],
+               shape['base'] + shape['gain'] * (1 - np.abs(x - shape['center']) / shape['width'])]
+    # NaN ohjautuu default-haaraan; vanha max(0, ...) antoi sille 0, np.clip ei
+    beyond = np.nan_to_num(np.clip(1 - (x - shape['high']) / shape['falloff'], 0.0, None), nan=0.0)
+    score = np.select(conditions, choices, default=beyond)
+    return score if score.ndim else float(score)
+
+def indivisible_score_vectorized(division_rate, memory_depth, interaction_rate, profile='systematic'):
+    """Kopio Moduuli 4:stä (division/memory/interaction-syötteet): skalaarit tai taulukot
+    Palauttaa {'total_score', 'components'}: float skalaarisyötteille, muuten taulukot"""
+    inputs = {'division_rate': division_rate, 'memory_depth': memory_depth,
+              'interaction_rate': interaction_rate}
+    if isinstance(profile, str):
+        profile = INDIVISIBLE_SCORE_PROFILES[profile]
+    components = {}
+    total_score = 0.0
+    for component, (input_name, shape, weight) in profile.items():
+        components[component] = score_component(inputs[input_name], SCORE_COMPONENT_SHAPES[shape])
+        total_score = total_score + weight * components[component]
+    return {'total_score': total_score, 'components': components}
+
 def calculate_indivisible_score_fast(division_rate, memory_depth, interaction_rate):
-    """Nopea indivisible score laskin"""
-    # Division component (optimum 0.05-0.25)
-    if division_rate < 0.01:
-        div_comp = division_rate / 0.01
-    elif 0.01 <= division_rate <= 0.25:
-        div_comp = 0.8 + 0.2 * (1 - abs(division_rate - 0.15) / 0.15)
-    else:
-        div_comp = max(0, 1 - (division_rate - 0.25) / 0.25)
-    
-    # Memory component (optimum 1.5-4.0)
-    if memory_depth < 0.5:
-        mem_comp = memory_depth / 0.5
-    elif 0.5 <= memory_depth <= 4.0:
-        mem_comp = 0.8 + 0.2 * (1 - abs(memory_depth - 2.5) / 2.0)
-    else:
-        mem_comp = max(0, 1 - (memory_depth - 4.0) / 6.0)
-    
-    # Interaction component (optimum 0.05-0.25)
-    if interaction_rate < 0.01:
-        int_comp = interaction_rate / 0.01
-    elif 0.01 <= interaction_rate <= 0.25:
-        int_comp = 0.8 + 0.2 * (1 - abs(interaction_rate - 0.15) / 0.15)
-    else:
-        int_comp = max(0, 1 - (interaction_rate - 0.25) / 0.25)
-    
-    # Kombinoi
-    total_score = 0.4 * div_comp + 0.4 * mem_comp + 0.2 * int_comp
-    
-    return total_score
+    """Nopea indivisible score laskin
+    PÄIVITETTY: indivisible_score_vectorized ('systematic'-profiili), toimii myös taulukoille"""
+    return indivisible_score_vectorized(division_rate, memory_depth, interaction_rate)['total_score']
 
 # =============================================================================
 # LATAA ADVANCED HYBRID MODELS
@@ -238,7 +254,7 @@ def evaluate_hybrid_model(model_func, randomness_type, parameters, n_trials=3):
     Evaluoi hybrid mallin suorituskyky annetuilla parametreilla
     KORJATTU: Vältetään model_func.__name__ käyttö
     """
-    trial_scores = []
+    trial_metrics = []  # (division_rate, memory_depth, interaction_rate) per toisto
     
     for trial in range(n_trials):
         try:
@@ -292,17 +308,21 @@ def evaluate_hybrid_model(model_func, randomness_type, parameters, n_trials=3):
             division_rate = len(division_events) / len(time_series)
             avg_memory_depth = np.mean(memory_depths)
             interaction_rate = np.mean(interaction_record)
-            
-            score = calculate_indivisible_score_fast(division_rate, avg_memory_depth, interaction_rate)
-            
-            # Sanity check
-            if not (np.isnan(score) or np.isinf(score)) and 0 <= score <= 1:
-                trial_scores.append(score)
+            trial_metrics.append((division_rate, avg_memory_depth, interaction_rate))
             
         except Exception as e:
             continue  # Skip failed trials
     
-    return np.mean(trial_scores) if trial_scores else 0.0
+    if not trial_metrics:
+        return 0.0
+    
+    # Kaikkien toistojen score yhtenä taulukkolausekkeena
+    metrics = np.array(trial_metrics, dtype=float)
+    scores = calculate_indivisible_score_fast(metrics[:, 0], metrics[:, 1], metrics[:, 2])
+    
+    # Sanity check
+    valid = np.isfinite(scores) & (scores >= 0) & (scores <= 1)
+    return float(np.mean(scores[valid])) if valid.any() else 0.0
 
 # =============================================================================
 # SYSTEMAATTINEN PARAMETER OPTIMIZATION